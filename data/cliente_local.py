@@ -0,0 +1,53 @@
+import bisect
+import os
+import threading
+
+import pandas as pd
+
+
+class ClienteLocal:
+    """
+    Imita a parte de klines do binance.client.Client (get_klines e get_historical_klines) lendo CSVs
+    no mesmo formato de data/fechamentos ({symbol}_{interval}_data.csv).
+
+    Serve para testar historical_data.py sem rede: passe ClienteLocal(diretorio_origem) como client.
+    'requisicoes' conta as chamadas a get_klines.
+    """
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        self.requisicoes = 0
+        self._klines = {}
+        self._trava = threading.Lock()
+
+    def _carregar(self, symbol, interval):
+        with self._trava:
+            chave = (symbol, interval)
+            if chave not in self._klines:
+                df = pd.read_csv(os.path.join(self.diretorio, f'{symbol}_{interval}_data.csv'), dtype=str)
+                # A API devolve o horário de abertura em ms, preços e volumes como texto e contagens como inteiros
+                df['timestamp'] = pd.to_datetime(df['timestamp']).to_numpy(dtype='datetime64[ms]').view('int64')
+                df['close_time'] = df['close_time'].astype('int64')
+                df['number_of_trades'] = df['number_of_trades'].astype('int64')
+                klines = [list(linha) for linha in df.itertuples(index=False)]
+                self._klines[chave] = ([k[0] for k in klines], klines)
+            return self._klines[chave]
+
+    def get_klines(self, symbol, interval, startTime=None, endTime=None, limit=500):
+        with self._trava:
+            self.requisicoes += 1
+        aberturas, klines = self._carregar(symbol, interval)
+        inicio = bisect.bisect_left(aberturas, startTime) if startTime is not None else 0
+        fim = bisect.bisect_right(aberturas, endTime) if endTime is not None else len(aberturas)
+        return [list(k) for k in klines[inicio:min(fim, inicio + limit)]]
+
+    def get_historical_klines(self, symbol, interval, start_str=None, end_str=None, limit=1000):
+        inicio = int(pd.Timestamp(start_str).value // 1_000_000) if start_str else None
+        fim = int(pd.Timestamp(end_str).value // 1_000_000) if end_str else None
+        resultado = []
+        while True:
+            lote = self.get_klines(symbol, interval, inicio, fim, limit)
+            resultado += lote
+            if len(lote) < limit:
+                return resultado
+            inicio = lote[-1][0] + 1
@@ -1,31 +1,239 @@
-from binance.client import Client
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 
-# A chave da API não é necessária para pegar dados históricos
-client = Client(api_key='', api_secret='')
+# Colunas dos klines da Binance, na ordem em que a API devolve
+COLUNAS = ['timestamp', 'open', 'high', 'low', 'close', 'volume',
+           'close_time', 'quote_asset_volume', 'number_of_trades',
+           'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume',
+           'ignore'
+           ]
+
+DIRETORIO = 'data/fechamentos'
+# Formato do timestamp nos CSVs. Fixo: sem ele o pandas grava só a data quando o lote tem apenas candles de
+# meia-noite (ex: um 1d novo), e o arquivo fica com dois formatos misturados
+FORMATO_TIMESTAMP = '%Y-%m-%d %H:%M:%S'
+
+# Duração de cada intervalo em ms, para achar lacunas ('1M' tem duração variável e fica sem checagem)
+INTERVALOS_MS = {'1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+                 '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '6h': 21_600_000, '8h': 28_800_000,
+                 '12h': 43_200_000, '1d': 86_400_000, '3d': 259_200_000, '1w': 604_800_000}
+
+
+def criar_cliente():
+    # A chave da API não é necessária para pegar dados históricos
+    from binance.client import Client
+    return Client(api_key='', api_secret='')
+
+
+class LimiteDeRequisicoes:
+    """
+    Espaça as requisições de todas as threads para não passar de 'por_minuto' chamadas por minuto
+    (a Binance bloqueia o IP temporariamente quando o limite de peso é excedido).
+    """
+
+    def __init__(self, por_minuto=600):
+        self.intervalo = 60.0 / por_minuto
+        self._proxima = time.monotonic()
+        self._trava = threading.Lock()
+
+    def esperar(self):
+        with self._trava:
+            agora = time.monotonic()
+            vez = max(agora, self._proxima)
+            self._proxima = vez + self.intervalo
+        if vez > agora:
+            time.sleep(vez - agora)
+
+
+def caminho_csv(symbol, interval, diretorio=DIRETORIO):
+    return os.path.join(diretorio, f'{symbol}_{interval}_data.csv')
+
+
+def _para_ms(data):
+    return int(pd.Timestamp(data).value // 1_000_000)
+
+
+def _reparar_final(caminho):
+    """Descarta uma última linha incompleta (escrita interrompida), para o próximo append começar numa linha nova."""
+    with open(caminho, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        tamanho = f.tell()
+        if tamanho == 0:
+            return
+        f.seek(tamanho - 1)
+        if f.read(1) == b'\n':
+            return
+        bloco = min(tamanho, 4096)
+        while True:
+            f.seek(tamanho - bloco)
+            dados = f.read(bloco)
+            fim_linha = dados.rfind(b'\n')
+            if fim_linha >= 0 or bloco == tamanho:
+                break
+            bloco = min(tamanho, bloco * 2)
+        f.truncate(tamanho - bloco + fim_linha + 1)
+
+
+def ultimo_timestamp(caminho):
+    """
+    Timestamp (ms) do último candle gravado no CSV, lendo só o final do arquivo.
+    Retorna None se o arquivo não existe ou só tem o cabeçalho.
+    """
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        tamanho = f.tell()
+        bloco = min(tamanho, 4096)
+        while True:
+            f.seek(tamanho - bloco)
+            linhas = f.read(bloco).rstrip(b'\n').split(b'\n')
+            if len(linhas) > 1 or bloco == tamanho:
+                break
+            bloco = min(tamanho, bloco * 2)
+    campo = linhas[-1].split(b',')[0].decode()
+    if campo in ('', 'timestamp'):
+        return None
+    return _para_ms(campo)
+
+
+def _erro_temporario(e):
+    # Limite de requisições, erro do servidor ou falha de rede (as exceções do requests herdam de OSError)
+    status = getattr(e, 'status_code', None)
+    if status is not None:
+        return status in (418, 429) or status >= 500
+    return isinstance(e, OSError) and not isinstance(e, (FileNotFoundError, PermissionError))
 
-# Função para pegar dados históricos de velas
-def get_historical_klines(symbol, interval, start_str=None, end_str=None):
-    return client.get_historical_klines(symbol, interval, start_str, end_str)
 
-symbols = ['SOLUSDT']
-interval = Client.KLINE_INTERVAL_1HOUR
-start_str = '20 Jul, 2017'
-end_str = '20 Jul, 2025'
+def baixar_klines(client, symbol, interval, inicio_ms, fim_ms=None, limitador=None, limite=1000, tentativas=5):
+    """
+    Baixa os klines de [inicio_ms, fim_ms] página a página com client.get_klines.
+    Candles ainda abertos (close_time no futuro) ficam de fora, para não gravar valores parciais.
+    """
+    klines = []
+    agora_ms = int(time.time() * 1000)
+    while True:
+        for tentativa in range(tentativas):
+            if limitador is not None:
+                limitador.esperar()
+            try:
+                lote = client.get_klines(symbol=symbol, interval=interval, startTime=inicio_ms,
+                                         endTime=fim_ms, limit=limite)
+                break
+            except Exception as e:
+                if tentativa == tentativas - 1 or not _erro_temporario(e):
+                    raise
+                # 429/418: limite da API excedido; espera mais antes de tentar de novo
+                espera = 60 if getattr(e, 'status_code', None) in (418, 429) else 2 ** tentativa
+                time.sleep(espera)
+        lote = [k for k in lote if k[6] < agora_ms]
+        if not lote:
+            break
+        klines += lote
+        if len(lote) < limite:
+            break
+        inicio_ms = lote[-1][0] + 1
+    return klines
 
-for symbol in symbols:
-    klines = get_historical_klines(symbol, interval, start_str, end_str)
+
+def validar_candles(timestamps_ms, interval):
+    """
+    Confere uma sequência de timestamps (ms, em ordem de gravação).
+
+    Retorna um dicionário com:
+    - duplicados: quantos timestamps repetem algum anterior
+    - fora_de_ordem: quantos são menores que o anterior
+    - lacunas: lista de (ultimo_antes, primeiro_depois, candles_faltando)
+    """
+    serie = pd.Series(timestamps_ms, dtype='int64')
+    diferencas = serie.diff().iloc[1:]
+    resultado = {'duplicados': int(serie.duplicated().sum()), 'fora_de_ordem': int((diferencas < 0).sum()), 'lacunas': []}
+    passo = INTERVALOS_MS.get(interval)
+    if passo is not None:
+        for posicao in diferencas.index[diferencas > passo]:
+            antes, depois = serie[posicao - 1], serie[posicao]
+            resultado['lacunas'].append((pd.Timestamp(antes, unit='ms'), pd.Timestamp(depois, unit='ms'),
+                                         int((depois - antes) // passo - 1)))
+    return resultado
+
+
+def validar_csv(symbol, interval, diretorio=DIRETORIO):
+    """validar_candles sobre o CSV inteiro de um símbolo/intervalo."""
+    timestamps = pd.to_datetime(pd.read_csv(caminho_csv(symbol, interval, diretorio), usecols=['timestamp'])['timestamp'])
+    return validar_candles(timestamps.to_numpy(dtype='datetime64[ms]').view('int64'), interval)
+
+
+def atualizar_simbolo(client, symbol, interval, start_str, end_str=None, diretorio=DIRETORIO, limitador=None):
+    """
+    Traz o CSV de um símbolo/intervalo até end_str (ou até agora), baixando só o que falta depois do último candle
+    gravado e anexando ao final do arquivo. Sem arquivo, baixa desde start_str.
+
+    Retorna um resumo com as linhas novas, duplicados descartados e lacunas encontradas.
+    """
+    caminho = caminho_csv(symbol, interval, diretorio)
+    if os.path.exists(caminho):
+        _reparar_final(caminho)
+    ultimo = ultimo_timestamp(caminho)
+    inicio_ms = ultimo + 1 if ultimo is not None else _para_ms(start_str)
+    fim_ms = _para_ms(end_str) if end_str else None
+
+    klines = baixar_klines(client, symbol, interval, inicio_ms, fim_ms, limitador)
 
     # Converte os dados para um DataFrame do Pandas
-    df = pd.DataFrame(klines, 
-                        columns=['timestamp', 'open', 'high', 'low', 'close', 'volume',
-                                'close_time', 'quote_asset_volume', 'number_of_trades',
-                                'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume',
-                                'ignore'
-                                ] )
-
-    # Converte o timestamp para um formato legível
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-
-    # Salva o DataFrame em um arquivo CSV
-    df.to_csv(f'data/fechamentos/{symbol}_{interval}_data.csv', index=False)
\ No newline at end of file
+    df = pd.DataFrame(klines, columns=COLUNAS)
+    validacao = validar_candles(([ultimo] if ultimo is not None else []) + df['timestamp'].tolist(), interval)
+    df = df.drop_duplicates('timestamp', keep='last')
+    df = df[df['timestamp'] > (ultimo if ultimo is not None else -1)]
+
+    if len(df):
+        # Converte o timestamp para um formato legível
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+        novo = ultimo is None
+        os.makedirs(diretorio, exist_ok=True)
+        df.to_csv(caminho, mode='w' if novo else 'a', header=novo, index=False,
+                  date_format=FORMATO_TIMESTAMP)
+
+    return {'symbol': symbol, 'interval': interval, 'novas_linhas': len(df),
+            'ultimo': pd.Timestamp(df['timestamp'].iloc[-1]) if len(df) else
+                      (pd.Timestamp(ultimo, unit='ms') if ultimo is not None else None),
+            'duplicados': validacao['duplicados'], 'lacunas': validacao['lacunas']}
+
+
+def atualizar(symbols, intervals, start_str, end_str=None, client=None, diretorio=DIRETORIO,
+              threads=4, requisicoes_por_minuto=600):
+    """
+    Atualiza todos os pares (símbolo, intervalo) em paralelo, com um limite de requisições comum às threads.
+
+    Retorna um DataFrame com o resumo de cada atualização (coluna erro preenchida quando falhou).
+    """
+    client = client if client is not None else criar_cliente()
+    limitador = LimiteDeRequisicoes(requisicoes_por_minuto)
+
+    def tarefa(symbol, interval):
+        try:
+            return atualizar_simbolo(client, symbol, interval, start_str, end_str, diretorio, limitador)
+        except Exception as e:
+            return {'symbol': symbol, 'interval': interval, 'erro': f'{type(e).__name__}: {e}'}
+
+    with ThreadPoolExecutor(threads) as pool:
+        futuros = [pool.submit(tarefa, symbol, interval) for symbol in symbols for interval in intervals]
+        resumo = pd.DataFrame([futuro.result() for futuro in futuros])
+
+    for _, linha in resumo.iterrows():
+        if isinstance(linha.get('lacunas'), list) and linha['lacunas']:
+            print(f"{linha['symbol']} {linha['interval']}: {len(linha['lacunas'])} lacuna(s), "
+                  f"primeira depois de {linha['lacunas'][0][0]}")
+    return resumo
+
+
+if __name__ == '__main__':
+    symbols = ['SOLUSDT']
+    intervals = ['1h']
+    start_str = '20 Jul, 2017'
+    end_str = None  # até o último candle fechado
+
+    print(atualizar(symbols, intervals, start_str, end_str))
@@ -0,0 +1,453 @@
+import asyncio
+import collections
+import heapq
+import inspect
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+import arbitragem
+import armazenamento
+
+# Mesmo piso de desvio padrão de arbitragem.calcular_zscore
+EPSILON = 1e-8
+
+
+class MediaMovel:
+    """
+    Média móvel de janela fixa atualizada em O(1) por valor.
+
+    Reproduz o algoritmo de Series.rolling(janela).mean() do pandas (soma com compensação de Kahan,
+    contagem de negativos e de valores repetidos), então os resultados são idênticos bit a bit.
+    """
+
+    def __init__(self, janela):
+        self.janela = janela
+        self._valores = collections.deque()
+        self._nobs = 0
+        self._soma = 0.0
+        self._negativos = 0
+        self._compensacao_entrada = 0.0
+        self._compensacao_saida = 0.0
+        self._repetidos = 0
+        self._anterior = math.nan
+
+    def _adicionar(self, valor):
+        if valor != valor:
+            return
+        self._nobs += 1
+        y = valor - self._compensacao_entrada
+        t = self._soma + y
+        self._compensacao_entrada = t - self._soma - y
+        self._soma = t
+        if math.copysign(1.0, valor) < 0:
+            self._negativos += 1
+        if valor == self._anterior:
+            self._repetidos += 1
+        else:
+            self._repetidos = 1
+        self._anterior = valor
+
+    def _remover(self, valor):
+        if valor != valor:
+            return
+        self._nobs -= 1
+        y = -valor - self._compensacao_saida
+        t = self._soma + y
+        self._compensacao_saida = t - self._soma - y
+        self._soma = t
+        if math.copysign(1.0, valor) < 0:
+            self._negativos -= 1
+
+    def atualizar(self, valor):
+        """Inclui o próximo valor da série e retorna a média da janela (NaN até completar a janela)."""
+        valor = float(valor)
+        if self.janela == 1:
+            # Janela de 1: o pandas recomeça o acumulador a cada posição
+            self.__init__(1)
+            self._anterior = valor
+            self._repetidos = 0
+        elif len(self._valores) == self.janela:
+            self._remover(self._valores.popleft())
+        self._valores.append(valor)
+        self._adicionar(valor)
+
+        if self._nobs < self.janela or self._nobs == 0:
+            return math.nan
+        if self._repetidos >= self._nobs:
+            return self._anterior
+        media = self._soma / self._nobs
+        if self._negativos == 0 and media < 0:
+            media = 0.0
+        elif self._negativos == self._nobs and media > 0:
+            media = 0.0
+        return media
+
+
+class VarianciaMovel:
+    """
+    Variância móvel (ddof=1) de janela fixa atualizada em O(1) por valor.
+
+    Reproduz o algoritmo de Series.rolling(janela).var() do pandas (Welford com compensação de Kahan),
+    com resultados idênticos bit a bit para janelas a partir de 5 (em janelas menores com valores repetidos
+    a diferença fica nos últimos dígitos); desvio() aplica a mesma raiz de rolling().std().
+    """
+
+    def __init__(self, janela):
+        self.janela = janela
+        self._valores = collections.deque()
+        self._nobs = 0.0
+        self._media = 0.0
+        self._ssqdm = 0.0
+        self._compensacao_entrada = 0.0
+        self._compensacao_saida = 0.0
+        self._repetidos = 0
+        self._anterior = math.nan
+
+    def _adicionar(self, valor):
+        if valor != valor:
+            return
+        self._nobs += 1
+        if valor == self._anterior:
+            self._repetidos += 1
+        else:
+            self._repetidos = 1
+        self._anterior = valor
+        media_anterior = self._media - self._compensacao_entrada
+        y = valor - self._compensacao_entrada
+        t = y - self._media
+        self._compensacao_entrada = t + self._media - y
+        if self._nobs:
+            self._media = self._media + t / self._nobs
+        else:
+            self._media = 0.0
+        self._ssqdm = self._ssqdm + (valor - media_anterior) * (valor - self._media)
+        self._zerar_repetidos()
+
+    def _zerar_repetidos(self):
+        # Janela só com valores iguais: variância exatamente 0 e acumuladores recomeçam do valor repetido
+        if self._nobs and self._repetidos >= self._nobs:
+            self._media = self._anterior
+            self._ssqdm = 0.0
+            self._compensacao_entrada = 0.0
+            self._compensacao_saida = 0.0
+
+    def _remover(self, valor):
+        if valor != valor:
+            return
+        self._nobs -= 1
+        if self._nobs:
+            media_anterior = self._media - self._compensacao_saida
+            y = valor - self._compensacao_saida
+            t = y - self._media
+            self._compensacao_saida = t + self._media - y
+            self._media = self._media - t / self._nobs
+            self._ssqdm = self._ssqdm - (valor - media_anterior) * (valor - self._media)
+            self._zerar_repetidos()
+        else:
+            self._media = 0.0
+            self._ssqdm = 0.0
+
+    def atualizar(self, valor):
+        """Inclui o próximo valor da série e retorna a variância da janela (NaN até completar a janela)."""
+        valor = float(valor)
+        if self.janela == 1:
+            self.__init__(1)
+            self._anterior = valor
+            self._repetidos = 0
+        elif len(self._valores) == self.janela:
+            self._remover(self._valores.popleft())
+        self._valores.append(valor)
+        self._adicionar(valor)
+
+        if self._nobs < self.janela or self._nobs <= 1:
+            return math.nan
+        if self._repetidos >= self._nobs:
+            return 0.0
+        return self._ssqdm / (self._nobs - 1)
+
+    @staticmethod
+    def desvio(variancia):
+        # Mesma raiz do rolling().std() do pandas: variância negativa por arredondamento vira 0
+        if variancia < 0:
+            return 0.0
+        return math.sqrt(variancia)
+
+
+class MotorAoVivo:
+    """
+    gerar_sinais_com_stoploss barra a barra, para operar ao vivo.
+
+    Recebe um fechamento de cada ativo por barra e mantém de forma incremental a média e o desvio móveis
+    do spread, a média móvel do ativo 1 e o ATR do spread, além do estado da estratégia (posição, spread
+    de entrada e cooldown). O trabalho por barra é constante, qualquer que seja a janela.
+
+    Reproduzir um histórico barra a barra dá exatamente os mesmos sinais do gerador em lote (ver reproduzir).
+    """
+
+    def __init__(self, zscore_compra_e_venda, zscore_encerrar_posicao, stop_loss, cooldown_stop_loss, janela, taxa=0.001):
+        self.limite_superior = zscore_compra_e_venda
+        self.limite_inferior = -zscore_compra_e_venda
+        self.zscore_encerrar_posicao = zscore_encerrar_posicao
+        self.stop_loss = stop_loss
+        self.cooldown_stop_loss = cooldown_stop_loss
+        self.janela = janela
+        self.taxa = taxa
+
+        self._media_spread = MediaMovel(janela)
+        self._variancia_spread = VarianciaMovel(janela)
+        self._media_ativo1 = MediaMovel(janela)
+        self._atr = MediaMovel(janela)
+        self._spread_anterior = math.nan
+
+        self.barras = 0
+        self.spread = math.nan
+        self.zscore = math.nan
+        self.atr = math.nan
+        self.media_ativo1 = math.nan
+
+        self.posicao = arbitragem.NOMES_POSICOES[0]
+        self.preco_entrada = None
+        self.cooldown = 0
+
+    @property
+    def sinal(self):
+        """Sinal da última barra processada ('neutro', 'compra_1_vende_2' ou 'vende_1_compra_2')."""
+        return self.posicao
+
+    def _atualizar_indicadores(self, preco1, preco2):
+        spread = preco1 - preco2
+        media = self._media_spread.atualizar(spread)
+        desvio = VarianciaMovel.desvio(self._variancia_spread.atualizar(spread))
+        # Substituir stds muito baixos por um mínimo (como calcular_zscore)
+        if desvio == 0 or desvio != desvio:
+            desvio = EPSILON
+
+        self.spread = spread
+        self.zscore = (spread - media) / desvio
+        self.media_ativo1 = self._media_ativo1.atualizar(preco1)
+        # ATR do spread; o bfill do lote só afeta barras sem posição, então não faz diferença nos sinais
+        self.atr = self._atr.atualizar(abs(spread - self._spread_anterior))
+        self._spread_anterior = spread
+
+    def atualizar(self, preco1, preco2):
+        """
+        Processa os fechamentos de uma nova barra.
+
+        Retorna o novo sinal quando ele muda nesta barra, ou None quando continua o mesmo.
+        O sinal atual fica sempre em self.sinal.
+        """
+        preco1 = float(preco1)
+        preco2 = float(preco2)
+        self._atualizar_indicadores(preco1, preco2)
+        self.barras += 1
+
+        anterior = self.posicao
+        self._maquina_de_estados(preco1)
+        return self.posicao if self.posicao != anterior else None
+
+    def _maquina_de_estados(self, preco1):
+        nomes_posicoes = arbitragem.NOMES_POSICOES
+        zscore = self.zscore
+
+        # Se em cooldown, não faz nada
+        if self.cooldown > 0:
+            self.cooldown -= 1
+            self.posicao = nomes_posicoes[0]
+            self.preco_entrada = None
+            return
+
+        # Verifica stop loss baseado em ATR
+        if self.posicao != nomes_posicoes[0] and self.preco_entrada is not None:
+            prejuizo = (
+                self.spread - self.preco_entrada if self.posicao == nomes_posicoes[2]
+                else self.preco_entrada - self.spread
+            )
+            if prejuizo > self.stop_loss * self.atr:
+                self.posicao = nomes_posicoes[0]
+                self.cooldown = self.cooldown_stop_loss*self.janela
+                self.preco_entrada = None
+                return
+
+        # Só tenta entrar em nova posição se está neutro e não em cooldown
+        if self.posicao == nomes_posicoes[0]:
+            if zscore > self.limite_superior and arbitragem.vale_a_pena_operar(preco1, self.media_ativo1, self.taxa, 'venda'):
+                self.posicao = nomes_posicoes[2] #entra vendido no ativo 1 e comprado no 2
+                self.preco_entrada = self.spread
+            if zscore < self.limite_inferior and arbitragem.vale_a_pena_operar(preco1, self.media_ativo1, self.taxa, 'compra'):
+                self.posicao = nomes_posicoes[1] #entra comprado no ativo 1 e vendido no 2
+                self.preco_entrada = self.spread
+
+        # Verifica se deve encerrar a posição com base no z-score
+        if -0.5 < zscore < self.zscore_encerrar_posicao:
+            self.posicao = nomes_posicoes[0] #posicao mantem neutra ou encerra posicao anterior
+            self.preco_entrada = None
+
+
+def reproduzir(df, zscore_compra_e_venda, zscore_encerrar_posicao, stop_loss, cooldown_stop_loss, janela, taxa=0.001):
+    """
+    Passa um histórico (DataFrame com Ativo1 e Ativo2) barra a barra pelo MotorAoVivo.
+
+    Retorna um DataFrame com o mesmo índice de df e colunas spread, zscore, atr, sinal e transicao
+    (True nas barras em que o sinal mudou).
+    """
+    motor = MotorAoVivo(zscore_compra_e_venda, zscore_encerrar_posicao, stop_loss, cooldown_stop_loss, janela, taxa)
+    linhas = []
+    for preco1, preco2 in zip(df['Ativo1'].to_numpy(dtype=float), df['Ativo2'].to_numpy(dtype=float)):
+        transicao = motor.atualizar(preco1, preco2) is not None
+        linhas.append((motor.spread, motor.zscore, motor.atr, motor.sinal, transicao))
+    return pd.DataFrame(linhas, index=df.index, columns=['spread', 'zscore', 'atr', 'sinal', 'transicao'])
+
+
+# Execução ao vivo de vários pares sobre um único fluxo de barras.
+# Uma barra é a tupla (timestamp, simbolo, fechamento); timestamp é um inteiro em ns.
+
+
+async def barras_de_arquivos(simbolos, intervalo, inicio=None, fim=None, diretorio=armazenamento.DIRETORIO_DADOS,
+                             atraso=0.0):
+    """
+    Reproduz os fechamentos gravados de vários símbolos como um fluxo único, em ordem de timestamp.
+    'atraso' (segundos) espera entre um timestamp e o próximo, para simular o ritmo da corretora.
+    """
+    series = [(simbolo, armazenamento.abrir_candles(simbolo, intervalo, diretorio).serie('close', inicio, fim))
+              for simbolo in simbolos]
+    fluxos = [zip(serie.index.asi8.tolist(), [simbolo] * len(serie), serie.to_numpy().tolist())
+              for simbolo, serie in series]
+    anterior = None
+    for barra in heapq.merge(*fluxos):
+        if atraso and anterior is not None and barra[0] != anterior:
+            await asyncio.sleep(atraso)
+        anterior = barra[0]
+        yield barra
+        # Devolve o controle ao loop para as tarefas dos pares andarem junto com a leitura
+        await asyncio.sleep(0)
+
+
+async def barras_de_socket(host, porta):
+    """Lê barras de uma conexão TCP, uma por linha no formato 'timestamp_ns,simbolo,fechamento'."""
+    leitor, escritor = await asyncio.open_connection(host, porta)
+    try:
+        while linha := await leitor.readline():
+            timestamp, simbolo, fechamento = linha.decode().strip().split(',')
+            yield int(timestamp), simbolo, float(fechamento)
+    finally:
+        escritor.close()
+        await escritor.wait_closed()
+
+
+async def servir_barras(fonte, host='127.0.0.1', porta=0):
+    """
+    Servidor TCP que repete as barras de 'fonte' (ex: barras_de_arquivos) para o primeiro cliente que conectar,
+    fazendo o papel da corretora em testes. Retorna o asyncio.Server (a porta escolhida fica em server.sockets).
+    """
+    async def atender(leitor, escritor):
+        async for timestamp, simbolo, fechamento in fonte:
+            escritor.write(f'{timestamp},{simbolo},{fechamento!r}\n'.encode())
+            await escritor.drain()
+        escritor.close()
+        await escritor.wait_closed()
+
+    return await asyncio.start_server(atender, host, porta)
+
+
+class ExecutorPares:
+    """
+    Roda um MotorAoVivo por par sobre um único fluxo de barras.
+
+    Cada barra recebida vai para a fila de todos os pares que usam o símbolo; cada par roda numa tarefa
+    própria e atualiza o motor quando chegam os dois fechamentos do mesmo timestamp (as mesmas barras em comum
+    que carregar_par usa). A latência de cada sinal é medida da chegada da barra que completou o par até o
+    motor terminar a atualização.
+
+    Parâmetros:
+    - pares: lista de pares [moeda1, moeda2] (símbolos f'{moeda}USDT', como em otimizacao)
+    - parametros: argumentos do MotorAoVivo; um dicionário para todos os pares ou um por par (mesma ordem)
+    - ao_sinal: função (ou corrotina) chamada como ao_sinal(par, timestamp, sinal) a cada mudança de sinal
+    """
+
+    def __init__(self, pares, parametros, taxa=0.001, ao_sinal=None):
+        if isinstance(parametros, dict):
+            parametros = [parametros] * len(pares)
+        self.pares = [tuple(par) for par in pares]
+        self.motores = {par: MotorAoVivo(**params, taxa=taxa) for par, params in zip(self.pares, parametros)}
+        self.ao_sinal = ao_sinal
+        self.filas = {par: asyncio.Queue() for par in self.pares}
+        self.assinantes = collections.defaultdict(list)
+        for par in self.pares:
+            for perna, moeda in enumerate(par):
+                self.assinantes[f'{moeda}USDT'].append((par, perna))
+        self.latencias = {par: [] for par in self.pares}
+        self.transicoes = {par: [] for par in self.pares}
+        self.incompletas = dict.fromkeys(self.pares, 0)
+
+    async def _rodar_par(self, par):
+        fila = self.filas[par]
+        motor = self.motores[par]
+        timestamp_atual, precos = None, [None, None]
+        while (item := await fila.get()) is not None:
+            timestamp, perna, fechamento, chegada = item
+            if timestamp != timestamp_atual:
+                # Barra anterior sem a outra perna: fica de fora, como no dropna do lote
+                if timestamp_atual is not None:
+                    self.incompletas[par] += 1
+                timestamp_atual, precos = timestamp, [None, None]
+            precos[perna] = fechamento
+            if precos[0] is None or precos[1] is None:
+                continue
+            novo = motor.atualizar(precos[0], precos[1])
+            self.latencias[par].append(time.perf_counter() - chegada)
+            timestamp_atual = None
+            if novo is not None:
+                self.transicoes[par].append((timestamp, novo))
+                if self.ao_sinal is not None:
+                    retorno = self.ao_sinal(par, pd.Timestamp(timestamp), novo)
+                    if inspect.isawaitable(retorno):
+                        await retorno
+        if timestamp_atual is not None:
+            self.incompletas[par] += 1
+
+    async def executar(self, fonte):
+        """Consome o fluxo de barras até o fim e espera todos os pares processarem o que receberam."""
+        tarefas = [asyncio.create_task(self._rodar_par(par)) for par in self.pares]
+        try:
+            async for timestamp, simbolo, fechamento in fonte:
+                chegada = time.perf_counter()
+                for par, perna in self.assinantes.get(simbolo, ()):
+                    self.filas[par].put_nowait((timestamp, perna, fechamento, chegada))
+            for fila in self.filas.values():
+                fila.put_nowait(None)
+            await asyncio.gather(*tarefas)
+        finally:
+            for tarefa in tarefas:
+                tarefa.cancel()
+        return self.relatorio()
+
+    def relatorio(self):
+        """Barras, mudanças de sinal, sinal atual e latência (microssegundos) por par."""
+        linhas = []
+        for par in self.pares:
+            latencias = np.array(self.latencias[par]) * 1e6
+            linhas.append({
+                'Moeda1': par[0], 'Moeda2': par[1],
+                'barras': len(latencias), 'incompletas': self.incompletas[par],
+                'transicoes': len(self.transicoes[par]), 'sinal': self.motores[par].sinal,
+                'latencia_media_us': latencias.mean() if len(latencias) else np.nan,
+                'latencia_p50_us': np.percentile(latencias, 50) if len(latencias) else np.nan,
+                'latencia_p99_us': np.percentile(latencias, 99) if len(latencias) else np.nan,
+                'latencia_max_us': latencias.max() if len(latencias) else np.nan,
+            })
+        return pd.DataFrame(linhas)
+
+
+def executar_pares(pares, parametros, intervalo, inicio=None, fim=None, taxa=0.001, ao_sinal=None,
+                   diretorio=armazenamento.DIRETORIO_DADOS, atraso=0.0):
+    """
+    Atalho síncrono: reproduz os arquivos locais de todos os símbolos dos pares pelo ExecutorPares.
+    Dentro de um notebook (que já tem um loop rodando), use await ExecutorPares(...).executar(fonte).
+    """
+    executor = ExecutorPares(pares, parametros, taxa, ao_sinal)
+    simbolos = sorted(executor.assinantes)
+    fonte = barras_de_arquivos(simbolos, intervalo, inicio, fim, diretorio, atraso)
+    return asyncio.run(executor.executar(fonte))
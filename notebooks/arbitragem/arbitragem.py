@@ -4,21 +4,27 @@ import matplotlib.pyplot as plt
 import statsmodels.api as sm  #regressão linear
 from statsmodels.tsa.stattools import coint, adfuller #pra verificar cointegração por engle-granger e dickey-fuller
 import itertools
+import cointegracao
+import armazenamento
+import instrumentacao
+import math
+import bisect
+import collections
+import hashlib
+import os
 
 # Carregar dados
-def carregar_dados(moeda1, moeda2, PATH="5m"):
-    path_ativo_1 = f'../../data/fechamentos/{moeda1}USDT_{PATH}_data.csv'
-    path_ativo_2 = f'../../data/fechamentos/{moeda2}USDT_{PATH}_data.csv'
-
-    ativo1 = pd.read_csv(path_ativo_1, parse_dates=['timestamp'], index_col='timestamp')
-    ativo2 = pd.read_csv(path_ativo_2, parse_dates=['timestamp'], index_col='timestamp')
-
-    # Elimina NaNs restantes
-    df = pd.DataFrame({
-        'Ativo1': ativo1['close'],
-        'Ativo2': ativo2['close']
-    }).dropna()
+def carregar_dados(moeda1, moeda2, PATH="5m", data_inicial=None, data_final=None):
+    """
+    Carrega os fechamentos dos dois ativos alinhados no tempo (sem NaNs), opcionalmente já recortados
+    em [data_inicial, data_final] com a mesma semântica de .loc.
 
+    Os CSVs de data/fechamentos são convertidos uma vez para o formato colunar de armazenamento.py
+    e depois abertos por memory-map, então chamadas repetidas não releem os CSVs.
+    """
+    with instrumentacao.etapa('carregar_dados') as etapa:
+        df = armazenamento.carregar_par(f'{moeda1}USDT', f'{moeda2}USDT', PATH, data_inicial, data_final)
+        etapa.linhas = len(df)
     return df
 
 
@@ -45,7 +51,7 @@ def testar_cointegracao(series1, series2, signif=0.05):
 
 from statsmodels.tsa.stattools import coint, adfuller
 
-def testar_cointegracao_movel(series1, series2, janela, signif=0.05):
+def testar_cointegracao_movel(series1, series2, janela, signif=0.05, defasagens=1, passo=1):
     """
     Testa cointegração móvel entre duas séries de preços usando Engle-Granger.
     
@@ -59,35 +65,15 @@ def testar_cointegracao_movel(series1, series2, janela, signif=0.05):
         - pvalor Engle-Granger < signif
         - pvalor ADF nos resíduos < signif
     Caso contrário, retorna False.
-    """
 
-    resultados = []
+    O cálculo é feito de forma incremental por cointegracao.cointegracao_movel, com número fixo
+    de 'defasagens' no ADF. Com passo > 1 testa a cada 'passo' barras e repete o resultado entre testes.
+    """
+    with instrumentacao.etapa('cointegracao_movel', len(series1)):
+        resultados = cointegracao.cointegracao_movel(series1, series2, janela, defasagens, passo, signif)
 
     #Janela válida até final da série
-    for i in range(janela, len(series1)):
-
-        # Pega apenas a janela atual (e.g: 5 até 10 se: janela=5 e i=10)
-        window1 = series1[i - janela:i]
-        window2 = series2[i - janela:i]
-
-        # Regressão linear: series1 ~ series2
-        X = sm.add_constant(window2)  # adiciona intercepto
-        model = sm.OLS(window1, X).fit()
-        residuos = model.resid
-
-        # Teste Engle-Granger
-        _, pval_coint, _ = coint(window1, window2)
-
-        # Teste Dickey-Fuller nos resíduos
-        _, pval_adf, _, _, _, _ = adfuller(residuos)
-
-        # Só é cointegrado se ambos testes rejeitarem H0
-        cointegrado = (pval_coint < signif) and (pval_adf < signif)
-        resultados.append(cointegrado)
-
-    print(resultados)
-
-    return resultados
+    return resultados['cointegrado'].iloc[janela:].tolist()
 # Zscore
 def calcular_zscore(spread, window=60):
     rolling_mean = spread.rolling(window=window).mean() #média da última janela
@@ -149,155 +135,448 @@ def vale_a_pena_operar(cotacao_atual, cotacao_futura_esperada, taxa=0.01, tipo_o
         raise ValueError("tipo_operacao deve ser 'compra' ou 'venda'")
 
 
-# Estratégia de sinalização
-def gerar_sinais_com_stoploss(df, zscore_compra_e_venda, zscore_encerrar_posicao, stop_loss, cooldown_stop_loss, janela, taxa=0.001):
+# Motor de sinais vetorizado
+NOMES_POSICOES = ["neutro", "compra_1_vende_2", "vende_1_compra_2"]
+
+def _condicoes_de_entrada(zscore, ativo1, media_movel_ativo1, limite_superior, limite_inferior, taxa):
+    """
+    Calcula, para todas as barras de uma vez, as condições de entrada usadas pelos geradores de sinais.
+
+    Retorna:
+    - entra_vendido: zscore acima do limite superior e operação vendida no ativo 1 cobre as taxas
+    - entra_comprado: zscore abaixo do limite inferior e operação comprada no ativo 1 cobre as taxas
+    """
+    # vale_a_pena_operar só usa operações aritméticas, então funciona direto com arrays
+    entra_vendido = (zscore > limite_superior) & vale_a_pena_operar(ativo1, media_movel_ativo1, taxa, 'venda')
+    entra_comprado = (zscore < limite_inferior) & vale_a_pena_operar(ativo1, media_movel_ativo1, taxa, 'compra')
+    return entra_vendido, entra_comprado
+
+def _primeiro_stop(spread, atr, spread_lista, atr_lista, inicio, fim, preco_entrada, codigo_posicao, stop_loss):
+    """
+    Procura a primeira barra em [inicio, fim) onde o stop loss por ATR é atingido.
+    As primeiras barras são checadas uma a uma (operações curtas são a maioria) e o resto
+    é varrido com NumPy em blocos crescentes, para não percorrer a operação inteira quando o stop sai cedo.
+
+    Retorna o índice da barra ou None se o stop não for atingido.
+    """
+    fim_curto = min(inicio + 16, fim)
+    for i in range(inicio, fim_curto):
+        prejuizo = spread_lista[i] - preco_entrada if codigo_posicao == 2 else preco_entrada - spread_lista[i]
+        if prejuizo > stop_loss * atr_lista[i]:
+            return i
+
+    inicio = fim_curto
+    bloco = 64
+    while inicio < fim:
+        parada = min(inicio + bloco, fim)
+        trecho = spread[inicio:parada]
+        prejuizo = trecho - preco_entrada if codigo_posicao == 2 else preco_entrada - trecho
+        atingiu = prejuizo > stop_loss * atr[inicio:parada]
+        if atingiu.any():
+            return inicio + int(np.argmax(atingiu))
+        inicio = parada
+        bloco *= 2
+    return None
+
+def _sinais_com_stoploss_array(spread, atr, zscore, entra_vendido, entra_comprado, zscore_encerrar_posicao, stop_loss, cooldown):
+    """
+    Máquina de estados de gerar_sinais_com_stoploss sobre arrays NumPy.
+
+    Em vez de visitar barra a barra, salta direto entre eventos: próxima entrada enquanto neutro,
+    e primeira saída (z-score ou stop) enquanto posicionado.
+
+    Retorna um array int8 com o código da posição em cada barra (índice de NOMES_POSICOES).
+    """
+    n = len(spread)
+    codigos = np.zeros(n, dtype=np.int8)
+
+    encerra = (-0.5 < zscore) & (zscore < zscore_encerrar_posicao)
+
+    # Posição assumida a partir do estado neutro (a venda é avaliada antes da compra e o encerramento por último)
+    alvo = np.zeros(n, dtype=np.int8)
+    alvo[entra_vendido] = 2
+    alvo[entra_comprado] = 1
+    alvo[encerra] = 0
+
+    barras_entrada = np.flatnonzero(alvo).tolist()
+    barras_encerramento = np.flatnonzero(encerra).tolist()
+    barras_cooldown = max(0, math.ceil(cooldown))
+    spread_lista = spread.tolist()
+    atr_lista = atr.tolist()
+
+    i = 0
+    while i < n:
+        k = bisect.bisect_left(barras_entrada, i)
+        if k == len(barras_entrada):
+            break
+        entrada = barras_entrada[k]
+        codigo_posicao = int(alvo[entrada])
+        preco_entrada = spread_lista[entrada]
+
+        # Primeira barra após a entrada em que o z-score encerra a posição
+        k = bisect.bisect_left(barras_encerramento, entrada + 1)
+        saida = barras_encerramento[k] if k < len(barras_encerramento) else n
+
+        # O stop é verificado antes do encerramento por z-score na mesma barra
+        stop = _primeiro_stop(spread, atr, spread_lista, atr_lista, entrada + 1, min(saida + 1, n), preco_entrada, codigo_posicao, stop_loss)
+        if stop is not None:
+            codigos[entrada:stop] = codigo_posicao
+            i = stop + 1 + barras_cooldown
+        else:
+            codigos[entrada:saida] = codigo_posicao
+            i = saida + 1
+
+    return codigos
+
+def _sinais_array(zscore, entra_vendido, entra_comprado, zscore_encerrar_posicao):
+    """
+    Máquina de estados de gerar_sinais sobre arrays NumPy.
+
+    Sem stop loss a posição só muda quando alguma condição é satisfeita na barra,
+    então basta marcar essas barras e propagar o último estado (forward fill).
+
+    Retorna um array int8 com o código da posição em cada barra (índice de NOMES_POSICOES).
+    """
+    n = len(zscore)
+    codigos = np.full(n, -1, dtype=np.int8)
+    codigos[entra_vendido] = 2
+    codigos[entra_comprado] = 1
+    codigos[(-zscore_encerrar_posicao < zscore) & (zscore < zscore_encerrar_posicao)] = 0
+
+    ultimo_evento = np.maximum.accumulate(np.where(codigos >= 0, np.arange(n), -1))
+    return np.where(ultimo_evento >= 0, codigos[ultimo_evento], 0).astype(np.int8)
+
+# Estatísticas móveis dos sinais
+def calcular_features(df, janela, cointegracao_movel=True):
+    """
+    Calcula as estatísticas móveis usadas por gerar_sinais e gerar_sinais_com_stoploss.
+
+    Elas dependem só dos preços e da janela, então podem ser calculadas uma vez por par e janela
+    e reaproveitadas por todas as combinações de zscore. Todas olham apenas para o passado, logo as
+    features da série inteira valem para qualquer recorte que comece no mesmo ponto (ver recortar_features).
+
+    Parâmetros:
+    - df: DataFrame com colunas Ativo1 e Ativo2
+    - janela: tamanho da janela móvel
+    - cointegracao_movel: se False, não roda o teste de cointegração móvel (só gerar_sinais usa)
+
+    Retorna:
+    - dicionário com a janela e as Series alinhadas ao índice de df
+    """
     series1 = df['Ativo1']
     series2 = df['Ativo2']
 
+    with instrumentacao.etapa('estatisticas_moveis', len(df)):
+        spread = calcular_spread(series1, series2)
+        rolling_mean, rolling_std, zscore = calcular_zscore(spread, janela) #Zscore com janela movel
+        media_movel_ativo1, media_movel_ativo2, ativo1_std, ativo2_std = calcular_media_ativos(series1, series2, janela) #media movel do ativo 1 e 2
+
+        # Calcular ATR do spread
+        spread_diff = spread.diff().abs()
+        atr = spread_diff.rolling(window=janela).mean().bfill()
+
+    features = {
+        'janela': janela,
+        'spread': spread,
+        'rolling_mean': rolling_mean,
+        'rolling_std': rolling_std,
+        'zscore': zscore,
+        'ativo1_mean': media_movel_ativo1,
+        'ativo2_mean': media_movel_ativo2,
+        'ativo1_std': ativo1_std,
+        'ativo2_std': ativo2_std,
+        'atr': atr,
+    }
+    if cointegracao_movel:
+        features['status_cointegracao'] = _status_cointegracao(series1, series2, janela)
+    return features
+
+def _status_cointegracao(series1, series2, janela):
+    # Teste de cointegração móvel
+    resultados_cointegracao = testar_cointegracao_movel(series1, series2, janela)
+    # Preenche início com False para alinhar ao tamanho da série
+    status_cointegracao = [False]*janela + resultados_cointegracao
+    return pd.Series(status_cointegracao, index=series1.index)
+
+def recortar_features(features, inicio=None, fim=None):
+    """
+    Recorta por posição as features de calcular_features, para usar junto com df.iloc[inicio:fim].
+
+    O resultado é idêntico a recalcular as features no recorte quando ele começa no início da série
+    (como os folds do TimeSeriesSplit). Recortes que começam depois herdam o histórico anterior nas janelas.
+    """
+    return {nome: valor.iloc[inicio:fim] if isinstance(valor, pd.Series) else valor
+            for nome, valor in features.items()}
+
+def _conferir_features(features, df, janela):
+    if features['janela'] != janela:
+        raise ValueError(f"features calculadas com janela {features['janela']}, mas a simulação usa janela {janela}")
+    if len(features['zscore']) != len(df):
+        raise ValueError("features e df têm tamanhos diferentes; use recortar_features com o mesmo recorte de df")
+
+# Cache de features móveis
+# Quantas combinações (preços, janela) ficam em memória; a menos usada recentemente sai primeiro
+TAMANHO_CACHE_FEATURES = 16
+# Se definido, as features também são guardadas em disco (um .pkl por combinação) e sobrevivem entre sessões
+DIRETORIO_CACHE_FEATURES = None
+
+_cache_features = collections.OrderedDict()
+
+def assinatura_precos(df):
+    """Hash dos timestamps e preços (Ativo1, Ativo2) de um DataFrame; identifica o par e o intervalo de datas."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.ascontiguousarray(df.index.asi8).tobytes())
+    h.update(np.ascontiguousarray(df[['Ativo1', 'Ativo2']].to_numpy(dtype=float)).tobytes())
+    return h.hexdigest()
+
+def features_em_cache(df, janela, cointegracao_movel=True, diretorio=None):
+    """
+    Mesmo resultado de calcular_features, mas reaproveitado entre chamadas com os mesmos preços e janela.
+
+    O cache em memória guarda até TAMANHO_CACHE_FEATURES combinações (LRU). Com 'diretorio'
+    (ou DIRETORIO_CACHE_FEATURES) as features também são lidas/gravadas em disco.
+    Os dicionários retornados são compartilhados entre chamadas e não devem ser alterados.
+    """
+    diretorio = diretorio or DIRETORIO_CACHE_FEATURES
+    chave = (assinatura_precos(df), janela)
+
+    features = _cache_features.get(chave)
+    if features is not None:
+        instrumentacao.contar('cache_features.memoria')
+    caminho = os.path.join(diretorio, f'{chave[0]}_{janela}.pkl') if diretorio else None
+    if features is None and caminho and os.path.exists(caminho):
+        features = pd.read_pickle(caminho)
+        instrumentacao.contar('cache_features.disco')
+
+    atualizar_disco = False
+    if features is None:
+        instrumentacao.contar('cache_features.calculadas')
+        features = calcular_features(df, janela, cointegracao_movel)
+        atualizar_disco = True
+    elif cointegracao_movel and 'status_cointegracao' not in features:
+        features = {**features, 'status_cointegracao': _status_cointegracao(df['Ativo1'], df['Ativo2'], janela)}
+        atualizar_disco = True
+
+    if caminho and (atualizar_disco or not os.path.exists(caminho)):
+        os.makedirs(diretorio, exist_ok=True)
+        temporario = f'{caminho}.tmp{os.getpid()}'
+        pd.to_pickle(features, temporario)
+        os.replace(temporario, caminho)
+
+    _cache_features[chave] = features
+    _cache_features.move_to_end(chave)
+    while len(_cache_features) > TAMANHO_CACHE_FEATURES:
+        _cache_features.popitem(last=False)
+    return features
+
+def limpar_cache_features():
+    """Esvazia o cache de features em memória (o de disco fica)."""
+    _cache_features.clear()
+
+# Colunas de estatísticas móveis do DataFrame de sinais (as que SinaisCompactos não copia)
+COLUNAS_AUXILIARES = ['ativo1_mean', 'ativo2_mean', 'ativo1_std', 'ativo2_std', 'spread', 'rolling_mean',
+                      'rolling_std', 'zscore']
+
+def _montar_df_sinais(df, features, codigos, status_cointegracao=None, float32=False):
+    """
+    DataFrame de sinais dos geradores: preços, estatísticas móveis e o sinal em texto, só nas linhas sem NaN.
+    status_cointegracao entra como segunda coluna quando dado (gerar_sinais); float32 converte as colunas
+    auxiliares.
+    """
+    colunas = {'timestamp': df.index}
+    if status_cointegracao is not None:
+        colunas['status_cointegracao'] = status_cointegracao
+    colunas.update({
+        'Ativo1': pd.to_numeric(df['Ativo1'], errors='coerce'),
+        'Ativo2': pd.to_numeric(df['Ativo2'], errors='coerce'),
+        'ativo1_mean': features['ativo1_mean'],
+        'ativo2_mean': features['ativo2_mean'],
+        'ativo1_std': features['ativo1_std'],
+        'ativo2_std': features['ativo2_std'],
+        'spread': pd.to_numeric(features['spread'], errors='coerce'),
+        'rolling_mean': features['rolling_mean'].values,
+        'rolling_std': features['rolling_std'].values,
+        'zscore': features['zscore'].values,
+        'sinal': np.array(NOMES_POSICOES, dtype=object)[codigos].tolist()
+    })
+    df_sinais = pd.DataFrame(colunas).dropna()
+    if float32:
+        df_sinais = df_sinais.astype({coluna: np.float32 for coluna in COLUNAS_AUXILIARES})
+    return df_sinais
+
+# Estratégia de sinalização
+@instrumentacao.medir('gerar_sinais_com_stoploss')
+def gerar_sinais_com_stoploss(df, zscore_compra_e_venda, zscore_encerrar_posicao, stop_loss, cooldown_stop_loss, janela, taxa=0.001, features=None, saida=None, compacto=False):
+    series1 = df['Ativo1']
+
     limite_superior =zscore_compra_e_venda
     limite_inferior = -zscore_compra_e_venda
 
-    spread = calcular_spread(series1, series2)
-    rolling_mean, rolling_std, zscore = calcular_zscore(spread, janela) #Zscore com janela movel
-    media_movel_ativo1, media_movel_ativo2, ativo1_std, ativo2_std = calcular_media_ativos(series1, series2, janela) #media movel do ativo 1 e 2
-
-    # Calcular ATR do spread
-    spread_diff = spread.diff().abs()
-    atr = spread_diff.rolling(window=janela).mean().bfill()
-
-    nomes_posicoes = ["neutro", "compra_1_vende_2", "vende_1_compra_2"]
-    posicao = nomes_posicoes[0] #comprado_vendido, vendido_comprado, encerrar, Neutro
-    cooldown = 0
-    sinais_compra_e_venda = []
-    preco_entrada = None
-
-    for i in range(len(df)):
-        spread_atual = spread.iloc[i]
-        atr_atual = atr.iloc[i]
-
-        # Se em cooldown, não faz nada
-        if cooldown > 0:
-            cooldown -= 1
-            sinais_compra_e_venda.append(nomes_posicoes[0])
-            posicao = nomes_posicoes[0]
-            preco_entrada = None
-            continue
+    # Estatísticas móveis (recebidas prontas ou calculadas aqui)
+    if features is None:
+        features = features_em_cache(df, janela, cointegracao_movel=False)
+    _conferir_features(features, df, janela)
+    spread = features['spread']
+    zscore = features['zscore']
+    media_movel_ativo1 = features['ativo1_mean']
+
+    entra_vendido, entra_comprado = _condicoes_de_entrada(
+        zscore.to_numpy(), series1.to_numpy(), media_movel_ativo1.to_numpy(), limite_superior, limite_inferior, taxa)
+
+    with instrumentacao.etapa('sinais_com_stoploss', len(df)):
+        codigos = _sinais_com_stoploss_array(
+            spread.to_numpy(), features['atr'].to_numpy(), zscore.to_numpy(), entra_vendido, entra_comprado,
+            zscore_encerrar_posicao, stop_loss, cooldown_stop_loss*janela)
+    # Modo compacto: só os códigos de posição, sem montar o DataFrame (ver SinaisCompactos)
+    if compacto:
+        if saida is not None:
+            raise ValueError("compacto=True não grava em saida; grave sinais.para_dataframe()")
+        return SinaisCompactos(df, features, codigos)
 
-        # Verifica stop loss baseado em ATR
-        if posicao != nomes_posicoes[0] and preco_entrada is not None:
-            prejuizo = (
-                spread_atual - preco_entrada if posicao == nomes_posicoes[2]
-                else preco_entrada - spread_atual
-            )
-            if prejuizo > stop_loss * atr_atual:
-                posicao = nomes_posicoes[0]
-                cooldown = cooldown_stop_loss*janela
-                preco_entrada = None
-                sinais_compra_e_venda.append("neutro")
-                continue  # sai daqui e não avalia entrada nova
-
-        # Só tenta entrar em nova posição se está neutro e não em cooldown
-        if posicao == nomes_posicoes[0]:
-            if zscore.iloc[i] > limite_superior and vale_a_pena_operar(df['Ativo1'].iloc[i], media_movel_ativo1.iloc[i], taxa, 'venda'):
-                posicao = nomes_posicoes[2] #entra vendido no ativo 1 e comprado no 2
-                preco_entrada = spread_atual
-            if zscore.iloc[i] < limite_inferior and vale_a_pena_operar(df['Ativo1'].iloc[i], media_movel_ativo1.iloc[i], taxa, 'compra'):
-                posicao = nomes_posicoes[1] #entra comprado no ativo 1 e vendido no 2
-                preco_entrada = spread_atual
-
-        # Verifica se deve encerrar a posição com base no z-score
-        if (-0.5 < zscore.iloc[i] < zscore_encerrar_posicao):
-            posicao = nomes_posicoes[0] #posicao mantem neutra ou encerra posicao anterior
-            preco_entrada = None
-            
-        sinais_compra_e_venda.append(posicao)
-    
     # Resultado final
-    df_sinais = pd.DataFrame({
-        'timestamp': df.index,
-        'Ativo1': pd.to_numeric(series1, errors='coerce'),
-        'Ativo2': pd.to_numeric(series2, errors='coerce'),
-        'ativo1_mean': media_movel_ativo1,
-        'ativo2_mean': media_movel_ativo2,
-        'ativo1_std': ativo1_std, 
-        'ativo2_std': ativo2_std,
-        'spread': pd.to_numeric(spread, errors='coerce'),
-        'rolling_mean': rolling_mean.values,
-        'rolling_std': rolling_std.values,
-        'zscore': zscore.values,
-        'sinal': sinais_compra_e_venda
-    }).dropna()
-    
-    df_sinais.to_excel('resultados/estrategia.xlsx', index=False)
+    df_sinais = _montar_df_sinais(df, features, codigos)
+
+    # Só grava se pedirem um destino (saidas.py); o Excel virou um passo explícito (saidas.exportar_excel)
+    if saida is not None:
+        with instrumentacao.etapa('gravacao', len(df_sinais)):
+            saida.gravar('estrategia', df_sinais)
 
     return df_sinais
 
 # Estratégia de sinalização
-def gerar_sinais(df, zscore_compra_e_venda, zscore_encerrar_posicao, stop_loss, cooldown_stop_loss, janela, taxa=0.001):
+@instrumentacao.medir('gerar_sinais')
+def gerar_sinais(df, zscore_compra_e_venda, zscore_encerrar_posicao, stop_loss, cooldown_stop_loss, janela, taxa=0.001, features=None, saida=None, compacto=False):
     series1 = df['Ativo1']
     series2 = df['Ativo2']
 
     limite_superior =zscore_compra_e_venda
     limite_inferior = -zscore_compra_e_venda
 
-    # Teste de cointegração móvel
-    resultados_cointegracao = testar_cointegracao_movel(series1, series2, janela)
-    # Preenche início com False para alinhar ao tamanho da série
-    status_cointegracao = [False]*janela + resultados_cointegracao
-    status_cointegracao = pd.Series(status_cointegracao, index=series1.index)
-    
-    spread = calcular_spread(series1, series2)
-    rolling_mean, rolling_std, zscore = calcular_zscore(spread, janela) #Zscore com janela movel
-    media_movel_ativo1, media_movel_ativo2, ativo1_std, ativo2_std = calcular_media_ativos(series1, series2, janela) #media movel do ativo 1 e 2
-
-    nomes_posicoes = ["neutro", "compra_1_vende_2", "vende_1_compra_2"]
-    posicao = nomes_posicoes[0] #comprado_vendido, vendido_comprado, encerrar, Neutro
+    # Estatísticas móveis (recebidas prontas ou calculadas aqui)
+    if features is None:
+        features = features_em_cache(df, janela)
+    _conferir_features(features, df, janela)
+    status_cointegracao = features.get('status_cointegracao')
+    if status_cointegracao is None and not compacto:
+        status_cointegracao = _status_cointegracao(series1, series2, janela)
+    spread = features['spread']
+    zscore = features['zscore']
+    media_movel_ativo1 = features['ativo1_mean']
+
+    entra_vendido, entra_comprado = _condicoes_de_entrada(
+        zscore.to_numpy(), series1.to_numpy(), media_movel_ativo1.to_numpy(), limite_superior, limite_inferior, taxa)
+
+    with instrumentacao.etapa('sinais', len(df)):
+        codigos = _sinais_array(zscore.to_numpy(), entra_vendido, entra_comprado, zscore_encerrar_posicao)
+    # Modo compacto: só os códigos de posição, sem montar o DataFrame (ver SinaisCompactos)
+    if compacto:
+        if saida is not None:
+            raise ValueError("compacto=True não grava em saida; grave sinais.para_dataframe()")
+        return SinaisCompactos(df, features, codigos, status_cointegracao, janela_cointegracao=janela)
 
-    
-    sinais_compra_e_venda = []
-
-    for i in range(len(df)):
-        linha_df = df.iloc[i]
-        '''
-        if zscore.iloc[i] > limite_superior:
-            posicao = nomes_posicoes[2] #entra vendido no ativo 1 e comprado no 2
-        if zscore.iloc[i] < -limite_inferior:
-            posicao = nomes_posicoes[1] #entra comprado no ativo 1 e vendido no 2
-        '''
-        if zscore.iloc[i] > limite_superior and vale_a_pena_operar(df['Ativo1'].iloc[i], media_movel_ativo1.iloc[i], taxa, 'venda'):
-            posicao = nomes_posicoes[2] #entra vendido no ativo 1 e comprado no 2
-        if zscore.iloc[i] < limite_inferior and vale_a_pena_operar(df['Ativo1'].iloc[i], media_movel_ativo1.iloc[i], taxa, 'compra'):
-            posicao = nomes_posicoes[1] #entra comprado no ativo 1 e vendido no 2
-
-
-        if (-zscore_encerrar_posicao < zscore.iloc[i] < zscore_encerrar_posicao):
-            posicao = nomes_posicoes[0] #posicao mantem neutra ou encerra posicao anterior
-        ##if stoploss
-        sinais_compra_e_venda.append(posicao)
-    
     # Resultado final
-    df_sinais = pd.DataFrame({
-        'timestamp': df.index,
-        'status_cointegracao': status_cointegracao,
-        'Ativo1': pd.to_numeric(series1, errors='coerce'),
-        'Ativo2': pd.to_numeric(series2, errors='coerce'),
-        'ativo1_mean': media_movel_ativo1,
-        'ativo2_mean': media_movel_ativo2,
-        'ativo1_std': ativo1_std, 
-        'ativo2_std': ativo2_std,
-        'spread': pd.to_numeric(spread, errors='coerce'),
-        'rolling_mean': rolling_mean.values,
-        'rolling_std': rolling_std.values,
-        'zscore': zscore.values,
-        'sinal': sinais_compra_e_venda
-    }).dropna()
-    
-
+    df_sinais = _montar_df_sinais(df, features, codigos, status_cointegracao)
 
-    df_sinais.to_excel('resultados/estrategia.xlsx', index=False)
+    # Só grava se pedirem um destino (saidas.py); o Excel virou um passo explícito (saidas.exportar_excel)
+    if saida is not None:
+        with instrumentacao.etapa('gravacao', len(df_sinais)):
+            saida.gravar('estrategia', df_sinais)
 
     return df_sinais
 
+def _pontos_de_trade(neutro):
+    """
+    Linhas de entrada e de saída dos trades encerrados, pelas regras de simular_trades: a partir da segunda
+    linha, entra no primeiro sinal diferente de neutro e sai no próximo neutro.
+    """
+    n = len(neutro)
+    # Entradas: sinal != neutro logo após um neutro (ou na segunda linha); saídas: primeiro neutro depois disso
+    anterior_neutro = np.empty(n, dtype=bool)
+    anterior_neutro[:1] = False
+    anterior_neutro[1:2] = True
+    anterior_neutro[2:] = neutro[1:-1]
+    entradas = np.flatnonzero(~neutro & anterior_neutro)
+    saidas = np.flatnonzero(neutro[1:] & ~neutro[:-1]) + 1
+    saidas = saidas[saidas >= 2]
+    return entradas[:len(saidas)], saidas
+
+def _retornos_dos_trades(precos1, precos2, entradas, saidas, compra_1_vende_2, taxa):
+    # Retorno bruto de cada perna, descontando taxa de entrada + taxa de saída
+    retorno_1 = (precos1[saidas] / precos1[entradas]) - 1
+    retorno_2 = (precos2[saidas] / precos2[entradas]) - 1
+    retorno_1 -= 2 * taxa
+    retorno_2 -= 2 * taxa
+    return np.where(compra_1_vende_2, retorno_1 - retorno_2, retorno_2 - retorno_1)
+
+def _capital_dos_trades(retornos, capital_inicial):
+    # Capital ajustado pelo retorno de cada operação, na mesma ordem de multiplicação do laço original
+    return np.cumprod(np.concatenate(([capital_inicial], 1 + retornos)))
+
+def trades_dos_codigos(codigos, precos1, precos2, taxa=0.001):
+    """
+    Trades encerrados a partir dos códigos de posição (índice de NOMES_POSICOES), com as regras de simular_trades.
+    codigos e preços são só as linhas válidas (as do DataFrame de sinais).
+
+    Retorna (linhas de entrada, linhas de saída, código da posição, retorno de cada trade).
+    """
+    entradas, saidas = _pontos_de_trade(codigos == 0)
+    posicoes = codigos[entradas]
+    return entradas, saidas, posicoes, _retornos_dos_trades(precos1, precos2, entradas, saidas, posicoes == 1, taxa)
+
+def simular_trades(df, capital_inicial=10000, taxa=0.001, curva_capital=False):
+    """
+    Simula retorno por trade de uma estratégia de pares, com operações vetorizadas.
+
+    Mesmas regras de simular_retorno_por_trade: a partir da segunda linha, entra no primeiro sinal
+    diferente de 'neutro' (a posição é a do sinal de entrada) e sai no próximo 'neutro'.
+    Uma posição ainda aberta na última linha não é contabilizada.
+
+    Parâmetros:
+    df: DataFrame com colunas ['Ativo1', 'Ativo2', 'sinal']
+    capital_inicial: capital inicial para simulação
+    taxa: custo proporcional por operação (ex: 0.001 = 0.1%)
+    curva_capital: se True, também retorna o capital acumulado em cada linha
+
+    Retorna:
+    retorno_pct_total: O retorno percentual ao fim daquela simulação
+    df_trades: DataFrame com uma linha por trade encerrado: posição (linha) e rótulo do índice na entrada
+               e na saída, posicao, retorno e capital depois do trade
+    capital: array com o capital em cada linha de df (None se curva_capital=False)
+    """
+    sinais = df['sinal'].to_numpy()
+    n = len(sinais)
+    entradas, saidas = _pontos_de_trade(sinais == 'neutro')
+
+    # Retorno líquido da operação combinada
+    posicoes = sinais[entradas]
+    retornos = _retornos_dos_trades(df['Ativo1'].to_numpy(), df['Ativo2'].to_numpy(), entradas, saidas,
+                                    posicoes == 'compra_1_vende_2', taxa)
+
+    capital_trades = _capital_dos_trades(retornos, capital_inicial)
+    retorno_pct_total = (capital_trades[-1] / capital_inicial) - 1
+
+    df_trades = pd.DataFrame({
+        'linha_entrada': entradas,
+        'linha_saida': saidas,
+        'entrada': df.index[entradas],
+        'saida': df.index[saidas],
+        'posicao': posicoes,
+        'retorno': retornos,
+        'capital': capital_trades[1:],
+    })
+
+    capital = None
+    if curva_capital:
+        if len(retornos):
+            fatores = np.ones(n)
+            fatores[0] = capital_inicial
+            fatores[saidas] = 1 + retornos
+            capital = np.cumprod(fatores)
+        else:
+            capital = np.full(n, capital_inicial)
+
+    return retorno_pct_total, df_trades, capital
+
 def simular_retorno_por_trade(df, capital_inicial=10000, taxa=0.001):
     """
     Simula retorno por trade de uma estratégia de pares.
@@ -311,72 +590,159 @@ def simular_retorno_por_trade(df, capital_inicial=10000, taxa=0.001):
     Retorna:
     retorno_pct_total: O retorno percentual ao fim daquela simulação
     df_resultado: DataFrame com capital acumulado e retorno por trade
-    """
-
-    series1 = df['Ativo1']
-    series2 = df['Ativo2']
-    sinais = df['sinal']
-
-    capital = capital_inicial
-    capital_series = [capital]
-    retornos_trade = [None]
-
-    posicao = None
-    entrada_indice = None
-
-    for i in range(1, len(sinais)):
-        ret = None
-
-        # Entrada na operação
-        if posicao is None and sinais.iloc[i] != 'neutro':
-            posicao = sinais.iloc[i]
-            entrada_indice = i
-
-        # Saída da operação
-        elif posicao is not None and sinais.iloc[i] == 'neutro':
-            preco_entrada_1 = series1.iloc[entrada_indice]
-            preco_entrada_2 = series2.iloc[entrada_indice]
-
-            preco_saida_1 = series1.iloc[i]
-            preco_saida_2 = series2.iloc[i]
-
-            # Retorno bruto de cada perna
-            retorno_1 = (preco_saida_1 / preco_entrada_1) - 1
-            retorno_2 = (preco_saida_2 / preco_entrada_2) - 1
-
-            # Desconta custos: taxa de entrada + taxa de saída
-            retorno_1 -= 2 * taxa
-            retorno_2 -= 2 * taxa
-
-            # Retorno líquido da operação combinada
-            if posicao == 'compra_1_vende_2':
-                ret = retorno_1 - retorno_2
-            elif posicao == 'vende_1_compra_2':
-                ret = retorno_2 - retorno_1
 
-            # Capital ajustado pelo retorno da operação
-            capital *= (1 + ret)
-            posicao = None
-            entrada_indice = None
-
-        capital_series.append(capital)
-        retornos_trade.append(ret)
-
-    retorno_pct_total = (capital / capital_inicial) - 1
+    Usa simular_trades; quando só o retorno e os trades importam, chame simular_trades direto
+    e evite a cópia de df.
+    """
+    retorno_pct_total, df_trades, capital = simular_trades(df, capital_inicial, taxa, curva_capital=True)
 
     df_resultado = df.copy()
-    df_resultado['capital'] = capital_series
+    df_resultado['capital'] = capital
+    if len(df_trades):
+        retornos_trade = np.full(len(df), np.nan)
+        retornos_trade[df_trades['linha_saida'].to_numpy()] = df_trades['retorno'].to_numpy()
+    else:
+        # Sem trades a coluna fica só com None, como no laço original
+        retornos_trade = [None] * len(df)
     df_resultado['retorno_trade'] = retornos_trade
 
     print(f"Retorno total: {retorno_pct_total:.2%}")
     return retorno_pct_total, df_resultado
 
+# Representação compacta dos resultados
+# Para guardar muitos pares x parâmetros em memória (ranking de otimizações): sinais como códigos int8,
+# estatísticas móveis só por referência às features (compartilhadas entre parâmetros, nunca copiadas) e,
+# depois da simulação, só os trades e as métricas. Os DataFrames completos são montados sob demanda.
+
+class SinaisCompactos:
+    """
+    Resultado de gerar_sinais(..., compacto=True): o código da posição (int8, índice de NOMES_POSICOES) de
+    cada barra, com referências aos preços e às features. Ocupa 1 byte por barra, contra ~160 do DataFrame.
+
+    para_dataframe() devolve exatamente o DataFrame do modo normal (ou com as colunas auxiliares em float32).
+    O status de cointegração só entra nesse DataFrame: com janela_cointegracao e sem o status pronto nas
+    features, ele é calculado na primeira chamada de para_dataframe(), e simular() não paga por ele.
+    """
+    __slots__ = ('precos', 'features', 'codigos', 'status_cointegracao', 'janela_cointegracao')
+
+    def __init__(self, precos, features, codigos, status_cointegracao=None, janela_cointegracao=None):
+        self.precos = precos
+        self.features = features
+        self.codigos = codigos
+        self.status_cointegracao = status_cointegracao
+        self.janela_cointegracao = janela_cointegracao
+
+    def validas(self):
+        """Máscara das barras que ficam no DataFrame de sinais (sem NaN)."""
+        return _linhas_validas(pd.to_numeric(self.precos['Ativo1'], errors='coerce'),
+                               pd.to_numeric(self.precos['Ativo2'], errors='coerce'), self.features)
+
+    def __len__(self):
+        return int(self.validas().sum())
+
+    def auxiliar(self, nome, dtype=np.float32):
+        """Uma coluna auxiliar (ex: 'zscore') nas linhas do DataFrame de sinais, em float32 por padrão."""
+        if nome not in COLUNAS_AUXILIARES:
+            raise ValueError(f"coluna auxiliar deve ser uma de {COLUNAS_AUXILIARES}")
+        return self.features[nome].to_numpy()[self.validas()].astype(dtype)
+
+    def para_dataframe(self, float32=False):
+        if self.status_cointegracao is None and self.janela_cointegracao is not None:
+            self.status_cointegracao = _status_cointegracao(self.precos['Ativo1'], self.precos['Ativo2'],
+                                                            self.janela_cointegracao)
+        return _montar_df_sinais(self.precos, self.features, self.codigos, self.status_cointegracao, float32)
+
+    def simular(self, capital_inicial=10000, taxa=0.001):
+        """Trades e métricas (ResultadoCompacto), sem montar o DataFrame de sinais."""
+        validas = self.validas()
+        precos1 = pd.to_numeric(self.precos['Ativo1'], errors='coerce').to_numpy()[validas]
+        precos2 = pd.to_numeric(self.precos['Ativo2'], errors='coerce').to_numpy()[validas]
+        entradas, saidas, posicoes, retornos = trades_dos_codigos(self.codigos[validas], precos1, precos2, taxa)
+
+        indice = self.precos.index[validas]
+        capital_trades = _capital_dos_trades(retornos, capital_inicial)
+        retornos_trade = pd.Series(retornos)
+        return ResultadoCompacto(
+            (capital_trades[-1] / capital_inicial) - 1, retorno_ajustado_ao_risco(retornos_trade),
+            calcular_sharpe(retornos_trade), entradas.astype(np.int32), saidas.astype(np.int32),
+            indice[entradas], indice[saidas], posicoes, retornos, capital_inicial)
+
+
+class ResultadoCompacto:
+    """
+    Trades e métricas de uma simulação, sem os sinais barra a barra (simular_estrategia_precos(..., compacto=True)).
+
+    Desempacota como a tupla do modo normal: retorno_pct, retorno_risco, sharpe = resultado.
+    trades() monta o DataFrame de simular_trades; sinais() refaz o DataFrame de sinais a partir dos preços.
+
+    Os preços ficam só como referência no processo que simulou: não entram no pickle (retorno de um
+    ProcessPool, cache em disco), que leva apenas trades, métricas e parâmetros. Depois de desserializado,
+    sinais() precisa receber os preços.
+    """
+    __slots__ = ('retorno_pct', 'retorno_risco', 'sharpe', 'linha_entrada', 'linha_saida', 'entrada', 'saida',
+                 'posicao', 'retorno', 'capital_inicial', 'precos', 'parametros')
+
+    def __init__(self, retorno_pct, retorno_risco, sharpe, linha_entrada, linha_saida, entrada, saida, posicao,
+                 retorno, capital_inicial=10000, precos=None, parametros=None):
+        self.retorno_pct = retorno_pct
+        self.retorno_risco = retorno_risco
+        self.sharpe = sharpe
+        self.linha_entrada = linha_entrada
+        self.linha_saida = linha_saida
+        self.entrada = entrada
+        self.saida = saida
+        self.posicao = posicao
+        self.retorno = retorno
+        self.capital_inicial = capital_inicial
+        self.precos = precos
+        self.parametros = parametros
+
+    def __getstate__(self):
+        return {nome: getattr(self, nome) for nome in self.__slots__ if nome != 'precos'}
+
+    def __setstate__(self, estado):
+        self.precos = None
+        for nome, valor in estado.items():
+            setattr(self, nome, valor)
+
+    def __iter__(self):
+        return iter((self.retorno_pct, self.retorno_risco, self.sharpe))
+
+    def __len__(self):
+        return len(self.retorno)
+
+    def metricas(self):
+        return {'retorno_pct': self.retorno_pct, 'retorno_risco': self.retorno_risco, 'sharpe': self.sharpe}
+
+    def trades(self):
+        """DataFrame de trades igual ao de simular_trades."""
+        return pd.DataFrame({
+            'linha_entrada': self.linha_entrada.astype(np.int64),
+            'linha_saida': self.linha_saida.astype(np.int64),
+            'entrada': self.entrada,
+            'saida': self.saida,
+            'posicao': np.array(NOMES_POSICOES, dtype=object)[self.posicao],
+            'retorno': self.retorno,
+            'capital': _capital_dos_trades(self.retorno, self.capital_inicial)[1:],
+        })
+
+    def sinais(self, float32=False, precos=None):
+        """
+        DataFrame de sinais completo, gerado de novo com os parâmetros guardados (features do cache) sobre
+        'precos' (padrão: os preços da simulação, se o resultado não veio de um pickle).
+        """
+        precos = precos if precos is not None else self.precos
+        if precos is None or self.parametros is None:
+            raise ValueError("resultado sem preços/parâmetros; passe os preços em sinais(precos=...)")
+        return gerar_sinais(precos, **self.parametros, compacto=True).para_dataframe(float32)
+
+@instrumentacao.medir('simular_estrategia')
 def simular_estrategia(moeda1, moeda2, zscore_compra_e_venda, zscore_encerrar_posicao, 
                        stop_loss, cooldown_stop_loss, janela, data_inicial, data_final, 
-                       periodo_observacoes="1d", taxa=0.001, capital_inicial=10000):
+                       periodo_observacoes="1d", taxa=0.001, capital_inicial=10000, saida=None, compacto=False):
     
     # Carregar dados
-    df = carregar_dados(moeda1, moeda2, periodo_observacoes).loc[data_inicial:data_final]
+    df = carregar_dados(moeda1, moeda2, periodo_observacoes, data_inicial, data_final)
 
 
     # Testar cointegração
@@ -387,21 +753,240 @@ def simular_estrategia(moeda1, moeda2, zscore_compra_e_venda, zscore_encerrar_po
         return None, None, None
     '''
 
+    return simular_estrategia_precos(df, zscore_compra_e_venda, zscore_encerrar_posicao, stop_loss,
+                                     cooldown_stop_loss, janela, taxa, capital_inicial, saida=saida, compacto=compacto,
+                                     nome=f'{moeda1}-{moeda2}_z{zscore_compra_e_venda}_e{zscore_encerrar_posicao}_j{janela}')
+
+@instrumentacao.medir('simular_estrategia_precos')
+def simular_estrategia_precos(precos, zscore_compra_e_venda, zscore_encerrar_posicao, stop_loss, cooldown_stop_loss,
+                              janela, taxa=0.001, capital_inicial=10000, features=None, saida=None, nome=None,
+                              compacto=False):
+    """
+    Mesma simulação de simular_estrategia, mas sobre preços já carregados em memória.
+
+    Permite carregar o par uma vez e simular vários recortes e parâmetros sem reler os CSVs.
+
+    Parâmetros:
+    - precos: DataFrame alinhado com colunas Ativo1 e Ativo2, ou tupla (precos_ativo1, precos_ativo2) de arrays
+    - features: estatísticas móveis de calcular_features para esses mesmos preços e janela (opcional);
+      se None, vêm de features_em_cache
+    - saida: destino de saidas.py para o DataFrame de sinais junto com as métricas (padrão: não grava nada)
+    - nome: nome do resultado no destino (padrão: montado a partir dos parâmetros)
+    - compacto: se True, retorna um ResultadoCompacto (só trades e métricas; desempacota igual à tupla),
+      sem montar o DataFrame de sinais
+
+    Retorna:
+    retorno_pct, retorno_risco, sharpe
+    """
+    if isinstance(precos, pd.DataFrame):
+        df = precos
+    else:
+        ativo1, ativo2 = precos
+        df = pd.DataFrame({'Ativo1': np.asarray(ativo1, dtype=float), 'Ativo2': np.asarray(ativo2, dtype=float)})
+
+    if compacto:
+        return _simular_compacto(df, zscore_compra_e_venda, zscore_encerrar_posicao, stop_loss, cooldown_stop_loss,
+                                 janela, taxa, capital_inicial, features, saida, nome)
+
     # Gerar sinais
-    df_sinais = gerar_sinais(df, zscore_compra_e_venda, zscore_encerrar_posicao, stop_loss, cooldown_stop_loss, janela, taxa)
+    df_sinais = gerar_sinais(df, zscore_compra_e_venda, zscore_encerrar_posicao, stop_loss, cooldown_stop_loss, janela, taxa,
+                             features=features)
 
     # Simular retorno
-    retorno_pct, df_resultado = simular_retorno_por_trade(df_sinais, capital_inicial, taxa)
+    with instrumentacao.etapa('simulacao_pnl', len(df_sinais)):
+        retorno_pct, df_trades, _ = simular_trades(df_sinais, capital_inicial, taxa)
+    instrumentacao.contar('simulacoes')
+    instrumentacao.contar('trades', len(df_trades))
+    print(f"Retorno total: {retorno_pct:.2%}")
 
     # Calcular retornos percentuais por trade
-    retornos_trade = df_resultado['retorno_trade'].dropna()
+    retornos_trade = df_trades['retorno']
 
     # Calcular métricas
-    sharpe = calcular_sharpe(retornos_trade)
-    retorno_risco = retorno_ajustado_ao_risco(retornos_trade)
+    with instrumentacao.etapa('metricas', len(retornos_trade)):
+        sharpe = calcular_sharpe(retornos_trade)
+        retorno_risco = retorno_ajustado_ao_risco(retornos_trade)
+
+    if saida is not None:
+        if nome is None:
+            nome = f'z{zscore_compra_e_venda}_e{zscore_encerrar_posicao}_j{janela}'
+        with instrumentacao.etapa('gravacao', len(df_sinais)):
+            saida.gravar(nome, df_sinais, {'retorno_pct': retorno_pct, 'retorno_risco': retorno_risco, 'sharpe': sharpe})
 
     return retorno_pct, retorno_risco, sharpe
 
+def _simular_compacto(df, zscore_compra_e_venda, zscore_encerrar_posicao, stop_loss, cooldown_stop_loss, janela,
+                      taxa, capital_inicial, features, saida, nome):
+    # simular_estrategia_precos com compacto=True: sinais em códigos int8 e resultado só com trades e métricas
+    sinais = gerar_sinais(df, zscore_compra_e_venda, zscore_encerrar_posicao, stop_loss, cooldown_stop_loss, janela, taxa,
+                          features=features, compacto=True)
+    with instrumentacao.etapa('simulacao_pnl', len(df)):
+        resultado = sinais.simular(capital_inicial, taxa)
+    instrumentacao.contar('simulacoes')
+    instrumentacao.contar('trades', len(resultado))
+    print(f"Retorno total: {resultado.retorno_pct:.2%}")
+
+    # Referências para refazer os sinais sob demanda (os preços não são copiados nem vão no pickle)
+    resultado.precos = df
+    resultado.parametros = {'zscore_compra_e_venda': zscore_compra_e_venda,
+                            'zscore_encerrar_posicao': zscore_encerrar_posicao, 'stop_loss': stop_loss,
+                            'cooldown_stop_loss': cooldown_stop_loss, 'janela': janela, 'taxa': taxa}
+
+    if saida is not None:
+        if nome is None:
+            nome = f'z{zscore_compra_e_venda}_e{zscore_encerrar_posicao}_j{janela}'
+        df_sinais = sinais.para_dataframe()
+        with instrumentacao.etapa('gravacao', len(df_sinais)):
+            saida.gravar(nome, df_sinais, resultado.metricas())
+    return resultado
+
+def _linhas_validas(ativo1, ativo2, features):
+    """Máscara das linhas que sobrevivem ao dropna() de gerar_sinais/gerar_sinais_com_stoploss."""
+    return pd.concat([ativo1, ativo2, features['ativo1_mean'], features['ativo2_mean'], features['ativo1_std'],
+                      features['ativo2_std'], features['spread'], features['rolling_mean'], features['rolling_std'],
+                      features['zscore']], axis=1).notna().all(axis=1).to_numpy()
+
+def simular_grade(df, janela, zscore_compra_e_venda, zscore_encerrar_posicao, stop_loss=0.0, cooldown_stop_loss=0,
+                  taxa=0.001, capital_inicial=10000, com_stoploss=True, features=None):
+    """
+    Simula várias combinações de parâmetros de uma vez sobre o mesmo par e a mesma janela.
+
+    Equivale a rodar, para cada combinação, gerar_sinais_com_stoploss (ou gerar_sinais, com com_stoploss=False)
+    seguido de simular_trades e das métricas de simular_estrategia_precos, mas percorre a série uma vez só:
+    o estado de todas as combinações (posição, preço de entrada, cooldown, trade aberto, capital) é um vetor
+    atualizado barra a barra sobre as mesmas features móveis.
+
+    Parâmetros:
+    - df: DataFrame alinhado com colunas Ativo1 e Ativo2
+    - janela: tamanho da janela móvel (a mesma para todas as combinações)
+    - zscore_compra_e_venda, zscore_encerrar_posicao, stop_loss, cooldown_stop_loss: escalares ou arrays
+      do mesmo tamanho, uma posição por combinação (escalares valem para todas)
+    - com_stoploss: False usa as regras de gerar_sinais (sem stop e sem cooldown)
+    - features: estatísticas móveis de calcular_features para df e janela (opcional)
+
+    Retorna:
+    DataFrame com uma linha por combinação: os parâmetros, retorno_pct, retorno_risco, sharpe e trades
+    """
+    zscv, ze, sl, cd = np.broadcast_arrays(*(np.atleast_1d(np.asarray(v, dtype=float)) for v in
+                                            (zscore_compra_e_venda, zscore_encerrar_posicao, stop_loss, cooldown_stop_loss)))
+    n_params = len(zscv)
+
+    if features is None:
+        features = features_em_cache(df, janela, cointegracao_movel=False)
+    _conferir_features(features, df, janela)
+
+    ativo1 = pd.to_numeric(df['Ativo1'], errors='coerce')
+    ativo2 = pd.to_numeric(df['Ativo2'], errors='coerce')
+    zscore = features['zscore'].to_numpy()
+    spread = features['spread'].to_numpy()
+    atr = features['atr'].to_numpy()
+    # A condição de taxas não depende dos parâmetros; só o limite do zscore muda entre combinações
+    vale_vender = vale_a_pena_operar(df['Ativo1'].to_numpy(), features['ativo1_mean'].to_numpy(), taxa, 'venda')
+    vale_comprar = vale_a_pena_operar(df['Ativo1'].to_numpy(), features['ativo1_mean'].to_numpy(), taxa, 'compra')
+
+    # Linhas que sobrevivem ao dropna() dos geradores de sinais; o P&L só olha para elas
+    valido = _linhas_validas(ativo1, ativo2, features)
+
+    precos1 = ativo1.to_numpy()
+    precos2 = ativo2.to_numpy()
+    limite_inferior = -zscv
+    barras_cooldown = cd * janela
+
+    # Estado dos sinais
+    posicao = np.zeros(n_params, dtype=np.int8)
+    preco_entrada = np.full(n_params, np.nan)
+    cooldown = np.zeros(n_params)
+    # Estado do P&L (mesmas regras de simular_trades)
+    em_trade = np.zeros(n_params, dtype=bool)
+    posicao_trade = np.zeros(n_params, dtype=np.int8)
+    entrada_1 = np.zeros(n_params)
+    entrada_2 = np.zeros(n_params)
+    capital = np.full(n_params, capital_inicial, dtype=float)
+    trades_params = []
+    trades_retornos = []
+
+    linha = -1
+    for i in range(len(zscore)):
+        z = zscore[i]
+        nova = posicao.copy()
+
+        if com_stoploss:
+            em_cooldown = cooldown > 0
+            cooldown[em_cooldown] -= 1
+
+            # Stop loss baseado em ATR, só para quem está posicionado
+            prejuizo = np.where(posicao == 2, spread[i] - preco_entrada, preco_entrada - spread[i])
+            stop = ~em_cooldown & (posicao != 0) & (prejuizo > sl * atr[i])
+            cooldown[stop] = barras_cooldown[stop]
+
+            livre = ~(em_cooldown | stop)
+            neutro = livre & (posicao == 0)
+            if vale_vender[i]:
+                vende = neutro & (z > zscv)
+                nova[vende] = 2
+                preco_entrada[vende] = spread[i]
+            if vale_comprar[i]:
+                compra = neutro & (z < limite_inferior)
+                nova[compra] = 1
+                preco_entrada[compra] = spread[i]
+            encerra = livre & (-0.5 < z) & (z < ze)
+            zera = encerra | em_cooldown | stop
+            nova[zera] = 0
+            preco_entrada[zera] = np.nan
+        else:
+            if vale_vender[i]:
+                nova[z > zscv] = 2
+            if vale_comprar[i]:
+                nova[z < limite_inferior] = 1
+            nova[(-ze < z) & (z < ze)] = 0
+        posicao = nova
+
+        if not valido[i]:
+            continue
+        linha += 1
+        if linha == 0:
+            continue
+
+        # Saída: trade aberto e sinal neutro; entrada: sem trade aberto e sinal diferente de neutro
+        sai = em_trade & (posicao == 0)
+        entra = ~em_trade & (posicao != 0)
+        if sai.any():
+            retorno_1 = (precos1[i] / entrada_1[sai]) - 1
+            retorno_2 = (precos2[i] / entrada_2[sai]) - 1
+            retorno_1 -= 2 * taxa
+            retorno_2 -= 2 * taxa
+            ret = np.where(posicao_trade[sai] == 1, retorno_1 - retorno_2, retorno_2 - retorno_1)
+            capital[sai] *= (1 + ret)
+            em_trade[sai] = False
+            trades_params.append(np.flatnonzero(sai))
+            trades_retornos.append(ret)
+
+        if entra.any():
+            em_trade[entra] = True
+            posicao_trade[entra] = posicao[entra]
+            entrada_1[entra] = precos1[i]
+            entrada_2[entra] = precos2[i]
+
+    # Retornos por combinação, na ordem em que os trades fecharam
+    if trades_params:
+        params_trade = np.concatenate(trades_params)
+        retornos_trade = np.concatenate(trades_retornos)
+        ordem = np.argsort(params_trade, kind='stable')
+        retornos_por_param = np.split(retornos_trade[ordem], np.cumsum(np.bincount(params_trade, minlength=n_params))[:-1])
+    else:
+        retornos_por_param = [np.empty(0)] * n_params
+
+    return pd.DataFrame({
+        'zscore_compra_e_venda': zscv,
+        'zscore_encerrar_posicao': ze,
+        'stop_loss': sl,
+        'cooldown_stop_loss': cd,
+        'retorno_pct': (capital / capital_inicial) - 1,
+        'retorno_risco': [retorno_ajustado_ao_risco(r) for r in retornos_por_param],
+        'sharpe': [calcular_sharpe(r) for r in retornos_por_param],
+        'trades': [len(r) for r in retornos_por_param],
+    })
+
 def retorno_ajustado_ao_risco(serie_retorno):
     serie_retorno = pd.Series(serie_retorno).dropna()
     if len(serie_retorno) == 0:
@@ -0,0 +1,239 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Colunas numéricas guardadas de cada candle (além do timestamp)
+COLUNAS = ['open', 'high', 'low', 'close', 'volume']
+
+# Mesmo diretório usado por carregar_dados (relativo a notebooks/arbitragem)
+DIRETORIO_DADOS = '../../data/fechamentos'
+
+# Objetos já abertos neste processo e índices de alinhamento de pares
+_candles_abertos = {}
+_indices_pares = {}
+
+
+def caminho_csv(simbolo, intervalo, diretorio=DIRETORIO_DADOS):
+    """Caminho do CSV gerado por data/historical_data.py (ex: BTCUSDT_5m_data.csv)."""
+    return os.path.join(diretorio, f'{simbolo}_{intervalo}_data.csv')
+
+
+def caminho_colunar(simbolo, intervalo, diretorio=DIRETORIO_DADOS):
+    """Diretório com os arquivos .npy de cada coluna do símbolo/intervalo."""
+    return os.path.join(diretorio, 'colunar', f'{simbolo}_{intervalo}')
+
+
+def _assinatura(caminho):
+    estado = os.stat(caminho)
+    return {'tamanho': estado.st_size, 'modificado': estado.st_mtime_ns}
+
+
+def _ler_meta(destino):
+    try:
+        with open(os.path.join(destino, 'meta.json')) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _ler_csv(origem, inicio_bytes=0, nomes=None):
+    """Lê o CSV inteiro ou apenas a parte a partir de 'inicio_bytes' (linhas anexadas depois da última conversão)."""
+    if inicio_bytes == 0:
+        df = pd.read_csv(origem, usecols=['timestamp'] + COLUNAS)
+    else:
+        with open(origem, 'rb') as f:
+            f.seek(inicio_bytes)
+            df = pd.read_csv(f, header=None, names=nomes, usecols=['timestamp'] + COLUNAS)
+    timestamps = pd.to_datetime(df['timestamp']).to_numpy(dtype='datetime64[ns]').view(np.int64)
+    return timestamps, {coluna: df[coluna].to_numpy(dtype=np.float64) for coluna in COLUNAS}
+
+
+def _gravar(destino, timestamps, colunas, meta):
+    """Grava os arquivos em um diretório temporário e troca de uma vez, para outro processo nunca ler arquivos pela metade."""
+    temporario = f'{destino}.tmp{os.getpid()}'
+    os.makedirs(temporario, exist_ok=True)
+    np.save(os.path.join(temporario, 'timestamp.npy'), timestamps)
+    for coluna, valores in colunas.items():
+        np.save(os.path.join(temporario, f'{coluna}.npy'), valores)
+    with open(os.path.join(temporario, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    antigo = f'{destino}.old{os.getpid()}'
+    if os.path.exists(destino):
+        os.replace(destino, antigo)
+    os.replace(temporario, destino)
+    if os.path.exists(antigo):
+        for arquivo in os.listdir(antigo):
+            os.remove(os.path.join(antigo, arquivo))
+        os.rmdir(antigo)
+
+
+def converter_csv(simbolo, intervalo, diretorio=DIRETORIO_DADOS):
+    """
+    Converte o CSV de candles em formato colunar binário: timestamp em int64 (ns) e OHLCV em float64,
+    um arquivo .npy por coluna.
+
+    Se o CSV só ganhou linhas no final desde a última conversão, apenas o trecho novo é lido.
+    Timestamps são ordenados e duplicados são descartados (fica o último).
+
+    Retorna o diretório colunar.
+    """
+    origem = caminho_csv(simbolo, intervalo, diretorio)
+    destino = caminho_colunar(simbolo, intervalo, diretorio)
+    assinatura = _assinatura(origem)
+    meta = _ler_meta(destino)
+
+    if meta is not None and meta['origem'] == assinatura:
+        return destino
+
+    with open(origem, 'rb') as f:
+        cabecalho = f.readline()
+    nomes = cabecalho.decode().strip().split(',')
+
+    anexado = meta is not None and meta['origem']['tamanho'] < assinatura['tamanho'] and meta['cabecalho'] == nomes
+    if anexado:
+        # Só dá para ler apenas o trecho novo se a conversão anterior terminou numa quebra de linha
+        with open(origem, 'rb') as f:
+            f.seek(meta['origem']['tamanho'] - 1)
+            anexado = f.read(1) == b'\n'
+    if anexado:
+        candles = abrir_candles(simbolo, intervalo, diretorio, converter=False)
+        timestamps_novos, colunas_novas = _ler_csv(origem, meta['origem']['tamanho'], nomes)
+        timestamps = np.concatenate([candles.timestamps, timestamps_novos])
+        colunas = {c: np.concatenate([candles.colunas[c], colunas_novas[c]]) for c in COLUNAS}
+    else:
+        timestamps, colunas = _ler_csv(origem)
+
+    if len(timestamps) > 1 and not (np.diff(timestamps) > 0).all():
+        # Mantém a última ocorrência de cada timestamp, em ordem crescente
+        ordem = np.argsort(timestamps, kind='stable')
+        timestamps = timestamps[ordem]
+        ultimo = np.append(timestamps[1:] != timestamps[:-1], True)
+        timestamps = timestamps[ultimo]
+        colunas = {c: v[ordem][ultimo] for c, v in colunas.items()}
+
+    _gravar(destino, timestamps, colunas, {'origem': assinatura, 'cabecalho': nomes, 'linhas': len(timestamps)})
+    return destino
+
+
+class Candles:
+    """
+    Candles de um símbolo/intervalo abertos por memory-map.
+
+    Os arrays são somente leitura e compartilham memória com os arquivos em disco;
+    recortes por data são buscas binárias que devolvem views, sem cópia.
+    """
+
+    def __init__(self, timestamps, colunas, assinatura):
+        self.timestamps = timestamps
+        self.colunas = colunas
+        self.assinatura = assinatura
+        self._indice = None
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def indice(self):
+        """DatetimeIndex sobre os timestamps em disco (criado uma vez e reaproveitado)."""
+        if self._indice is None:
+            self._indice = pd.DatetimeIndex(self.timestamps.view('datetime64[ns]'), name='timestamp', copy=False)
+        return self._indice
+
+    def fatia(self, inicio=None, fim=None):
+        """
+        Intervalo de posições equivalente a .loc[inicio:fim] (datas parciais como '2024-12-31' incluem o dia todo).
+        """
+        return self.indice.slice_indexer(inicio, fim)
+
+    def serie(self, coluna='close', inicio=None, fim=None):
+        """Série de uma coluna no intervalo de datas, como view dos dados em disco."""
+        recorte = self.fatia(inicio, fim)
+        return pd.Series(self.colunas[coluna][recorte], index=self.indice[recorte], name=coluna, copy=False)
+
+
+def abrir_candles(simbolo, intervalo, diretorio=DIRETORIO_DADOS, converter=True):
+    """
+    Abre os candles de um símbolo/intervalo por memory-map, convertendo o CSV antes se necessário.
+
+    O objeto fica em cache no processo enquanto os arquivos em disco não mudarem.
+    """
+    destino = caminho_colunar(simbolo, intervalo, diretorio)
+    if converter:
+        converter_csv(simbolo, intervalo, diretorio)
+
+    meta = _ler_meta(destino)
+    chave = os.path.abspath(destino)
+    aberto = _candles_abertos.get(chave)
+    if aberto is not None and aberto.assinatura == meta['origem']:
+        return aberto
+
+    timestamps = np.load(os.path.join(destino, 'timestamp.npy'), mmap_mode='r')
+    colunas = {c: np.load(os.path.join(destino, f'{c}.npy'), mmap_mode='r') for c in COLUNAS}
+    candles = Candles(timestamps, colunas, meta['origem'])
+    _candles_abertos[chave] = candles
+    return candles
+
+
+def _recorte(posicoes):
+    """Troca um array de posições consecutivas por um slice, para indexar sem copiar."""
+    if len(posicoes) == 0 or posicoes[-1] - posicoes[0] + 1 == len(posicoes):
+        inicio = int(posicoes[0]) if len(posicoes) else 0
+        return slice(inicio, inicio + len(posicoes))
+    return posicoes
+
+
+def _compor(posicoes, recorte):
+    """Aplica um recorte (slice) sobre as posições do par, sem materializar as posições fora dele."""
+    if isinstance(posicoes, slice):
+        inicio, fim, _ = recorte.indices(posicoes.stop - posicoes.start)
+        return slice(posicoes.start + inicio, posicoes.start + fim)
+    return posicoes[recorte]
+
+
+def indices_par(candles1, candles2, coluna='close'):
+    """
+    Posições das barras em comum entre dois símbolos, descartando barras com NaN em qualquer um deles.
+
+    Equivale ao DataFrame({...}).dropna() de carregar_dados, mas é calculado uma vez por par
+    e guardado em cache enquanto os arquivos não mudarem.
+
+    Retorna (indice_comum, posicoes1, posicoes2); as posições viram slices quando são consecutivas.
+    """
+    chave = (id(candles1), id(candles2), coluna,
+             tuple(candles1.assinatura.values()), tuple(candles2.assinatura.values()))
+    if chave in _indices_pares:
+        return _indices_pares[chave]
+
+    comuns, posicoes1, posicoes2 = np.intersect1d(
+        candles1.timestamps, candles2.timestamps, assume_unique=True, return_indices=True)
+    validos = np.isfinite(candles1.colunas[coluna][posicoes1]) & np.isfinite(candles2.colunas[coluna][posicoes2])
+    if not validos.all():
+        comuns, posicoes1, posicoes2 = comuns[validos], posicoes1[validos], posicoes2[validos]
+
+    indice = pd.DatetimeIndex(comuns.view('datetime64[ns]'), name='timestamp', copy=False)
+    resultado = (indice, _recorte(posicoes1), _recorte(posicoes2))
+    _indices_pares[chave] = resultado
+    return resultado
+
+
+def carregar_par(simbolo1, simbolo2, intervalo, inicio=None, fim=None, coluna='close', diretorio=DIRETORIO_DADOS):
+    """
+    Carrega a coluna 'coluna' de dois símbolos alinhada no tempo, já recortada em [inicio, fim].
+
+    Retorna um DataFrame com colunas Ativo1 e Ativo2 indexado por timestamp, igual ao de carregar_dados.
+    Quando os dois símbolos têm as mesmas barras no intervalo, as colunas são views dos arquivos em disco.
+    """
+    candles1 = abrir_candles(simbolo1, intervalo, diretorio)
+    candles2 = abrir_candles(simbolo2, intervalo, diretorio)
+    indice, posicoes1, posicoes2 = indices_par(candles1, candles2, coluna)
+
+    # Busca binária do intervalo de datas sobre os timestamps em comum
+    recorte = indice.slice_indexer(inicio, fim)
+
+    return pd.DataFrame({
+        'Ativo1': candles1.colunas[coluna][_compor(posicoes1, recorte)],
+        'Ativo2': candles2.colunas[coluna][_compor(posicoes2, recorte)],
+    }, index=indice[recorte], copy=False)
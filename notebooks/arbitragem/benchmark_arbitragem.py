@@ -0,0 +1,244 @@
+import argparse
+import cProfile
+import datetime
+import json
+import os
+import platform
+import pstats
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+import arbitragem
+
+# Benchmark dos caminhos quentes do backtest de pares, sobre séries sintéticas cointegradas.
+#
+# Cada caso é medido em tempo (melhor e mediana de algumas repetições) e em pico de memória (tracemalloc,
+# que também conta as alocações do NumPy). Os resultados vão para um histórico em JSON lines, e cada medição
+# é comparada com as anteriores da mesma máquina: ficar mais lento (ou usar mais memória) que a referência
+# além do limiar marca uma regressão.
+#
+# Ex: python benchmark_arbitragem.py --barras 1000 100000 1000000 --limiar 0.2
+
+TAMANHOS = [1_000, 100_000, 1_000_000]
+HISTORICO = os.path.join('resultados', 'benchmarks', 'historico.jsonl')
+# Quantas medições anteriores formam a referência (mediana) de cada caso
+REFERENCIA_ULTIMAS = 5
+LIMIAR = 0.2
+# Diferenças absolutas abaixo disto são ruído de medição (casos pequenos levam frações de milissegundo)
+TOLERANCIA_S = 0.005
+TOLERANCIA_MB = 1.0
+
+# Parâmetros da estratégia usados em todos os casos
+PARAMETROS = {'zscore_compra_e_venda': 2.0, 'zscore_encerrar_posicao': 0.5, 'stop_loss': 2.0,
+              'cooldown_stop_loss': 1, 'janela': 60}
+
+
+def series_cointegradas(n, seed=0, freq='5min', beta=0.7):
+    """
+    Dois preços cointegrados de n barras: Ativo2 é passeio aleatório e Ativo1 = 300 + beta * Ativo2 + ruído
+    estacionário (AR(1)), o que gera entradas e saídas no zscore como um par real.
+    """
+    rng = np.random.default_rng(seed)
+    ativo2 = 1000 + np.cumsum(rng.normal(0, 1, n))
+    # AR(1) com coeficiente 0.95 (filtro linear, sem laço em Python)
+    ruido = lfilter([1.0], [1.0, -0.95], rng.normal(0, 2, n))
+    ativo1 = 300 + beta * ativo2 + ruido
+    indice = pd.date_range('2020-01-01', periods=n, freq=freq, name='timestamp')
+    return pd.DataFrame({'Ativo1': ativo1, 'Ativo2': ativo2}, index=indice)
+
+
+def _sinais(df):
+    p = PARAMETROS
+    return arbitragem.gerar_sinais(df, p['zscore_compra_e_venda'], p['zscore_encerrar_posicao'], p['stop_loss'],
+                                   p['cooldown_stop_loss'], p['janela'])
+
+
+# Cada caso: (preparação fora da medição, função medida). As features móveis ficam em cache entre chamadas,
+# então o cache é esvaziado antes de cada repetição para medir o caminho frio.
+CASOS = {
+    'calcular_zscore': (
+        lambda df: arbitragem.calcular_spread(df['Ativo1'], df['Ativo2']),
+        lambda spread: arbitragem.calcular_zscore(spread, PARAMETROS['janela'])),
+    'testar_cointegracao_movel': (
+        lambda df: df,
+        lambda df: arbitragem.testar_cointegracao_movel(df['Ativo1'], df['Ativo2'], PARAMETROS['janela'])),
+    'gerar_sinais': (
+        lambda df: df,
+        _sinais),
+    'gerar_sinais_com_stoploss': (
+        lambda df: df,
+        lambda df: arbitragem.gerar_sinais_com_stoploss(
+            df, *(PARAMETROS[k] for k in ('zscore_compra_e_venda', 'zscore_encerrar_posicao', 'stop_loss',
+                                          'cooldown_stop_loss', 'janela')))),
+    'simular_retorno_por_trade': (
+        _sinais,
+        lambda df_sinais: arbitragem.simular_retorno_por_trade(df_sinais)),
+    # simular_estrategia sem a leitura dos CSVs: sinais + trades + métricas sobre os preços em memória
+    'simular_estrategia': (
+        lambda df: df,
+        lambda df: arbitragem.simular_estrategia_precos(
+            df, *(PARAMETROS[k] for k in ('zscore_compra_e_venda', 'zscore_encerrar_posicao', 'stop_loss',
+                                          'cooldown_stop_loss', 'janela')))),
+}
+
+
+def _silencioso(funcao, *args):
+    # Os simuladores imprimem o retorno a cada chamada
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        return funcao(*args)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def medir(caso, df, repeticoes=3):
+    """Melhor tempo, tempo mediano (s) e pico de memória (MB) de um caso sobre os preços df."""
+    preparar, funcao = CASOS[caso]
+    arbitragem.limpar_cache_features()
+    entrada = _silencioso(preparar, df)
+
+    tempos = []
+    for _ in range(repeticoes):
+        arbitragem.limpar_cache_features()
+        inicio = time.perf_counter()
+        _silencioso(funcao, entrada)
+        tempos.append(time.perf_counter() - inicio)
+
+    # Memória numa execução à parte: o tracemalloc deixa o código mais lento
+    arbitragem.limpar_cache_features()
+    tracemalloc.start()
+    try:
+        _silencioso(funcao, entrada)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    arbitragem.limpar_cache_features()
+    return min(tempos), float(np.median(tempos)), pico / 2**20
+
+
+def perfilar(caso, barras=100_000, linhas=25):
+    """Perfil (cProfile) de uma execução do caso, ordenado pelo tempo acumulado."""
+    preparar, funcao = CASOS[caso]
+    df = series_cointegradas(barras)
+    arbitragem.limpar_cache_features()
+    entrada = _silencioso(preparar, df)
+    perfil = cProfile.Profile()
+    perfil.enable()
+    _silencioso(funcao, entrada)
+    perfil.disable()
+    pstats.Stats(perfil).sort_stats('cumulative').print_stats(linhas)
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _maquina():
+    return f'{platform.node()}|{platform.machine()}|{os.cpu_count()}'
+
+
+def ler_historico(caminho=HISTORICO):
+    """Histórico de medições (um registro por caso e tamanho). Linhas incompletas são ignoradas."""
+    registros = []
+    if os.path.exists(caminho):
+        with open(caminho) as f:
+            for linha in f:
+                try:
+                    registros.append(json.loads(linha))
+                except json.JSONDecodeError:
+                    # Última linha cortada por uma execução interrompida
+                    continue
+    return pd.DataFrame(registros)
+
+
+def comparar(registros, historico, limiar=LIMIAR, ultimas=REFERENCIA_ULTIMAS):
+    """
+    Compara cada medição com a mediana das 'ultimas' medições anteriores do mesmo caso, tamanho e máquina.
+
+    Regressão: tempo (melhor de cada execução) ou pico de memória acima de (1 + limiar) x referência e
+    acima da referência por mais que TOLERANCIA_S / TOLERANCIA_MB.
+    Retorna um DataFrame com as medições, as referências e as colunas regressao_tempo e regressao_memoria.
+    """
+    df = pd.DataFrame(registros)
+    referencias = []
+    for registro in registros:
+        anteriores = pd.DataFrame()
+        if len(historico):
+            anteriores = historico[(historico['caso'] == registro['caso']) & (historico['barras'] == registro['barras'])
+                                   & (historico['maquina'] == registro['maquina'])].tail(ultimas)
+        referencias.append({
+            'referencia_s': anteriores['tempo_s'].median() if len(anteriores) else np.nan,
+            'referencia_mb': anteriores['pico_mb'].median() if len(anteriores) else np.nan,
+        })
+    df = pd.concat([df, pd.DataFrame(referencias)], axis=1)
+    df['variacao_tempo'] = df['tempo_s'] / df['referencia_s'] - 1
+    df['variacao_memoria'] = df['pico_mb'] / df['referencia_mb'] - 1
+    df['regressao_tempo'] = (df['variacao_tempo'] > limiar) & (df['tempo_s'] - df['referencia_s'] > TOLERANCIA_S)
+    df['regressao_memoria'] = (df['variacao_memoria'] > limiar) & (df['pico_mb'] - df['referencia_mb'] > TOLERANCIA_MB)
+    return df
+
+
+def rodar(casos=None, tamanhos=TAMANHOS, repeticoes=3, historico=HISTORICO, limiar=LIMIAR, gravar=True):
+    """
+    Mede os casos em todos os tamanhos, compara com o histórico e grava as novas medições.
+
+    Retorna o DataFrame de comparar(); as regressões ficam em regressao_tempo/regressao_memoria.
+    """
+    casos = casos or list(CASOS)
+    anteriores = ler_historico(historico)
+    base = {'data': datetime.datetime.now().isoformat(timespec='seconds'), 'commit': _commit(),
+            'maquina': _maquina(), 'python': platform.python_version(), 'numpy': np.__version__,
+            'pandas': pd.__version__, 'repeticoes': repeticoes}
+
+    registros = []
+    for barras in tamanhos:
+        df = series_cointegradas(barras)
+        for caso in casos:
+            tempo_s, mediana_s, pico_mb = medir(caso, df, repeticoes)
+            registros.append({**base, 'caso': caso, 'barras': barras, 'tempo_s': tempo_s, 'mediana_s': mediana_s,
+                              'pico_mb': pico_mb})
+            print(f"{caso:<28} {barras:>9} barras: {tempo_s:9.4f}s  {pico_mb:9.1f} MB")
+
+    resultado = comparar(registros, anteriores, limiar)
+    if gravar:
+        os.makedirs(os.path.dirname(historico) or '.', exist_ok=True)
+        with open(historico, 'a') as f:
+            for registro in registros:
+                f.write(json.dumps(registro) + '\n')
+
+    regressoes = resultado[resultado['regressao_tempo'] | resultado['regressao_memoria']]
+    for linha in regressoes.itertuples():
+        print(f"REGRESSÃO {linha.caso} ({linha.barras} barras): tempo {linha.variacao_tempo:+.0%}, "
+              f"memória {linha.variacao_memoria:+.0%} em relação às últimas medições")
+    return resultado
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark dos caminhos quentes de arbitragem.py')
+    parser.add_argument('--casos', nargs='*', choices=list(CASOS), help='casos a medir (padrão: todos)')
+    parser.add_argument('--barras', nargs='*', type=int, default=TAMANHOS, help='tamanhos das séries sintéticas')
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--limiar', type=float, default=LIMIAR, help='piora relativa que conta como regressão')
+    parser.add_argument('--historico', default=HISTORICO)
+    parser.add_argument('--nao-gravar', action='store_true', help='só compara, sem acrescentar ao histórico')
+    parser.add_argument('--perfil', choices=list(CASOS), help='mostra o cProfile de um caso em vez de medir')
+    args = parser.parse_args()
+
+    if args.perfil:
+        perfilar(args.perfil, args.barras[0])
+        sys.exit(0)
+    resultado = rodar(args.casos, args.barras, args.repeticoes, args.historico, args.limiar, not args.nao_gravar)
+    # Código de saída 1 quando há regressão (para rodar em CI)
+    sys.exit(1 if (resultado['regressao_tempo'] | resultado['regressao_memoria']).any() else 0)
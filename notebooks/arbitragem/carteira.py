@@ -0,0 +1,310 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import arbitragem
+import armazenamento
+
+# Carteira de pares: todos os pares na mesma linha do tempo, com um capital só
+#
+# Cada par gera seus sinais e trades como em simular_estrategia_precos (as mesmas máquinas de estados sobre
+# arrays), mas o capital é compartilhado: cada entrada recebe uma fatia do caixa livre e só há max_posicoes
+# posições abertas ao mesmo tempo. A única parte sequencial é a fila de eventos (entradas e saídas de todos
+# os pares, em ordem de tempo); curva de capital, drawdown, posições abertas e atribuição por par são
+# montados com arrays sobre o índice de tempo unido.
+#
+# A simulação é feita em duas passadas por par: a primeira guarda só os trades e os timestamps; a segunda
+# reabre os preços (memory-map) apenas para marcar a mercado os trades aceitos. Assim a memória não cresce
+# com (pares x barras), só com o índice unido e o número de trades.
+
+# Parâmetros de cada par quando não vêm na tabela de pares (os mesmos nomes de simular_estrategia)
+PADROES = {'zscore_compra_e_venda': 2.0, 'zscore_encerrar_posicao': 0.5, 'stop_loss': 0.0,
+           'cooldown_stop_loss': 0, 'janela': 60}
+
+# Códigos de evento: saídas antes de entradas no mesmo instante (liberam caixa e vaga)
+EVENTO_SAIDA, EVENTO_ENTRADA = 0, 1
+
+DIRETORIO_GRAFICOS = '../../figures/arbitragem/consolidado'
+
+
+def pares_da_tabela(pares, **padroes):
+    """
+    Lista de dicionários (moeda1, moeda2 e parâmetros) a partir de:
+    - uma tabela como o pares_cointegrados.csv (colunas Ativo1, Ativo2; se houver 'Cointegrado?', só os True),
+      com colunas de parâmetros opcionais
+    - ou uma lista de pares [moeda1, moeda2] / dicionários
+    Parâmetros ausentes vêm de 'padroes' e, depois, de PADROES.
+    """
+    padroes = {**PADROES, **padroes}
+    if isinstance(pares, pd.DataFrame):
+        tabela = pares
+        if 'Cointegrado?' in tabela:
+            tabela = tabela[tabela['Cointegrado?'].astype(bool)]
+        registros = tabela.rename(columns={'Ativo1': 'moeda1', 'Ativo2': 'moeda2'}).to_dict('records')
+    else:
+        registros = [dict(par) if isinstance(par, dict) else {'moeda1': par[0], 'moeda2': par[1]} for par in pares]
+
+    resultado = []
+    for registro in registros:
+        par = {'moeda1': registro['moeda1'], 'moeda2': registro['moeda2']}
+        for nome, padrao in padroes.items():
+            valor = registro.get(nome, padrao)
+            par[nome] = padrao if valor is None or (isinstance(valor, float) and np.isnan(valor)) else valor
+        par['janela'] = int(par['janela'])
+        resultado.append(par)
+    return resultado
+
+
+def sinais_par(df, par, taxa=0.001, com_stoploss=False, features=None):
+    """
+    Códigos de posição (índice de NOMES_POSICOES) de um par em todas as barras de df e a máscara das linhas
+    válidas, com as mesmas regras de gerar_sinais (ou gerar_sinais_com_stoploss), sem montar o DataFrame de sinais.
+    """
+    janela = par['janela']
+    if features is None:
+        features = arbitragem.features_em_cache(df, janela, cointegracao_movel=False)
+    zscore = features['zscore'].to_numpy()
+    entra_vendido, entra_comprado = arbitragem._condicoes_de_entrada(
+        zscore, df['Ativo1'].to_numpy(), features['ativo1_mean'].to_numpy(),
+        par['zscore_compra_e_venda'], -par['zscore_compra_e_venda'], taxa)
+    if com_stoploss:
+        codigos = arbitragem._sinais_com_stoploss_array(
+            features['spread'].to_numpy(), features['atr'].to_numpy(), zscore, entra_vendido, entra_comprado,
+            par['zscore_encerrar_posicao'], par['stop_loss'], par['cooldown_stop_loss']*janela)
+    else:
+        codigos = arbitragem._sinais_array(zscore, entra_vendido, entra_comprado, par['zscore_encerrar_posicao'])
+    valido = arbitragem._linhas_validas(pd.to_numeric(df['Ativo1'], errors='coerce'),
+                                        pd.to_numeric(df['Ativo2'], errors='coerce'), features)
+    return codigos, valido
+
+
+def trades_dos_sinais(codigos, valido, precos1, precos2, taxa=0.001):
+    """
+    Trades encerrados de um par (mesmas regras de simular_trades, só sobre as linhas válidas).
+
+    Retorna (linhas de entrada, linhas de saída, código da posição, retorno de cada trade), com as linhas
+    contadas em todas as barras do par.
+    """
+    linhas = np.flatnonzero(valido)
+    entradas, saidas, posicoes, retornos = arbitragem.trades_dos_codigos(
+        codigos[linhas], precos1[linhas], precos2[linhas], taxa)
+    return linhas[entradas], linhas[saidas], posicoes, retornos
+
+
+def _timestamps(df):
+    # Nanossegundos, como em armazenamento.py (índices criados pelo pandas podem vir em outra unidade)
+    return df.index.as_unit('ns').asi8
+
+
+def _unir_indice(indice, timestamps):
+    """Índice unido (int64 ordenado) com os timestamps de mais um par; sem cópia quando já estão todos nele."""
+    if indice is None:
+        return np.array(timestamps, dtype=np.int64)
+    posicoes = np.searchsorted(indice, timestamps)
+    presentes = posicoes < len(indice)
+    presentes[presentes] = indice[posicoes[presentes]] == timestamps[presentes]
+    if presentes.all():
+        return indice
+    return np.union1d(indice, timestamps[~presentes])
+
+
+def _fila_de_eventos(barras_entrada, barras_saida, capital_inicial, max_posicoes, retornos):
+    """
+    Percorre entradas e saídas de todos os trades em ordem (barra, saídas primeiro, ordem dos trades).
+
+    Cada entrada aceita recebe caixa / vagas livres; entradas sem vaga ou sem caixa são recusadas.
+    Retorna (alocado por trade, 0 = recusado), barras dos eventos e o caixa depois de cada evento.
+    """
+    n_trades = len(retornos)
+    barras = np.concatenate([barras_saida, barras_entrada])
+    tipos = np.concatenate([np.full(n_trades, EVENTO_SAIDA), np.full(n_trades, EVENTO_ENTRADA)])
+    trades = np.concatenate([np.arange(n_trades), np.arange(n_trades)])
+    ordem = np.lexsort((trades, tipos, barras))
+
+    alocado = [0.0] * n_trades
+    retornos = retornos.tolist()
+    caixa_eventos = []
+    caixa = float(capital_inicial)
+    abertas = 0
+    for tipo, k in zip(tipos[ordem].tolist(), trades[ordem].tolist()):
+        if tipo == EVENTO_SAIDA:
+            if alocado[k]:
+                caixa += alocado[k] * (1 + retornos[k])
+                abertas -= 1
+        elif abertas < max_posicoes and caixa > 0:
+            alocado[k] = caixa / (max_posicoes - abertas)
+            caixa -= alocado[k]
+            abertas += 1
+        caixa_eventos.append(caixa)
+    return np.array(alocado), barras[ordem], np.array(caixa_eventos)
+
+
+def _valor_aberto(aberto, indice, timestamps, precos1, precos2, entradas, barra_entrada, barra_saida, posicoes,
+                  alocado, taxa):
+    """
+    Soma em 'aberto' o valor marcado a mercado dos trades aceitos de um par, em cada barra do índice unido
+    de [barra_entrada, barra_saida). Entre barras do par vale o último preço do par.
+    """
+    duracoes = barra_saida - barra_entrada
+    if duracoes.sum() == 0:
+        return
+    trade = np.repeat(np.arange(len(duracoes)), duracoes)
+    barras = np.arange(duracoes.sum()) - np.repeat(np.cumsum(duracoes) - duracoes - barra_entrada, duracoes)
+    linhas = np.searchsorted(timestamps, indice[barras], side='right') - 1
+
+    # Mesma conta do retorno de simular_trades, com o preço da barra no lugar do preço de saída
+    linha_entrada = entradas[trade]
+    retorno_1 = (precos1[linhas] / precos1[linha_entrada]) - 1
+    retorno_2 = (precos2[linhas] / precos2[linha_entrada]) - 1
+    retorno_1 -= 2 * taxa
+    retorno_2 -= 2 * taxa
+    retorno = np.where(posicoes[trade] == 1, retorno_1 - retorno_2, retorno_2 - retorno_1)
+    # Trades do mesmo par não se sobrepõem: cada barra aparece uma vez
+    aberto[barras] += alocado[trade] * (1 + retorno)
+
+
+def simular_carteira(pares, intervalo='5m', data_inicial=None, data_final=None, capital_inicial=10000,
+                     max_posicoes=10, taxa=0.001, com_stoploss=False, carregar=None,
+                     diretorio=armazenamento.DIRETORIO_DADOS, **padroes):
+    """
+    Simula todos os pares juntos, com capital compartilhado e no máximo max_posicoes posições abertas.
+
+    Os sinais e trades de cada par seguem simular_estrategia_precos (gerar_sinais + simular_trades, ou
+    gerar_sinais_com_stoploss com com_stoploss=True); trades ainda abertos no fim não entram, como lá.
+    Cada entrada aceita recebe caixa / (max_posicoes - posições abertas); quando não há vaga ou caixa o trade
+    é recusado. Saídas no mesmo instante são processadas antes das entradas.
+
+    Parâmetros:
+    - pares: tabela de pares (como pares_cointegrados.csv) ou lista de pares/dicionários; ver pares_da_tabela
+    - carregar: função (moeda1, moeda2) -> DataFrame com Ativo1 e Ativo2 (padrão: armazenamento.carregar_par
+      com intervalo, data_inicial e data_final)
+    - padroes: parâmetros dos pares que não vêm na tabela (zscore_compra_e_venda, janela, ...)
+
+    Retorna:
+    retorno_pct_total: retorno da carteira no período
+    curva: DataFrame no índice de tempo unido com capital, caixa, posicoes_abertas e drawdown
+    df_trades: uma linha por trade de cada par: par, entrada, saida, posicao, retorno, alocado (0 = recusado)
+               e lucro
+    atribuicao: uma linha por par: trades, recusados, lucro e contribuição para o retorno da carteira
+    """
+    if carregar is None:
+        def carregar(moeda1, moeda2):
+            return armazenamento.carregar_par(f'{moeda1}USDT', f'{moeda2}USDT', intervalo, data_inicial, data_final,
+                                              diretorio=diretorio)
+    pares = pares_da_tabela(pares, **padroes)
+    nomes = [f"{par['moeda1']}-{par['moeda2']}" for par in pares]
+
+    # Primeira passada: trades de cada par e o índice unido das barras válidas
+    indice = None
+    trades_pares = []
+    for par in pares:
+        df = carregar(par['moeda1'], par['moeda2'])
+        codigos, valido = sinais_par(df, par, taxa, com_stoploss)
+        timestamps = _timestamps(df)
+        entradas, saidas, posicoes, retornos = trades_dos_sinais(
+            codigos, valido, df['Ativo1'].to_numpy(dtype=float), df['Ativo2'].to_numpy(dtype=float), taxa)
+        trades_pares.append((entradas, saidas, posicoes, retornos, timestamps[entradas], timestamps[saidas]))
+        indice = _unir_indice(indice, timestamps[valido])
+    if indice is None:
+        indice = np.empty(0, dtype=np.int64)
+
+    n_trades = np.array([len(trades[3]) for trades in trades_pares], dtype=np.int64)
+    par_trade = np.repeat(np.arange(len(pares)), n_trades)
+
+    def juntar(k, tipo):
+        return np.concatenate([trades[k] for trades in trades_pares] + [np.empty(0, tipo)])
+
+    posicoes = juntar(2, np.int8)
+    retornos = juntar(3, float)
+    barra_entrada = np.searchsorted(indice, juntar(4, np.int64))
+    barra_saida = np.searchsorted(indice, juntar(5, np.int64))
+
+    alocado, barras_eventos, caixa_eventos = _fila_de_eventos(barra_entrada, barra_saida, capital_inicial,
+                                                             max_posicoes, retornos)
+    aceito = alocado > 0
+
+    # Caixa em cada barra: o do último evento até ela (capital inicial antes do primeiro)
+    n = len(indice)
+    ultimo_evento = np.searchsorted(barras_eventos, np.arange(n), side='right')
+    caixa = np.concatenate([[float(capital_inicial)], caixa_eventos])[ultimo_evento]
+
+    # Segunda passada: valor marcado a mercado das posições abertas, só dos pares com trades aceitos
+    aberto = np.zeros(n)
+    inicio_par = np.concatenate([[0], np.cumsum(n_trades)])
+    for p, par in enumerate(pares):
+        fatia = slice(inicio_par[p], inicio_par[p + 1])
+        aceitos = aceito[fatia]
+        if not aceitos.any():
+            continue
+        df = carregar(par['moeda1'], par['moeda2'])
+        entradas = trades_pares[p][0]
+        _valor_aberto(aberto, indice, _timestamps(df), df['Ativo1'].to_numpy(dtype=float),
+                      df['Ativo2'].to_numpy(dtype=float), entradas[aceitos], barra_entrada[fatia][aceitos],
+                      barra_saida[fatia][aceitos], posicoes[fatia][aceitos], alocado[fatia][aceitos], taxa)
+
+    variacao = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(variacao, barra_entrada[aceito], 1)
+    np.add.at(variacao, barra_saida[aceito], -1)
+    posicoes_abertas = np.cumsum(variacao[:n])
+
+    capital = caixa + aberto
+    drawdown = capital / np.maximum.accumulate(capital) - 1 if n else capital
+    curva = pd.DataFrame({'capital': capital, 'caixa': caixa, 'posicoes_abertas': posicoes_abertas,
+                          'drawdown': drawdown},
+                         index=pd.DatetimeIndex(indice.view('datetime64[ns]'), name='timestamp'))
+
+    lucro = alocado * retornos
+    df_trades = pd.DataFrame({
+        'par': np.array(nomes, dtype=object)[par_trade],
+        'entrada': curva.index[barra_entrada],
+        'saida': curva.index[barra_saida],
+        'posicao': np.array(arbitragem.NOMES_POSICOES, dtype=object)[posicoes],
+        'retorno': retornos,
+        'alocado': alocado,
+        'lucro': lucro,
+    })
+
+    lucro_par = np.bincount(par_trade, weights=lucro, minlength=len(pares))
+    aceitos_par = np.bincount(par_trade, weights=aceito, minlength=len(pares)).astype(np.int64)
+    atribuicao = pd.DataFrame({
+        'par': nomes,
+        'trades': aceitos_par,
+        'recusados': n_trades - aceitos_par,
+        'lucro': lucro_par,
+        'contribuicao_pct': lucro_par / capital_inicial,
+    })
+
+    capital_final = capital[-1] if n else capital_inicial
+    retorno_pct_total = (capital_final / capital_inicial) - 1
+    print(f"Retorno total da carteira: {retorno_pct_total:.2%} ({aceito.sum()} trades, {len(aceito) - aceito.sum()} recusados)")
+    return retorno_pct_total, curva, df_trades, atribuicao
+
+
+def salvar_graficos(curva, diretorio=DIRETORIO_GRAFICOS):
+    """Gráficos consolidados da carteira (evolução do capital, drawdown, posições abertas e retornos diários)."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    os.makedirs(diretorio, exist_ok=True)
+    retornos_diarios = curva['capital'].resample('1D').last().pct_change().dropna() * 100
+    graficos = [
+        ('evolucao_capital.png', curva['capital'], 'Evolução do Capital', 'Capital'),
+        ('drawdown.png', curva['drawdown'] * 100, 'Drawdown', 'Drawdown (%)'),
+        ('num_posicoes.png', curva['posicoes_abertas'], 'Número de Posições Abertas', 'Posições'),
+        ('retornos_diarios.png', retornos_diarios, 'Retornos Diários', 'Retorno (%)'),
+    ]
+    for arquivo, serie, titulo, rotulo in graficos:
+        plt.figure(figsize=(15, 6))
+        if arquivo == 'num_posicoes.png':
+            plt.step(serie.index, serie.values, where='post')
+        else:
+            plt.plot(serie.index, serie.values)
+        plt.title(titulo)
+        plt.xlabel('Data')
+        plt.ylabel(rotulo)
+        plt.grid(True)
+        plt.tight_layout()
+        plt.savefig(os.path.join(diretorio, arquivo), dpi=300)
+        plt.close()
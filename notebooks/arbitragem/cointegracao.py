@@ -0,0 +1,203 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+from statsmodels.tsa.adfvalues import mackinnonp
+# Tabelas de superfície de resposta de MacKinnon (1994), as mesmas usadas por statsmodels.tsa.stattools.adfuller e
+# coint. São privadas no statsmodels: se uma versão nova mudar os nomes, pvalor_mackinnon passa a chamar o
+# mackinnonp público valor a valor (mesmo resultado, mais lento)
+try:
+    from statsmodels.tsa.adfvalues import _tau_maxs, _tau_mins, _tau_stars, _tau_smallps, _tau_largeps
+except ImportError:
+    _tau_maxs = _tau_mins = _tau_stars = _tau_smallps = _tau_largeps = None
+
+# Mesmo limite de colinearidade usado por statsmodels.tsa.stattools.coint
+_LIMITE_R2 = 1 - 100 * np.sqrt(np.finfo(float).eps)
+
+
+def pvalor_mackinnon(estatistica, regressao="c", N=1):
+    """
+    Versão vetorizada de statsmodels.tsa.adfvalues.mackinnonp.
+
+    Parâmetros:
+    - estatistica: estatística t do teste ADF (escalar ou array)
+    - regressao: 'n' (sem constante) ou 'c' (com constante), como no adfuller
+    - N: número de séries I(1) envolvidas (1 para ADF, 2 para Engle-Granger de um par)
+
+    Retorna:
+    - array com os p-valores aproximados
+    """
+    estatistica = np.asarray(estatistica, dtype=float)
+    if _tau_maxs is None:
+        pvalores = [mackinnonp(valor, regression=regressao, N=N) for valor in estatistica.ravel()]
+        return np.array(pvalores, dtype=float).reshape(estatistica.shape)
+
+    maximo = _tau_maxs[regressao][N - 1]
+    minimo = _tau_mins[regressao][N - 1]
+    corte = _tau_stars[regressao][N - 1]
+
+    # Polinômios para a cauda esquerda (p pequeno) e para o resto da distribuição
+    z_pequeno = np.polynomial.polynomial.polyval(estatistica, _tau_smallps[regressao][N - 1])
+    z_grande = np.polynomial.polynomial.polyval(estatistica, _tau_largeps[regressao][N - 1])
+    with np.errstate(invalid='ignore'):
+        pvalor = norm.cdf(np.where(estatistica <= corte, z_pequeno, z_grande))
+    pvalor = np.where(estatistica > maximo, 1.0, pvalor)
+    pvalor = np.where(estatistica < minimo, 0.0, pvalor)
+    return pvalor
+
+
+def _somas_moveis(colunas, inicios, fins):
+    """
+    Soma de cada coluna no intervalo [inicio, fim) de cada janela, usando somas acumuladas.
+
+    Retorna um array (n_janelas, n_colunas).
+    """
+    somas = np.empty((len(inicios), len(colunas)))
+    for j, coluna in enumerate(colunas):
+        acumulada = np.concatenate(([0.0], np.cumsum(coluna)))
+        somas[:, j] = acumulada[fins] - acumulada[inicios]
+    return somas
+
+
+def _estatistica_t_adf(G, n_obs):
+    """
+    Estatística t do coeficiente do nível defasado numa regressão ADF, a partir da matriz de produtos cruzados.
+
+    G: array (n_janelas, K, K) com os produtos cruzados de [dependente, nível defasado, diferenças defasadas, (constante)].
+    """
+    XtX = G[:, 1:, 1:]
+    Xty = G[:, 1:, 0]
+    yty = G[:, 0, 0]
+    k = XtX.shape[1]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Janelas singulares (ex: preço constante) ficam com NaN
+        validas = np.isfinite(XtX).all(axis=(1, 2)) & (np.abs(np.linalg.det(XtX)) > 0)
+        estatistica = np.full(len(G), np.nan)
+        if validas.any():
+            inversa = np.linalg.inv(XtX[validas])
+            beta = np.einsum('wij,wj->wi', inversa, Xty[validas])
+            ssr = yty[validas] - np.einsum('wi,wi->w', beta, Xty[validas])
+            sigma2 = ssr / (n_obs - k)
+            estatistica[validas] = beta[:, 0] / np.sqrt(sigma2 * inversa[:, 0, 0])
+    return estatistica
+
+
+def cointegracao_movel(series1, series2, janela, defasagens=1, passo=1, signif=0.05):
+    """
+    Teste de Engle-Granger em janela móvel, calculado de forma incremental.
+
+    Equivale a rodar, para cada janela [i - janela, i):
+    1. regressão series1 = alfa + beta * series2 + residuos (sm.OLS)
+    2. coint(window1, window2, maxlag=defasagens, autolag=None)
+    3. adfuller(residuos, maxlag=defasagens, autolag=None)
+
+    Mas sem ajustar modelos do statsmodels a cada janela:
+    - alfa e beta saem de somas móveis de x, y, x² e xy
+    - as regressões ADF dos resíduos são montadas a partir de somas móveis dos produtos cruzados
+      de níveis e diferenças das duas séries, e resolvidas em lote com NumPy
+    - os p-valores vêm das tabelas de MacKinnon (pvalor_mackinnon)
+
+    Parâmetros:
+    - series1, series2: séries de preços alinhadas (series1 é a variável dependente)
+    - janela: tamanho da janela móvel
+    - defasagens: número fixo de diferenças defasadas na regressão ADF (sem seleção automática por AIC)
+    - passo: testa apenas a cada 'passo' barras e repete o último resultado nas barras intermediárias
+    - signif: nível de significância dos dois testes
+
+    Retorna:
+    DataFrame com o mesmo índice de series1 e colunas alfa, beta, estatistica_eg, pvalor_eg,
+    estatistica_adf, pvalor_adf e cointegrado. As primeiras 'janela' linhas ficam sem teste (NaN / False).
+    """
+    indice = series1.index if isinstance(series1, pd.Series) else pd.RangeIndex(len(series1))
+    y = np.asarray(series1, dtype=float)
+    x = np.asarray(series2, dtype=float)
+    n = len(y)
+    p = defasagens
+
+    resultado = pd.DataFrame(np.nan, index=indice,
+                             columns=['alfa', 'beta', 'estatistica_eg', 'pvalor_eg', 'estatistica_adf', 'pvalor_adf'])
+    resultado['cointegrado'] = False
+
+    # Janela válida até final da série; resultado de i usa as barras [i - janela, i)
+    fins = np.arange(janela, n, passo)
+    n_obs = janela - p - 1
+    if len(fins) == 0 or n_obs - (p + 2) <= 0:
+        return resultado
+    inicios = fins - janela
+
+    # Centralizar não muda beta nem os resíduos, mas reduz o erro numérico das somas acumuladas
+    media_y = y.mean()
+    media_x = x.mean()
+    y = y - media_y
+    x = x - media_x
+
+    # --- Regressão linear por somas móveis ---
+    sx, sy, sxx, sxy, syy = _somas_moveis([x, y, x * x, x * y, y * y], inicios, fins).T
+    var_x = janela * sxx - sx * sx
+    var_y = janela * syy - sy * sy
+    cov_xy = janela * sxy - sx * sy
+    with np.errstate(invalid='ignore', divide='ignore'):
+        beta = cov_xy / var_x
+        alfa = (sy - beta * sx) / janela
+        r2 = cov_xy * cov_xy / (var_x * var_y)
+
+    # --- Regressões ADF nos resíduos ---
+    # Vetor base de cada observação t da regressão ADF:
+    # [y(t-1), x(t-1), 1, dy(t), dx(t), dy(t-1), dx(t-1), ..., dy(t-p), dx(t-p)]
+    # Os resíduos e suas diferenças são combinações lineares desse vetor, com pesos que dependem de alfa e beta.
+    dy = np.concatenate(([np.nan], np.diff(y)))
+    dx = np.concatenate(([np.nan], np.diff(x)))
+    base = [np.roll(y, 1), np.roll(x, 1), np.ones(n), dy, dx]
+    for k in range(1, p + 1):
+        base += [np.roll(dy, k), np.roll(dx, k)]
+    D = len(base)
+
+    # A regressão ADF usa t em [inicio + p + 1, fim); o roll só "vaza" valores em posições que nunca entram nesse intervalo
+    pares = [(a, b) for a in range(D) for b in range(a, D)]
+    somas = _somas_moveis([np.nan_to_num(base[a] * base[b]) for a, b in pares], inicios + p + 1, fins)
+    M = np.empty((len(fins), D, D))
+    for j, (a, b) in enumerate(pares):
+        M[:, a, b] = somas[:, j]
+        M[:, b, a] = somas[:, j]
+
+    def transformacao(com_constante):
+        # Linhas: [de(t), e(t-1), de(t-1), ..., de(t-p), (1)] em função do vetor base
+        K = 2 + p + (1 if com_constante else 0)
+        A = np.zeros((len(fins), K, D))
+        A[:, 0, 3] = 1
+        A[:, 0, 4] = -beta
+        A[:, 1, 0] = 1
+        A[:, 1, 1] = -beta
+        A[:, 1, 2] = -alfa
+        for k in range(1, p + 1):
+            A[:, 1 + k, 3 + 2 * k] = 1
+            A[:, 1 + k, 4 + 2 * k] = -beta
+        if com_constante:
+            A[:, K - 1, 2] = 1
+        return A
+
+    # Engle-Granger: ADF sem constante nos resíduos, p-valor com N=2
+    A = transformacao(com_constante=False)
+    G = np.einsum('wkd,wde,wle->wkl', A, M, A, optimize=True)
+    estatistica_eg = _estatistica_t_adf(G, n_obs)
+    # Séries (quase) colineares: coint devolve -inf nesse caso
+    estatistica_eg = np.where(r2 >= _LIMITE_R2, -np.inf, estatistica_eg)
+
+    # Dickey-Fuller nos resíduos: ADF com constante, p-valor com N=1
+    A = transformacao(com_constante=True)
+    G = np.einsum('wkd,wde,wle->wkl', A, M, A, optimize=True)
+    estatistica_adf = _estatistica_t_adf(G, n_obs)
+
+    pvalor_eg = pvalor_mackinnon(estatistica_eg, 'c', N=2)
+    pvalor_adf = pvalor_mackinnon(estatistica_adf, 'c', N=1)
+
+    valores = np.column_stack([alfa + media_y - beta * media_x, beta, estatistica_eg, pvalor_eg, estatistica_adf, pvalor_adf])
+
+    # Com passo > 1 cada teste vale até o próximo (forward fill)
+    posicoes = np.arange(janela, n)
+    ultimo_teste = (posicoes - janela) // passo
+    resultado.iloc[janela:, :6] = valores[ultimo_teste]
+    # Só é cointegrado se ambos testes rejeitarem H0
+    resultado.iloc[janela:, 6] = (resultado['pvalor_eg'].to_numpy()[janela:] < signif) & \
+                                 (resultado['pvalor_adf'].to_numpy()[janela:] < signif)
+    return resultado
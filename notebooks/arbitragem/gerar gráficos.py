@@ -7,13 +7,26 @@ Original file is located at
     https://colab.research.google.com/drive/1G7juj492wjyfUzAaLC4znOeSA5ruXtiP
 """
 
+import os
+import sys
+
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # só grava os PNGs, sem janela (plt.show não bloqueia a execução)
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import numpy as np
 
+ENTRADA = 'retornos.xlsx'
+FIGURAS = ['Variação Acumulada.png', 'zscore_spread.png', 'Valor absoluto dos ativos.png']
+
+# Pula a geração se todos os gráficos são mais novos que a planilha de retornos
+if all(os.path.exists(f) and os.path.getmtime(f) >= os.path.getmtime(ENTRADA) for f in FIGURAS):
+    print('Gráficos já atualizados.')
+    sys.exit(0)
+
 #leitura
-df = pd.read_excel('retornos.xlsx')
+df = pd.read_excel(ENTRADA)
 
 # Verificacao
 df.head()
@@ -54,7 +67,7 @@ plt.xticks(rotation=45)
 plt.legend(fontsize=13)
 plt.tight_layout()
 plt.savefig('Variação Acumulada.png', dpi = 300)
-plt.show()
+plt.close()
 
 # Identificar quando muda o sinal
 df['sinal_shift'] = df['sinal'].shift(1)
@@ -93,7 +106,7 @@ plt.grid(True)
 plt.tight_layout()
 
 plt.savefig('zscore_spread.png', dpi = 300)
-plt.show()
+plt.close()
 
 # Cria uma figura com 1 linha e 2 colunas para os subgráficos
 fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
@@ -117,6 +130,6 @@ ax2.grid(False)
 # Ajusta o layout para evitar que os títulos e rótulos se sobreponham
 plt.tight_layout()
 
-# Exibe o gráfico
+# Salva o gráfico
 plt.savefig('Valor absoluto dos ativos.png')
-plt.show()
+plt.close()
@@ -0,0 +1,224 @@
+import collections
+import contextlib
+import cProfile
+import functools
+import io
+import pstats
+import sys
+import threading
+import time
+
+import pandas as pd
+
+# Instrumentação das etapas da simulação (carregamento, cointegração móvel, estatísticas móveis, sinais,
+# P&L, gravação) para saber onde o tempo de uma otimização vai.
+#
+# Desligada por padrão: etapa() devolve sempre o mesmo objeto vazio, e contar() e as funções decoradas com
+# medir() retornam logo, então o custo nos caminhos quentes é uma checagem de variável global. Ligada (ativar()
+# ou o bloco medindo()), acumula por etapa o número de chamadas, o tempo total, o tempo próprio (sem as etapas
+# internas) e as linhas processadas.
+# Opcionalmente roda junto um cProfile ou um perfil por amostragem.
+#
+# Ex:
+#     with instrumentacao.medindo(perfil='amostragem'):
+#         arbitragem.simular_estrategia('BTC', 'ETH', ...)
+#     instrumentacao.imprimir_relatorio()
+
+ATIVO = False
+
+_etapas = collections.defaultdict(lambda: {'chamadas': 0, 'segundos': 0.0, 'proprio_s': 0.0, 'linhas': 0})
+_contadores = collections.Counter()
+# Etapas abertas no momento: [nome, início, tempo das etapas internas]
+_pilha = []
+_perfil = {}
+
+
+class _EtapaDesligada:
+    """Objeto único devolvido por etapa() com a instrumentação desligada; aceita e ignora 'linhas'."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    linhas = property(lambda self: 0, lambda self, valor: None)
+
+
+_DESLIGADA = _EtapaDesligada()
+
+
+class _Etapa:
+    __slots__ = ('nome', 'linhas', '_registro')
+
+    def __init__(self, nome, linhas):
+        self.nome = nome
+        self.linhas = linhas
+
+    def __enter__(self):
+        self._registro = [self.nome, time.perf_counter(), 0.0]
+        _pilha.append(self._registro)
+        return self
+
+    def __exit__(self, *exc):
+        duracao = time.perf_counter() - self._registro[1]
+        _pilha.pop()
+        if _pilha:
+            _pilha[-1][2] += duracao
+        estatisticas = _etapas[self.nome]
+        estatisticas['chamadas'] += 1
+        estatisticas['segundos'] += duracao
+        estatisticas['proprio_s'] += duracao - self._registro[2]
+        if self.linhas:
+            estatisticas['linhas'] += int(self.linhas)
+        return False
+
+
+def etapa(nome, linhas=None):
+    """
+    Mede o bloco 'with' como a etapa 'nome'. As linhas processadas podem vir aqui ou ser atribuídas depois:
+
+        with etapa('carregar_dados') as e:
+            df = ...
+            e.linhas = len(df)
+    """
+    if not ATIVO:
+        return _DESLIGADA
+    return _Etapa(nome, linhas)
+
+
+def medir(nome):
+    """Decorador: cada chamada da função conta como a etapa 'nome'."""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            if not ATIVO:
+                return funcao(*args, **kwargs)
+            with _Etapa(nome, None):
+                return funcao(*args, **kwargs)
+        return medida
+    return decorador
+
+
+def contar(nome, n=1):
+    """Soma n ao contador 'nome' (acertos de cache, trades, ...)."""
+    if ATIVO:
+        _contadores[nome] += n
+
+
+def limpar():
+    _etapas.clear()
+    _contadores.clear()
+    _perfil.clear()
+
+
+class _Amostrador(threading.Thread):
+    """Perfil por amostragem: a cada 'intervalo' segundos anota a função e a etapa em execução na thread medida."""
+
+    def __init__(self, thread_id, intervalo):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.intervalo = intervalo
+        self.funcoes = collections.Counter()
+        self.etapas = collections.Counter()
+        self.amostras = 0
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            codigo = frame.f_code
+            self.funcoes[f'{codigo.co_filename}:{codigo.co_firstlineno}({codigo.co_name})'] += 1
+            self.etapas[_pilha[-1][0] if _pilha else '(fora de etapas)'] += 1
+            self.amostras += 1
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+
+
+def ativar(perfil=None, intervalo=0.005):
+    """
+    Liga a instrumentação (zerando o que foi acumulado antes).
+
+    perfil: None, 'cprofile' (perfil determinístico, mais caro) ou 'amostragem' (amostras a cada 'intervalo'
+    segundos numa thread à parte, custo baixo).
+    """
+    global ATIVO
+    limpar()
+    ATIVO = True
+    if perfil == 'cprofile':
+        _perfil['cprofile'] = cProfile.Profile()
+        _perfil['cprofile'].enable()
+    elif perfil == 'amostragem':
+        _perfil['amostragem'] = _Amostrador(threading.get_ident(), intervalo)
+        _perfil['amostragem'].start()
+    elif perfil is not None:
+        raise ValueError("perfil deve ser None, 'cprofile' ou 'amostragem'")
+    _perfil['inicio'] = time.perf_counter()
+
+
+def desativar():
+    """Desliga a instrumentação; o relatório continua disponível até o próximo ativar()."""
+    global ATIVO
+    ATIVO = False
+    _perfil['duracao'] = time.perf_counter() - _perfil.get('inicio', time.perf_counter())
+    if 'cprofile' in _perfil:
+        _perfil['cprofile'].disable()
+    if 'amostragem' in _perfil:
+        _perfil['amostragem'].parar()
+
+
+@contextlib.contextmanager
+def medindo(perfil=None, intervalo=0.005):
+    """Liga a instrumentação só dentro do bloco 'with'."""
+    ativar(perfil, intervalo)
+    try:
+        yield
+    finally:
+        desativar()
+
+
+def relatorio():
+    """
+    Tempo por etapa da última medição: chamadas, segundos (com as etapas internas), proprio_s (sem elas),
+    % do tempo medido (pelo tempo próprio, então as linhas somam no máximo 100%), linhas e linhas por segundo.
+    """
+    df = pd.DataFrame.from_dict(dict(_etapas), orient='index',
+                                columns=['chamadas', 'segundos', 'proprio_s', 'linhas'])
+    df.index.name = 'etapa'
+    duracao = _perfil.get('duracao') or (time.perf_counter() - _perfil['inicio'] if 'inicio' in _perfil else None)
+    df['pct'] = df['proprio_s'] / duracao * 100 if duracao else float('nan')
+    df['linhas_por_s'] = (df['linhas'] / df['segundos']).where(df['linhas'] > 0)
+    return df.sort_values('proprio_s', ascending=False)
+
+
+def contadores():
+    return dict(_contadores)
+
+
+def imprimir_relatorio(linhas_perfil=15):
+    duracao = _perfil.get('duracao')
+    if duracao is not None:
+        print(f"Tempo medido: {duracao:.3f}s")
+    print(relatorio().to_string(float_format=lambda x: f'{x:.4f}'))
+    if _contadores:
+        print("\nContadores:")
+        for nome, valor in sorted(_contadores.items()):
+            print(f"  {nome}: {valor}")
+
+    if 'cprofile' in _perfil:
+        saida = io.StringIO()
+        pstats.Stats(_perfil['cprofile'], stream=saida).sort_stats('cumulative').print_stats(linhas_perfil)
+        print(saida.getvalue())
+    if 'amostragem' in _perfil:
+        amostrador = _perfil['amostragem']
+        print(f"\nAmostras: {amostrador.amostras}")
+        print("Por etapa:")
+        for nome, n in amostrador.etapas.most_common():
+            print(f"  {n / max(amostrador.amostras, 1):6.1%}  {nome}")
+        print("Funções mais amostradas:")
+        for nome, n in amostrador.funcoes.most_common(linhas_perfil):
+            print(f"  {n / max(amostrador.amostras, 1):6.1%}  {nome}")
@@ -0,0 +1,237 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import ParameterGrid, TimeSeriesSplit
+
+import arbitragem
+import armazenamento
+
+# Muda quando a simulação mudar de um jeito que invalide resultados já gravados
+VERSAO_SIMULACAO = 1
+
+# Parâmetros aceitos no grid. A otimização usa as regras de gerar_sinais (sem stop loss), como
+# validacao_cruzada_temporal, então stop_loss e cooldown_stop_loss não mudariam o resultado
+PARAMETROS_GRID = ('zscore_compra_e_venda', 'zscore_encerrar_posicao', 'janela')
+
+# A partir de quantas combinações pendentes num fold simular_grade (uma passada em Python pelas barras para
+# todas) compensa mais que simular cada combinação com os sinais compactos (vetorizados, ~20 ms cada em
+# 100 mil barras). Os dois custos crescem com o número de barras, então o limite vale para qualquer tamanho.
+COMBINACOES_GRADE = 250
+
+# Configuração da otimização em cada processo (definida por _iniciar)
+_configuracao = {}
+_feitos = set()
+
+
+def _iniciar(configuracao, feitos):
+    _configuracao.clear()
+    _configuracao.update(configuracao)
+    _feitos.clear()
+    _feitos.update(feitos)
+
+
+def chave_resultado(hash_dados, params, taxa, capital_inicial):
+    """Chave de memoização: mesmo recorte de dados + mesmos parâmetros = mesmo resultado."""
+    conteudo = json.dumps({'dados': hash_dados, 'params': params, 'taxa': taxa,
+                           'capital_inicial': capital_inicial, 'versao': VERSAO_SIMULACAO}, sort_keys=True)
+    return hashlib.blake2b(conteudo.encode(), digest_size=16).hexdigest()
+
+
+def _folds(n, n_splits):
+    """Recortes [inicio, fim) de validacao_cruzada_temporal: do início do treino ao fim da validação."""
+    recortes = []
+    for train_idx, val_idx in TimeSeriesSplit(n_splits=n_splits).split(np.arange(n)):
+        # Evita splits com menos de 10 linhas
+        if len(train_idx) < 10 or len(val_idx) < 10:
+            continue
+        recortes.append((train_idx[0], val_idx[-1] + 1))
+    return recortes
+
+
+def _simular_tarefa(tarefa):
+    """
+    Simula todas as combinações de um par e uma janela em todos os folds.
+    As features móveis do par são calculadas uma vez só para a janela. Em cada fold, as combinações
+    pendentes rodam uma a uma com os sinais compactos ou, a partir de COMBINACOES_GRADE, juntas com simular_grade.
+
+    Retorna os registros das simulações feitas agora e as chaves de todas as simulações da tarefa.
+    """
+    moeda1, moeda2, janela, combinacoes = tarefa
+    c = _configuracao
+    df = armazenamento.carregar_par(f'{moeda1}USDT', f'{moeda2}USDT', c['intervalo'],
+                                    c['data_inicial'], c['data_final'], diretorio=c['diretorio'])
+
+    chaves = []
+    pendentes = {}
+    for fold, (inicio, fim) in enumerate(_folds(len(df), c['n_splits'])):
+        hash_dados = arbitragem.assinatura_precos(df.iloc[inicio:fim])
+        for params in combinacoes:
+            params = {**params, 'janela': janela}
+            chave = chave_resultado(hash_dados, params, c['taxa'], c['capital_inicial'])
+            chaves.append(chave)
+            if chave not in _feitos:
+                pendentes.setdefault((fold, inicio, fim), []).append((params, chave))
+
+    registros = []
+    features = None
+    for (fold, inicio, fim), itens in pendentes.items():
+        registros_fold = [{'chave': chave, 'Moeda1': moeda1, 'Moeda2': moeda2, **params, 'fold': fold,
+                           'inicio': str(df.index[inicio]), 'fim': str(df.index[fim - 1]),
+                           'retorno_pct': None, 'retorno_risco': None, 'sharpe': None, 'erro': None}
+                          for params, chave in itens]
+        t0 = time.perf_counter()
+        try:
+            if fim - inicio < janela:
+                # Mesmo erro que simular_estrategia_precos daria (cointegração móvel sem janela completa)
+                raise ValueError(f"fold com {fim - inicio} linhas, menor que a janela {janela}")
+            if features is None:
+                features = arbitragem.features_em_cache(df, janela, cointegracao_movel=False)
+            df_fold = df.iloc[inicio:fim]
+            features_fold = arbitragem.recortar_features(features, inicio, fim)
+            if len(itens) >= COMBINACOES_GRADE:
+                # Todas as combinações pendentes do fold numa passada só (regras de gerar_sinais, sem stop loss)
+                parametros = pd.DataFrame([params for params, _ in itens])
+                resultado = arbitragem.simular_grade(
+                    df_fold, janela,
+                    parametros['zscore_compra_e_venda'].to_numpy(),
+                    parametros['zscore_encerrar_posicao'].to_numpy(),
+                    taxa=c['taxa'],
+                    capital_inicial=c['capital_inicial'],
+                    com_stoploss=False,
+                    features=features_fold)
+                metricas = resultado[['retorno_pct', 'retorno_risco', 'sharpe']].itertuples(index=False)
+            else:
+                # Uma combinação por vez, com os sinais em códigos int8 e o P&L vetorizado
+                metricas = [tuple(arbitragem.gerar_sinais(
+                    df_fold, params['zscore_compra_e_venda'], params['zscore_encerrar_posicao'], 0.0, 0, janela,
+                    c['taxa'], features=features_fold, compacto=True).simular(c['capital_inicial'], c['taxa']))
+                    for params, _ in itens]
+            for registro, (retorno_pct, retorno_risco, sharpe) in zip(registros_fold, metricas):
+                registro.update(retorno_pct=float(retorno_pct), retorno_risco=float(retorno_risco), sharpe=float(sharpe))
+        except Exception as e:
+            for registro in registros_fold:
+                registro['erro'] = f'{type(e).__name__}: {e}'
+        segundos = (time.perf_counter() - t0) / len(registros_fold)
+        for registro in registros_fold:
+            registro['segundos'] = segundos
+        registros += registros_fold
+    return registros, chaves
+
+
+def ler_resultados(saida):
+    """Lê o arquivo JSON lines de resultados (um registro por simulação). Linhas incompletas são ignoradas."""
+    registros = []
+    if os.path.exists(saida):
+        with open(saida) as f:
+            for linha in f:
+                try:
+                    registros.append(json.loads(linha))
+                except json.JSONDecodeError:
+                    # Última linha cortada por uma execução interrompida
+                    continue
+    return pd.DataFrame(registros)
+
+
+def resumir(df_registros):
+    """
+    Retorno médio nos folds por par e combinação de parâmetros, como o retorno_medio de validacao_cruzada_temporal.
+    Simulações com erro ficam fora da média; combinações sem nenhum fold válido ficam com -inf.
+    """
+    # Colunas vazias são de parâmetros que só registros antigos do mesmo arquivo tinham
+    colunas_params = [c for c in df_registros.columns
+                      if c not in ('chave', 'fold', 'inicio', 'fim', 'retorno_pct', 'retorno_risco',
+                                   'sharpe', 'erro', 'segundos') and df_registros[c].notna().any()]
+    validos = df_registros[df_registros['erro'].isna()]
+    resumo = df_registros[colunas_params].drop_duplicates().merge(
+        validos.groupby(colunas_params, as_index=False).agg(
+            retorno_medio=('retorno_pct', 'mean'), sharpe_medio=('sharpe', 'mean'), folds=('fold', 'count')),
+        on=colunas_params, how='left')
+    resumo['retorno_medio'] = resumo['retorno_medio'].fillna(-np.inf)
+    resumo['folds'] = resumo['folds'].fillna(0).astype(int)
+    return resumo.sort_values('retorno_medio', ascending=False).reset_index(drop=True)
+
+
+def otimizar_pares(pares, param_grid, intervalo='1d', data_inicial=None, data_final=None, n_splits=4,
+                   taxa=0.001, capital_inicial=10000, processos=None,
+                   saida='resultados/otimizacao/resultados.jsonl', diretorio=armazenamento.DIRETORIO_DADOS):
+    """
+    Validação cruzada temporal de vários pares e combinações de parâmetros em paralelo.
+
+    Cada tarefa é um (par, janela): o processo carrega o par, calcula as features móveis uma vez
+    e simula as combinações de zscore de cada fold do TimeSeriesSplit (uma a uma com os sinais compactos,
+    ou numa passada só com simular_grade quando são muitas; ver COMBINACOES_GRADE).
+
+    Cada simulação é gravada em 'saida' (JSON lines) assim que a tarefa termina, com uma chave feita
+    do hash do recorte de dados e dos parâmetros. Rodar de novo pula as simulações já gravadas
+    com sucesso; as que deram erro ficam registradas (coluna erro) e são refeitas.
+
+    Parâmetros:
+    - pares: lista de pares [moeda1, moeda2]
+    - param_grid: dicionário para ParameterGrid com zscore_compra_e_venda, zscore_encerrar_posicao e janela
+      (as regras são as de gerar_sinais, sem stop loss; outras chaves dão ValueError)
+    - processos: número de processos (None usa todos os núcleos; 1 roda no processo atual)
+
+    Retorna:
+    DataFrame de resumir() com os resultados desta otimização (novos e reaproveitados)
+    """
+    extras = set(param_grid) - set(PARAMETROS_GRID)
+    if extras:
+        raise ValueError(f"parâmetros {sorted(extras)} não entram na otimização (regras de gerar_sinais, sem stop "
+                         f"loss); o grid aceita {list(PARAMETROS_GRID)}")
+    janelas = list(param_grid['janela'])
+    grid_sem_janela = {k: v for k, v in param_grid.items() if k != 'janela'}
+    combinacoes = list(ParameterGrid(grid_sem_janela))
+
+    configuracao = {'intervalo': intervalo, 'data_inicial': data_inicial, 'data_final': data_final,
+                    'n_splits': n_splits, 'taxa': taxa, 'capital_inicial': capital_inicial, 'diretorio': diretorio}
+
+    # Converte os CSVs antes de abrir o pool, para os processos só lerem os arquivos prontos
+    for moeda1, moeda2 in pares:
+        armazenamento.abrir_candles(f'{moeda1}USDT', intervalo, diretorio)
+        armazenamento.abrir_candles(f'{moeda2}USDT', intervalo, diretorio)
+
+    anteriores = ler_resultados(saida)
+    feitos = set()
+    if len(anteriores):
+        feitos = set(anteriores.loc[anteriores['erro'].isna(), 'chave'])
+
+    tarefas = [(moeda1, moeda2, janela, combinacoes) for moeda1, moeda2 in pares for janela in janelas]
+
+    os.makedirs(os.path.dirname(saida) or '.', exist_ok=True)
+    inicio = time.perf_counter()
+    simulacoes = 0
+    chaves_execucao = set()
+    with open(saida, 'a') as arquivo:
+        def gravar(resultado):
+            registros, chaves = resultado
+            for registro in registros:
+                arquivo.write(json.dumps(registro) + '\n')
+            arquivo.flush()
+            chaves_execucao.update(chaves)
+            return len(registros)
+
+        if processos == 1:
+            _iniciar(configuracao, feitos)
+            for tarefa in tarefas:
+                simulacoes += gravar(_simular_tarefa(tarefa))
+        else:
+            with ProcessPoolExecutor(processos, initializer=_iniciar, initargs=(configuracao, feitos)) as pool:
+                futuros = [pool.submit(_simular_tarefa, tarefa) for tarefa in tarefas]
+                for futuro in as_completed(futuros):
+                    simulacoes += gravar(futuro.result())
+
+    duracao = time.perf_counter() - inicio
+    print(f"{simulacoes} simulações em {duracao:.1f}s ({simulacoes / max(duracao, 1e-9):.1f} simulações/s), "
+          f"{len(chaves_execucao) - simulacoes} reaproveitadas de {saida}")
+
+    # Só os registros desta otimização; uma simulação refeita (após erro) fica com o registro mais recente
+    df_registros = ler_resultados(saida)
+    if len(df_registros) == 0:
+        return df_registros
+    df_registros = df_registros[df_registros['chave'].isin(chaves_execucao)].drop_duplicates('chave', keep='last')
+    return resumir(df_registros)
@@ -0,0 +1,118 @@
+import heapq
+import itertools
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import instrumentacao
+
+# Destinos para os DataFrames de sinais das simulações.
+# Todos têm gravar(nome, df, metricas=None) e finalizar(); os geradores de sinais só gravam quando recebem um.
+
+
+class SemSaida:
+    """Não grava nada. Equivale a não passar saida para os geradores de sinais."""
+
+    def gravar(self, nome, df, metricas=None):
+        pass
+
+    def finalizar(self):
+        pass
+
+
+class SaidaColunar:
+    """
+    Grava cada resultado num .npz em 'diretorio' (um array por coluna, sem pickle).
+    Muito mais rápido que Excel; leia de volta com ler_colunar.
+    """
+
+    def __init__(self, diretorio='resultados/colunar', comprimir=False):
+        self.diretorio = diretorio
+        self.comprimir = comprimir
+
+    def gravar(self, nome, df, metricas=None):
+        os.makedirs(self.diretorio, exist_ok=True)
+        arrays = {'__indice__': _array_gravavel(df.index.to_numpy()),
+                  '__colunas__': np.array([str(c) for c in df.columns]),
+                  '__metricas__': np.array(json.dumps(metricas or {}, default=float))}
+        for i, coluna in enumerate(df.columns):
+            arrays[f'c{i}'] = _array_gravavel(df[coluna].to_numpy())
+        salvar = np.savez_compressed if self.comprimir else np.savez
+        salvar(os.path.join(self.diretorio, f'{nome}.npz'), **arrays)
+
+    def finalizar(self):
+        pass
+
+
+def _array_gravavel(valores):
+    # Colunas de texto (ex: 'sinal') viram arrays unicode, que o .npz guarda sem pickle
+    if valores.dtype == object:
+        return np.array([str(v) for v in valores])
+    return valores
+
+
+def ler_colunar(caminho):
+    """Lê um .npz de SaidaColunar. Retorna (df, metricas)."""
+    with np.load(caminho) as dados:
+        colunas = dados['__colunas__'].tolist()
+        df = pd.DataFrame({coluna: dados[f'c{i}'] for i, coluna in enumerate(colunas)}, index=dados['__indice__'])
+        metricas = json.loads(dados['__metricas__'].item())
+    return df, metricas
+
+
+class MelhoresN:
+    """
+    Guarda só os N melhores resultados de uma otimização pela métrica escolhida (ex: retorno_pct),
+    descartando os demais na hora. No fim, finalizar() repassa os melhores para 'destino'
+    (ex: SaidaColunar) e exportar_excel() gera o relatório.
+    """
+
+    def __init__(self, n=10, metrica='retorno_pct', destino=None):
+        self.n = n
+        self.metrica = metrica
+        self.destino = destino
+        self._heap = []
+        self._contador = itertools.count()
+
+    def gravar(self, nome, df, metricas=None):
+        if metricas is None or self.metrica not in metricas:
+            raise ValueError(f"MelhoresN precisa da métrica '{self.metrica}' de cada resultado")
+        valor = metricas[self.metrica]
+        if valor is None or np.isnan(valor):
+            valor = -np.inf
+        # O contador desempata sem comparar DataFrames
+        item = (valor, next(self._contador), nome, df, metricas)
+        if len(self._heap) < self.n:
+            heapq.heappush(self._heap, item)
+        elif valor > self._heap[0][0]:
+            heapq.heapreplace(self._heap, item)
+
+    @property
+    def resultados(self):
+        """Lista de (nome, df, metricas) do melhor para o pior."""
+        return [(nome, df, metricas) for _, _, nome, df, metricas in sorted(self._heap, reverse=True)]
+
+    def resumo(self):
+        return pd.DataFrame([{'nome': nome, **metricas} for nome, _, metricas in self.resultados])
+
+    def finalizar(self):
+        if self.destino is not None:
+            for nome, df, metricas in self.resultados:
+                self.destino.gravar(nome, df, metricas)
+            self.destino.finalizar()
+
+    def exportar_excel(self, caminho):
+        """Uma aba com o resumo e uma aba por resultado."""
+        with instrumentacao.etapa('excel', sum(len(df) for _, df, _ in self.resultados)), pd.ExcelWriter(caminho) as escritor:
+            self.resumo().to_excel(escritor, sheet_name='resumo', index=False)
+            for posicao, (nome, df, _) in enumerate(self.resultados, start=1):
+                df.to_excel(escritor, sheet_name=f'{posicao}_{nome}'[:31], index=False)
+
+
+def exportar_excel(df, caminho='resultados/estrategia.xlsx'):
+    """Relatório em Excel de uma simulação (o arquivo que os geradores de sinais gravavam a cada chamada)."""
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    with instrumentacao.etapa('excel', len(df)):
+        df.to_excel(caminho, index=False)
@@ -0,0 +1,232 @@
+import csv
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.stattools import coint, adfuller
+
+import armazenamento
+
+# Colunas da tabela de resultados (as cinco primeiras são as mesmas do pares_cointegrados.csv dos notebooks)
+COLUNAS_RESULTADO = ['Ativo1', 'Ativo2', 'P-valor', 'Cointegrado?', 'N_observacoes',
+                     'ADF_pvalor1', 'ADF_pvalor2', 'Estatistica', 'Beta', 'Alfa', 'Erro']
+# Valor de Erro dos pares com menos de min_observacoes barras em comum. Não é falha: com os mesmos parâmetros
+# o resultado seria o mesmo, então o par conta como feito ao retomar um checkpoint.
+POUCAS_OBSERVACOES = 'poucas observacoes'
+
+# Configuração da varredura em cada processo (definida por _iniciar)
+_configuracao = {}
+# ADF por (moeda, assinatura das barras usadas), reaproveitado por todos os pares daquela moeda
+_adf_por_moeda = {}
+
+
+def _assinatura_barras(indice):
+    return hashlib.blake2b(indice.asi8.tobytes(), digest_size=16).hexdigest()
+
+
+def _iniciar(configuracao, adf_por_moeda):
+    _configuracao.clear()
+    _configuracao.update(configuracao)
+    _adf_por_moeda.clear()
+    _adf_por_moeda.update(adf_por_moeda)
+
+
+def _simbolo(moeda):
+    return f'{moeda}USDT'
+
+
+def _adf_moeda(moeda):
+    """ADF da série de fechamentos de uma moeda no intervalo da varredura (sem alinhar com outra moeda)."""
+    c = _configuracao
+    candles = armazenamento.abrir_candles(_simbolo(moeda), c['intervalo'], c['diretorio'], converter=False)
+    serie = candles.serie('close', c['data_inicial'], c['data_final']).dropna()
+    if len(serie) < c['min_observacoes']:
+        return moeda, None
+    return moeda, (_assinatura_barras(serie.index), adfuller(serie)[1])
+
+
+def _pvalor_adf(moeda, serie):
+    """
+    p-valor ADF da série alinhada do par. Se o par usa exatamente as mesmas barras da moeda sozinha
+    (caso comum), reaproveita o resultado já calculado.
+    """
+    chave = (moeda, _assinatura_barras(serie.index))
+    if chave not in _adf_por_moeda:
+        _adf_por_moeda[chave] = adfuller(serie)[1]
+    return _adf_por_moeda[chave]
+
+
+def _testar_par(par):
+    """Mesmo critério de testar_cointegracao: ADF nas duas séries e Engle-Granger se nenhuma for estacionária."""
+    moeda1, moeda2 = par
+    c = _configuracao
+    linha = dict.fromkeys(COLUNAS_RESULTADO, np.nan)
+    linha.update({'Ativo1': moeda1, 'Ativo2': moeda2, 'Cointegrado?': False, 'Erro': ''})
+    try:
+        df = armazenamento.carregar_par(_simbolo(moeda1), _simbolo(moeda2), c['intervalo'],
+                                        c['data_inicial'], c['data_final'], diretorio=c['diretorio'])
+        linha['N_observacoes'] = len(df)
+        if len(df) < c['min_observacoes']:  # ignora séries muito curtas
+            linha['Erro'] = POUCAS_OBSERVACOES
+            return linha
+
+        serie1 = df['Ativo1']
+        serie2 = df['Ativo2']
+        linha['ADF_pvalor1'] = _pvalor_adf(moeda1, serie1)
+        linha['ADF_pvalor2'] = _pvalor_adf(moeda2, serie2)
+
+        # Hedge ratio da regressão serie1 = alfa + beta * serie2 (a mesma usada pelo coint)
+        beta, alfa = np.polyfit(serie2.to_numpy(), serie1.to_numpy(), 1)
+        linha['Beta'] = beta
+        linha['Alfa'] = alfa
+
+        # Se alguma série for estacionária, não faz sentido testar cointegração
+        if linha['ADF_pvalor1'] <= c['signif'] or linha['ADF_pvalor2'] <= c['signif']:
+            return linha
+
+        estatistica, pvalor, _ = coint(serie1, serie2)
+        linha['Estatistica'] = estatistica
+        linha['P-valor'] = round(pvalor, 5)
+        linha['Cointegrado?'] = bool(pvalor < c['signif'])
+    except Exception as e:
+        linha['Erro'] = f'{type(e).__name__}: {e}'
+    return linha
+
+
+def _abrir_checkpoint(checkpoint, parametros):
+    """
+    Lê os pares já testados de um checkpoint anterior, conferindo se ele é da mesma varredura.
+    Pares que terminaram com erro (exceção) são testados de novo; os com poucas observações, não.
+    """
+    caminho_meta = f'{checkpoint}.json'
+    # Datas podem vir como Timestamp/datetime: viram texto (str) antes de comparar e de gravar
+    texto = json.dumps(parametros, default=str)
+    if os.path.exists(caminho_meta):
+        with open(caminho_meta) as f:
+            try:
+                anteriores = json.load(f)
+            except json.JSONDecodeError:
+                raise ValueError(f"metadados do checkpoint {checkpoint} ilegíveis ({caminho_meta}); "
+                                 "apague o checkpoint e rode de novo") from None
+        if anteriores != json.loads(texto):
+            raise ValueError(f"checkpoint {checkpoint} é de outra varredura; use outro arquivo ou apague o atual")
+    else:
+        # Arquivo temporário + rename: uma interrupção não deixa metadados pela metade
+        temporario = f'{caminho_meta}.tmp{os.getpid()}'
+        with open(temporario, 'w') as f:
+            f.write(texto)
+        os.replace(temporario, caminho_meta)
+
+    if not os.path.exists(checkpoint) or os.path.getsize(checkpoint) == 0:
+        return []
+    anteriores = pd.read_csv(checkpoint)
+    anteriores['Erro'] = anteriores['Erro'].fillna('')
+    return anteriores.to_dict('records')
+
+
+def caminho_checkpoint(moedas, intervalo='1d', data_inicial=None, data_final=None, signif=0.05, min_observacoes=30,
+                       diretorio=armazenamento.DIRETORIO_DADOS, pasta='resultados'):
+    """
+    Checkpoint próprio de uma varredura, para usar em varrer_pares com os mesmos argumentos: o nome leva o
+    intervalo, as datas e um hash das moedas e dos demais parâmetros. Mudar qualquer um deles começa outro
+    checkpoint em vez de esbarrar no de outra varredura (ValueError).
+    """
+    parametros = {'intervalo': intervalo, 'data_inicial': data_inicial, 'data_final': data_final, 'signif': signif,
+                  'min_observacoes': min_observacoes, 'diretorio': diretorio, 'moedas': list(moedas)}
+    assinatura = hashlib.blake2b(json.dumps(parametros, default=str, sort_keys=True).encode(), digest_size=4).hexdigest()
+    datas = '_'.join(pd.Timestamp(data).strftime('%Y%m%d') if data is not None else 'todas'
+                     for data in (data_inicial, data_final))
+    return os.path.join(pasta, f'pares_cointegrados_{intervalo}_{datas}_{assinatura}.checkpoint.csv')
+
+
+def varrer_pares(moedas, intervalo='1d', data_inicial=None, data_final=None, signif=0.05, min_observacoes=30,
+                 processos=None, checkpoint=None, diretorio=armazenamento.DIRETORIO_DADOS):
+    """
+    Testa cointegração em todos os pares de 'moedas' em paralelo.
+
+    Os preços são lidos do armazenamento colunar (armazenamento.py) por memory-map, então os processos
+    compartilham as mesmas páginas em memória em vez de receber cópias dos dados. O ADF de cada moeda
+    é calculado uma vez e reaproveitado em todos os pares em que ela aparece.
+
+    Parâmetros:
+    - moedas: lista de moedas (ex: ['BTC', 'ETH']), sem o sufixo USDT
+    - intervalo: intervalo dos candles ('5m', '1h', '1d')
+    - data_inicial, data_final: intervalo de datas com a mesma semântica de .loc
+    - signif: nível de significância dos testes ADF e Engle-Granger
+    - min_observacoes: pares com menos barras em comum são ignorados
+    - processos: número de processos (None usa todos os núcleos; 1 roda no processo atual)
+    - checkpoint: CSV onde cada par é anotado assim que termina; se já existir, a varredura continua dele
+      (caminho_checkpoint dá um nome por varredura)
+
+    Retorna:
+    DataFrame com COLUNAS_RESULTADO ordenado por P-valor. Pares com alguma série estacionária ficam
+    com P-valor NaN; a coluna Erro explica pares que não puderam ser testados.
+    """
+    configuracao = {'intervalo': intervalo, 'data_inicial': data_inicial, 'data_final': data_final,
+                    'signif': signif, 'min_observacoes': min_observacoes, 'diretorio': diretorio}
+
+    # Converte os CSVs antes de abrir o pool, para os processos só lerem os arquivos prontos
+    disponiveis = []
+    for moeda in moedas:
+        try:
+            armazenamento.abrir_candles(_simbolo(moeda), intervalo, diretorio)
+            disponiveis.append(moeda)
+        except FileNotFoundError:
+            print(f'Sem dados para {moeda} ({intervalo})')
+
+    pares = list(itertools.combinations(disponiveis, 2))
+    resultados = []
+    if checkpoint is not None:
+        resultados = _abrir_checkpoint(checkpoint, {**configuracao, 'moedas': list(moedas)})
+        feitos = {(r['Ativo1'], r['Ativo2']) for r in resultados if r['Erro'] in ('', POUCAS_OBSERVACOES)}
+        pares = [par for par in pares if par not in feitos]
+
+    arquivo = escritor = None
+    if checkpoint is not None:
+        novo = not os.path.exists(checkpoint) or os.path.getsize(checkpoint) == 0
+        arquivo = open(checkpoint, 'a', newline='')
+        escritor = csv.DictWriter(arquivo, fieldnames=COLUNAS_RESULTADO)
+        if novo:
+            escritor.writeheader()
+
+    try:
+        if not pares:
+            pass
+        elif processos == 1:
+            # As mesmas duas etapas do pool, no processo atual: _adf_moeda lê a configuração, que é definida
+            # antes; os ADFs das moedas entram no cache depois
+            _iniciar(configuracao, {})
+            _adf_por_moeda.update(_indexar_adf(map(_adf_moeda, disponiveis)))
+            _consumir(map(_testar_par, pares), resultados, arquivo, escritor)
+        else:
+            # 1ª etapa: ADF de cada moeda; 2ª etapa: pares, já com os ADFs disponíveis em todos os processos
+            with ProcessPoolExecutor(processos, initializer=_iniciar, initargs=(configuracao, {})) as pool:
+                adf_por_moeda = _indexar_adf(pool.map(_adf_moeda, disponiveis))
+            with ProcessPoolExecutor(processos, initializer=_iniciar, initargs=(configuracao, adf_por_moeda)) as pool:
+                # Blocos de pares por tarefa diluem o custo de comunicação entre processos
+                tamanho_bloco = max(1, min(64, len(pares) // (4 * (processos or os.cpu_count()))))
+                _consumir(pool.map(_testar_par, pares, chunksize=tamanho_bloco), resultados, arquivo, escritor)
+    finally:
+        if arquivo is not None:
+            arquivo.close()
+
+    df_resultados = pd.DataFrame(resultados, columns=COLUNAS_RESULTADO)
+    # Um par testado de novo (após erro) fica só com o resultado mais recente
+    df_resultados = df_resultados.drop_duplicates(['Ativo1', 'Ativo2'], keep='last')
+    return df_resultados.sort_values('P-valor').reset_index(drop=True)
+
+
+def _indexar_adf(resultados_adf):
+    return {(moeda, r[0]): r[1] for moeda, r in resultados_adf if r is not None}
+
+
+def _consumir(linhas, resultados, arquivo, escritor):
+    for linha in linhas:
+        resultados.append(linha)
+        if escritor is not None:
+            escritor.writerow(linha)
+            arquivo.flush()
@@ -0,0 +1,283 @@
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from features import create_features
+
+# Compara o create_features vetorizado (features.py) com a versão original do main_dl.ipynb,
+# mantida aqui sem alterações como referência.
+
+
+def create_features_original(df_input):
+    df_temp = df_input.copy()
+    epsilon = 1e-10
+
+    # Retorno e Volatilidade
+    df_temp['return'] = df_temp['close'].pct_change()
+    df_temp['return_skew_30'] = df_temp['return'].rolling(window=30).skew()
+    df_temp['return_kurt_30'] = df_temp['return'].rolling(window=30).kurt()
+    df_temp['volatility_10'] = df_temp['return'].rolling(window=10).std()
+    df_temp['volatility_30'] = df_temp['return'].rolling(window=30).std()
+    df_temp['volatility_200'] = df_temp['return'].rolling(window=200).std()
+    df_temp['realized_vol_10'] = ((np.log(df_temp['high']) - np.log(df_temp['low']))**2 / 2 - \
+                                (2 * np.log(2) - 1) * (np.log(df_temp['close']) - np.log(df_temp['open']))**2)\
+                                .rolling(window=10).mean().apply(np.sqrt)
+    df_temp['realized_vol_30'] = ((np.log(df_temp['high']) - np.log(df_temp['low']))**2 / 2 - \
+                                (2 * np.log(2) - 1) * (np.log(df_temp['close']) - np.log(df_temp['open']))**2)\
+                                .rolling(window=30).mean().apply(np.sqrt)
+    df_temp['realized_vol_200'] = ((np.log(df_temp['high']) - np.log(df_temp['low']))**2 / 2 - \
+                                (2 * np.log(2) - 1) * (np.log(df_temp['close']) - np.log(df_temp['open']))**2)\
+                                .rolling(window=200).mean().apply(np.sqrt)
+
+    # Volume
+    def chaikin_money_flow(df, period=20):
+        mfv = ((df['close'] - df['low']) - (df['high'] - df['close'])) / (df['high'] - df['low'] + epsilon) * df['volume']
+        cmf = mfv.rolling(window=period).sum() / df['volume'].rolling(window=period).sum()
+        return cmf
+    df_temp['cmf_10'] = chaikin_money_flow(df_temp, period=10)
+    df_temp['cmf_30'] = chaikin_money_flow(df_temp, period=30)
+    df_temp['cmf_200'] = chaikin_money_flow(df_temp, period=200)
+
+    df_temp['volume_10_normalizado'] = df_temp['volume'] / (df_temp['volume'].rolling(window=10).mean() + epsilon)
+    df_temp['volume_30_normalizado'] = df_temp['volume'] / (df_temp['volume'].rolling(window=30).mean() + epsilon)
+    df_temp['volume_200_normalizado'] = df_temp['volume'] / (df_temp['volume'].rolling(window=200).mean() + epsilon)
+
+    # Osciladores
+    def williams_r(high, low, close, period=14):
+        highest_high = high.rolling(window=period).max()
+        lowest_low = low.rolling(window=period).min()
+        return ((highest_high - close) / (highest_high - lowest_low + epsilon)) * -100
+    df_temp['williams_r_10'] = williams_r(df_temp['high'], df_temp['low'], df_temp['close'], period=10)
+    df_temp['williams_r_10_slope'] = df_temp['williams_r_10'].diff().rolling(window=5).mean()
+    df_temp['williams_r_30'] = williams_r(df_temp['high'], df_temp['low'], df_temp['close'], period=30)
+    df_temp['williams_r_30_slope'] = df_temp['williams_r_30'].diff().rolling(window=5).mean()
+    df_temp['williams_r_200'] = williams_r(df_temp['high'], df_temp['low'], df_temp['close'], period=200)
+    df_temp['williams_r_200_slope'] = df_temp['williams_r_200'].diff().rolling(window=5).mean()
+
+    # MACD
+    ema_12 = df_temp['close'].ewm(span=12, adjust=False).mean()
+    ema_26 = df_temp['close'].ewm(span=26, adjust=False).mean()
+    df_temp['macd'] = ema_12 - ema_26
+    df_temp['macd_normalizado'] = df_temp['macd'] / df_temp['close']
+    df_temp['macd_signal'] = df_temp['macd'].ewm(span=9, adjust=False).mean()
+    df_temp['macd_hist'] = df_temp['macd'] - df_temp['macd_signal']
+    df_temp['macd_slope'] = df_temp['macd'].diff().rolling(window=5).mean()
+
+    # Bandas de Bollinger
+    rolling_mean_20 = df_temp['close'].rolling(window=20).mean()
+    rolling_std_20 = df_temp['close'].rolling(window=20).std()
+    df_temp['bb_upper'] = rolling_mean_20 + (rolling_std_20 * 2)
+    df_temp['bb_lower'] = rolling_mean_20 - (rolling_std_20 * 2)
+    df_temp['bb_width'] = df_temp['bb_upper'] - df_temp['bb_lower']
+    df_temp['bb_pos'] = (df_temp['close'] - df_temp['bb_lower']) / (df_temp['bb_width'] + epsilon)
+    df_temp['bb_width_normalizada'] = (df_temp['bb_upper'] - df_temp['bb_lower']) / df_temp['close']
+
+    # Volume
+    price_direction = np.sign(df_temp['close'].diff()).fillna(0)
+    df_temp['obv'] = (price_direction * df_temp['volume']).cumsum()
+    df_temp['obv_slope'] = df_temp['obv'].diff().rolling(window=5).mean()
+    df_temp['vol_osc'] = df_temp['volume'].rolling(5).mean() / (df_temp['volume'].rolling(20).mean() + epsilon)
+    def calculate_ad(df):
+        mfm = ((df['close'] - df['low']) - (df['high'] - df['close'])) / (df['high'] - df['low'])
+        mfm = mfm.fillna(0)
+        mfv = mfm * df['volume']
+        ad_line = mfv.cumsum()
+        return ad_line
+    df_temp['ad'] = calculate_ad(df_temp[['close', 'high', 'low', 'volume']])
+
+    # Volatilidade (ATR)
+    def atr(df_atr, window=14):
+        tr_high_low = df_atr['high'] - df_atr['low']
+        tr_high_prev_close = abs(df_atr['high'] - df_atr['close'].shift())
+        tr_low_prev_close = abs(df_atr['low'] - df_atr['close'].shift())
+        tr = pd.DataFrame({'hl': tr_high_low, 'hpc': tr_high_prev_close, 'lpc': tr_low_prev_close}).max(axis=1)
+        return tr.rolling(window=window).mean()
+    df_temp['atr_10'] = atr(df_temp, window=10)
+    df_temp['atr_10_normalizado'] = df_temp['atr_10'] / df_temp['close']
+    df_temp['atr_10_slope'] = df_temp['atr_10'].diff().rolling(window=5).mean()
+    df_temp['atr_30'] = atr(df_temp, window=20)
+    df_temp['atr_30_normalizado'] = df_temp['atr_30'] / df_temp['close']
+    df_temp['atr_30_slope'] = df_temp['atr_30'].diff().rolling(window=5).mean()
+    df_temp['atr_200'] = atr(df_temp, window=200)
+    df_temp['atr_200_normalizado'] = df_temp['atr_200'] / df_temp['close']
+    df_temp['atr_200_slope'] = df_temp['atr_200'].diff().rolling(window=5).mean()
+
+    # ADX (Força da Tendência)
+    def adx(df_adx, period=14):
+        high = df_adx['high']
+        low = df_adx['low']
+        close = df_adx['close']
+
+        up = high.diff()
+        down = -low.diff()
+
+        plus_dm = np.where((up > down) & (up > 0), up, 0)
+        minus_dm = np.where((down > up) & (down > 0), down, 0)
+
+        tr1 = high - low
+        tr2 = abs(high - close.shift(1))
+        tr3 = abs(low - close.shift(1))
+        tr = pd.DataFrame({'tr1': tr1, 'tr2': tr2, 'tr3': tr3}).max(axis=1)
+
+        atr_val = tr.ewm(alpha=1/period, min_periods=period, adjust=False).mean()
+        plus_di = 100 * (pd.Series(plus_dm, index=df_adx.index).ewm(alpha=1/period, min_periods=period, adjust=False).mean() / (atr_val + epsilon))
+        minus_di = 100 * (pd.Series(minus_dm, index=df_adx.index).ewm(alpha=1/period, min_periods=period, adjust=False).mean() / (atr_val + epsilon))
+
+        dx = 100 * (abs(plus_di - minus_di) / (plus_di + minus_di + epsilon))
+        adx_val = dx.ewm(alpha=1/period, min_periods=period, adjust=False).mean()
+        return adx_val, plus_di, minus_di
+    df_temp['adx_10'], df_temp['pdi_10'], df_temp['ndi_10'] = adx(df_temp, period=10)
+    df_temp['adx_30'], df_temp['pdi_30'], df_temp['ndi_30'] = adx(df_temp, period=30)
+    df_temp['adx_10_slope'] = df_temp['adx_10'].diff().rolling(window=5).mean()
+    df_temp['pdi_10_slope'] = df_temp['pdi_10'].diff().rolling(window=5).mean()
+    df_temp['ndi_10_slope'] = df_temp['ndi_10'].diff().rolling(window=5).mean()
+    df_temp['adx_30_slope'] = df_temp['adx_30'].diff().rolling(window=5).mean()
+    df_temp['pdi_30_slope'] = df_temp['pdi_30'].diff().rolling(window=5).mean()
+    df_temp['ndi_30_slope'] = df_temp['ndi_30'].diff().rolling(window=5).mean()
+
+    # RSI (Índice de Força Relativa)
+    def rsi(close, period=14):
+        delta = close.diff()
+        gain = delta.clip(lower=0).ewm(alpha=1/period, min_periods=period, adjust=False).mean()
+        loss = -delta.clip(upper=0).ewm(alpha=1/period, min_periods=period, adjust=False).mean()
+        rs = gain / (loss + epsilon)
+        return 100 - (100 / (1 + rs))
+    df_temp['rsi_10'] = rsi(df_temp['close'], period=10)
+    df_temp['rsi_10_slope'] = df_temp['rsi_10'].diff().rolling(window=5).mean()
+    df_temp['rsi_30'] = rsi(df_temp['close'], period=30)
+    df_temp['rsi_30_slope'] = df_temp['rsi_30'].diff().rolling(window=5).mean()
+
+    # Momentum
+    def mom(close, period=10):
+        return close.diff(period)
+    df_temp['mom_10'] = mom(df_temp['close'], period=10)
+    df_temp['mom_10_slope'] = df_temp['mom_10'].diff().rolling(window=5).mean()
+    df_temp['mom_10_normalizado'] = df_temp['mom_10'] / df_temp['close']
+    df_temp['mom_30'] = mom(df_temp['close'], period=30)
+    df_temp['mom_30_slope'] = df_temp['mom_30'].diff().rolling(window=5).mean()
+    df_temp['mom_30_normalizado'] = df_temp['mom_30'] / df_temp['close']
+    df_temp['mom_200'] = mom(df_temp['close'], period=200)
+    df_temp['mom_200_slope'] = df_temp['mom_200'].diff().rolling(window=5).mean()
+    df_temp['mom_200_normalizado'] = df_temp['mom_200'] / df_temp['close']
+
+    # Estocástico
+    def stochastic_oscillator(high, low, close, period=14):
+        lowest_low = low.rolling(window=period).min()
+        highest_high = high.rolling(window=period).max()
+        k = 100 * ((close - lowest_low) / (highest_high - lowest_low + epsilon))
+        d = k.rolling(window=3).mean()
+        return k, d
+    df_temp['stoch_10'], df_temp['stoch_d_10'] = stochastic_oscillator(df_temp['high'], df_temp['low'], df_temp['close'], period=10)
+    df_temp['stoch_10_slope'] = df_temp['stoch_10'].diff().rolling(window=5).mean()
+    df_temp['stoch_d_10_slope'] = df_temp['stoch_d_10'].diff().rolling(window=5).mean()
+    df_temp['stoch_30'], df_temp['stoch_d_30'] = stochastic_oscillator(df_temp['high'], df_temp['low'], df_temp['close'], period=30)
+    df_temp['stoch_30_slope'] = df_temp['stoch_30'].diff().rolling(window=5).mean()
+    df_temp['stoch_d_30_slope'] = df_temp['stoch_d_30'].diff().rolling(window=5).mean()
+    df_temp['stoch_200'], df_temp['stoch_d_200'] = stochastic_oscillator(df_temp['high'], df_temp['low'], df_temp['close'], period=200)
+    df_temp['stoch_200_slope'] = df_temp['stoch_200'].diff().rolling(window=5).mean()
+    df_temp['stoch_d_200_slope'] = df_temp['stoch_d_200'].diff().rolling(window=5).mean()
+
+    # Parabolic SAR
+    def parabolic_sar(high, low, close, acceleration=0.02, maximum=0.2):
+        length = len(close)
+        if length < 2:
+            return pd.Series([None] * length, index=close.index)
+        sar = [None] * length
+        is_long = close.iloc[1] > close.iloc[0]
+        sar[1] = low.iloc[0] if is_long else high.iloc[0]
+        ep = high.iloc[1] if is_long else low.iloc[1]
+        af = acceleration
+
+        for i in range(2, length):
+            prev_sar = sar[i-1]
+            if is_long:
+                new_sar = prev_sar + af * (ep - prev_sar)
+                if new_sar > low.iloc[i] or new_sar > low.iloc[i-1]:
+                    is_long = False
+                    af = acceleration
+                    new_sar = ep
+                    ep = low.iloc[i]
+                else:
+                    if high.iloc[i] > ep:
+                        ep = high.iloc[i]
+                        af = min(af + acceleration, maximum)
+            else:
+                new_sar = prev_sar + af * (ep - prev_sar)
+                if new_sar < high.iloc[i] or new_sar < high.iloc[i-1]:
+                    is_long = True
+                    af = acceleration
+                    new_sar = ep
+                    ep = high.iloc[i]
+                else:
+                    if low.iloc[i] < ep:
+                        ep = low.iloc[i]
+                        af = min(af + acceleration, maximum)
+            sar[i] = new_sar
+
+        return pd.Series(sar, index=close.index)
+    df_temp['sar'] = parabolic_sar(df_temp['high'], df_temp['low'], df_temp['close'])
+    df_temp['sar_slope'] = df_temp['sar'].diff().rolling(window=5).mean()
+    df_temp['sar_normalizado'] = df_temp['sar'] / df_temp['close']
+
+    # EMA (Média Móvel Exponencial)
+    df_temp['ema_10'] = df_temp['close'].ewm(span=10, adjust=False).mean()
+    df_temp['ema_50'] = df_temp['close'].ewm(span=50, adjust=False).mean()
+    df_temp['ema_200'] = df_temp['close'].ewm(span=200, adjust=False).mean()
+    df_temp['ema_10_slope'] = df_temp['ema_10'].diff().rolling(window=5).mean()
+    df_temp['ema_50_slope'] = df_temp['ema_50'].diff().rolling(window=5).mean()
+    df_temp['ema_200_slope'] = df_temp['ema_200'].diff().rolling(window=5).mean()
+    df_temp['ema_10_normalizada'] = df_temp['ema_10'] / df_temp['close']
+    df_temp['ema_50_normalizada'] = df_temp['ema_50'] / df_temp['close']
+    df_temp['ema_200_normalizada'] = df_temp['ema_200'] / df_temp['close']
+
+    # Retorno Cumulativo
+    df_temp['cum_return_10'] = df_temp['close'].rolling(10).apply(lambda x: (x.iloc[-1] / x.iloc[0]) - 1)
+    df_temp['cum_return_30'] = df_temp['close'].rolling(30).apply(lambda x: (x.iloc[-1] / x.iloc[0]) - 1)
+    df_temp['cum_return_200'] = df_temp['close'].rolling(200).apply(lambda x: (x.iloc[-1] / x.iloc[0]) - 1)
+
+    # Lag Features
+    lag_cols = df_temp.columns.tolist()
+    for col in lag_cols:
+        for lag in range(1, 4):
+            df_temp[f'{col}_lag_{lag}'] = df_temp[col].shift(lag)
+
+    df_temp.dropna(inplace=True)
+    return df_temp
+
+
+def compare_features(df_new, df_ref):
+    """Confere colunas, índice e valores; retorna a maior diferença absoluta encontrada."""
+    if df_new.columns.tolist() != df_ref.columns.tolist():
+        raise AssertionError('colunas diferentes da versão original')
+    if not df_new.index.equals(df_ref.index):
+        raise AssertionError('linhas diferentes da versão original')
+    diff = np.abs(df_new.to_numpy(dtype=float) - df_ref.to_numpy(dtype=float))
+    return float(np.nanmax(diff)) if diff.size else 0.0
+
+
+def benchmark(df, repeats=1):
+    """Tempo (s) das duas versões sobre o mesmo DataFrame de candles e a maior diferença entre elas."""
+    times = {}
+    for name, func in (('original', create_features_original), ('vetorizado', create_features)):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            result = func(df)
+        times[name] = (time.perf_counter() - start) / repeats
+        if name == 'original':
+            reference = result
+    return {'linhas': len(df), 'colunas': result.shape[1], 'original_s': times['original'],
+            'vetorizado_s': times['vetorizado'], 'speedup': times['original'] / times['vetorizado'],
+            'max_diff': compare_features(result, reference)}
+
+
+if __name__ == '__main__':
+    # Ex: python benchmark_features.py XTZUSDT 1h
+    symbol = sys.argv[1] if len(sys.argv) > 1 else 'XTZUSDT'
+    period = sys.argv[2] if len(sys.argv) > 2 else '1h'
+    df = pd.read_csv(f'..//..//data//fechamentos//{symbol}_{period}_data.csv',
+                     usecols=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    df.set_index('timestamp', inplace=True)
+    df.index = pd.to_datetime(df.index)
+    print(benchmark(df))
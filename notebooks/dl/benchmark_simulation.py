@@ -0,0 +1,166 @@
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from simulation import simulate_trading, simulate_trading_batch
+
+# Compara o simulate_trading por eventos (simulation.py) com o loop barra a barra original do main_dl.ipynb,
+# mantido aqui sem alterações como referência.
+
+
+def simulate_trading_original(test_df_fold: pd.DataFrame,
+                                initial_balance_fold: float,
+                                fee: float = 0.001,
+                                stop_loss: float = None,
+                                take_profit: float = None,
+                                trailing_stop: float = 0.02,
+                                sma_window: int = 100) -> tuple[list, float]:
+    """
+    Simula uma estratégia de trading usando os conjuntos de previsão do MAPIE.
+    """
+    df_sim = test_df_fold.copy()
+
+    balance = initial_balance_fold
+    position = 0.0
+    entry_price = 0.0
+    trades = []
+
+    # Variável para o trailing stop dinâmico
+    trailing_stop_price = None
+
+    # Calculo da média simples
+    df_sim['sma_long'] = df_sim['close'].rolling(window=sma_window).mean()
+    df_sim['sma_short'] = df_sim['close'].rolling(window=int(sma_window/5)).mean()
+
+    # Simulação de passos no tempo
+    for i in range(1, len(df_sim)):
+        current_price = df_sim['close'].iloc[i]
+        current_time = df_sim.index[i]
+
+        # O sinal de trading é baseado na previsão do candle anterior, já que a previsão é feita no posterior
+        prediction_set_t_minus_1 = df_sim['prediction_set'].iloc[i-1]
+
+        # Verifica se já existe posição antes
+        if position > 0:
+            # 1. Stop-Loss
+            if stop_loss is not None and current_price <= entry_price * (1 - stop_loss):
+                balance = position * current_price * (1 - fee)
+                trades.append(('Stop-Loss', current_time, current_price, balance, f'SL {stop_loss*100:.1f}% hit'))
+                position, entry_price, trailing_stop_price = 0.0, 0.0, None
+                continue
+
+            # 2. Take-Profit
+            if take_profit is not None and current_price >= entry_price * (1 + take_profit):
+                balance = position * current_price * (1 - fee)
+                trades.append(('Take-Profit', current_time, current_price, balance, f'TP {take_profit*100:.1f}% hit'))
+                position, entry_price, trailing_stop_price = 0.0, 0.0, None
+                continue
+
+            # 3. Trailing Stop
+            if trailing_stop is not None:
+                # Compara o maior preço anterior e o atual para definir o novo stop price
+                new_stop_price = current_price * (1 - trailing_stop)
+                if trailing_stop_price is None:
+                    trailing_stop_price = entry_price * (1 - trailing_stop)
+                else:
+                    trailing_stop_price = max(trailing_stop_price, new_stop_price)
+
+                # Verifica se o trailing stop foi atingido
+                if current_price <= trailing_stop_price:
+                    balance = position * current_price * (1 - fee)
+                    trades.append(('Trailing-Stop', current_time, current_price, balance, f'Trailing stop {trailing_stop*100:.1f}% hit'))
+                    position, entry_price, trailing_stop_price = 0.0, 0.0, None
+                    continue
+
+        # Condições de entrada e saída
+        is_uptrend = current_price > df_sim['sma_long'].iloc[i]
+        is_downtrend = current_price < df_sim['sma_short'].iloc[i]
+
+        # Compra quando o modelo está confiante na ALTA ([False, True]), não tem posição e o valor é maior que a média longa
+        if np.array_equal(prediction_set_t_minus_1, [False, True]) and position == 0 and is_uptrend:
+            amount_to_spend = balance * (1 - fee)
+            qty = amount_to_spend / current_price
+            position = qty
+            entry_price = current_price
+            trades.append(('Buy', current_time, current_price, balance, 'Sinal: Compra'))
+
+        # Vende quando o modelo está confiante na BAIXA ([True, False]), não tem posição e o valor é menor que média curta
+        elif np.array_equal(prediction_set_t_minus_1, [True, False]) and position > 0 and is_downtrend:
+            balance = position * current_price * (1 - fee)
+            trades.append(('Sell', current_time, current_price, balance, 'Sinal: Venda'))
+            position, entry_price, trailing_stop_price = 0.0, 0.0, None
+
+        # Anexa em trades a "ordem" hold, para acompanhar a variação da posição aberta
+        elif position > 0:
+            balance = position * current_price * (1 - fee)
+            trades.append(('Hold', current_time, current_price, balance, 'Hold'))
+
+    # Fecha as posições no fim da simulação
+    if position > 0:
+        last_price = df_sim['close'].iloc[-1]
+        balance = position * last_price * (1 - fee)
+        trades.append(('Liquidate_Final_Fold', df_sim.index[-1], last_price, balance, 'Fim do período de teste'))
+        position = 0.0
+
+    return trades, balance
+
+
+def random_prediction_sets(n, seed=0):
+    """Conjuntos de previsão sorteados (as quatro combinações de 2 classes), para testar sem o modelo."""
+    rng = np.random.default_rng(seed)
+    sets = rng.random((n, 2)) < 0.5
+    return list(sets)
+
+
+def compare_trades(trades_new, trades_ref):
+    """Confere se as duas listas de trades são iguais; retorna o número de trades."""
+    if len(trades_new) != len(trades_ref):
+        raise AssertionError(f'{len(trades_new)} trades, a versão original tem {len(trades_ref)}')
+    for k, (new, ref) in enumerate(zip(trades_new, trades_ref)):
+        if tuple(new) != tuple(ref):
+            raise AssertionError(f'trade {k} diferente: {new} != {ref}')
+    return len(trades_ref)
+
+
+def benchmark(test_df, params, initial_balance=1000.0, fee=0.001):
+    """
+    Tempo (s) da versão original (uma chamada por combinação) e da versão por eventos (uma chamada em lote),
+    conferindo que as trades e os saldos são idênticos.
+    """
+    start = time.perf_counter()
+    reference = [simulate_trading_original(test_df, initial_balance, fee, **p) for p in params]
+    original_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = simulate_trading_batch(test_df, initial_balance, params, fee)
+    eventos_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    simulate_trading_batch(test_df, initial_balance, params, fee, with_trades=False)
+    saldos_s = time.perf_counter() - start
+
+    trades = 0
+    for (trades_new, balance_new), (trades_ref, balance_ref) in zip(results, reference):
+        trades += compare_trades(trades_new, trades_ref)
+        if balance_new != balance_ref:
+            raise AssertionError(f'saldo final {balance_new} != {balance_ref}')
+    single = simulate_trading(test_df, initial_balance, fee, **params[0])
+    compare_trades(single[0], reference[0][0])
+
+    return {'linhas': len(test_df), 'combinacoes': len(params), 'trades': trades, 'original_s': original_s,
+            'eventos_s': eventos_s, 'so_saldos_s': saldos_s, 'speedup': original_s / eventos_s}
+
+
+if __name__ == '__main__':
+    # Ex: python benchmark_simulation.py XTZUSDT 1h
+    symbol = sys.argv[1] if len(sys.argv) > 1 else 'XTZUSDT'
+    period = sys.argv[2] if len(sys.argv) > 2 else '1h'
+    df = pd.read_csv(f'..//..//data//fechamentos//{symbol}_{period}_data.csv', usecols=['timestamp', 'close'])
+    df.set_index('timestamp', inplace=True)
+    df.index = pd.to_datetime(df.index)
+    df['prediction_set'] = random_prediction_sets(len(df))
+    params = [{'stop_loss': sl, 'take_profit': tp, 'trailing_stop': ts, 'sma_window': sma}
+              for sl in (None, 0.05, 0.1) for tp in (None, 0.1, 0.2) for ts in (None, 0.1, 0.2) for sma in (100, 200)]
+    print(benchmark(df, params))
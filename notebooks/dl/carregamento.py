@@ -0,0 +1,352 @@
+import io
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# Leitura de históricos longos (5m/1m de vários anos) para os notebooks de tests/ sem carregar o CSV inteiro.
+#
+# Os CSVs de data/fechamentos estão em ordem de tempo, então o trecho pedido (últimas linhas ou intervalo de
+# datas) é localizado por posição no arquivo: as últimas linhas lendo o final de trás para frente, uma data por
+# busca binária sobre os bytes. Só esse trecho é interpretado pelo pandas.
+#
+# Para o histórico inteiro, as features são calculadas bloco a bloco: cada bloco leva na frente as últimas
+# SOBREPOSICAO barras do anterior, para as janelas móveis aquecerem, e as linhas prontas vão para uma matriz
+# em disco. criar_sequencias e LotesDeSequencias (sequencias.py) trabalham sobre o memory-map, então o treino
+# recebe os lotes sem a matriz inteira na memória.
+
+# Maior janela dos indicadores (features.py usa até 200 barras)
+SOBREPOSICAO = 200
+LINHAS_POR_BLOCO = 250_000
+# Bytes lidos por vez ao procurar as últimas linhas
+TAMANHO_LEITURA = 1 << 20
+
+
+def _cabecalho(f):
+    """Nomes das colunas e byte onde começam os dados."""
+    f.seek(0)
+    linha = f.readline()
+    return [nome.strip() for nome in linha.decode().split(',')], len(linha)
+
+
+def _inicio_da_linha(f, posicao, inicio_dados):
+    """Byte onde começa a primeira linha que começa em 'posicao' ou depois."""
+    if posicao <= inicio_dados:
+        return inicio_dados
+    f.seek(posicao - 1)
+    f.readline()
+    return f.tell()
+
+
+def _offset_da_data(f, data, inicio_dados, tamanho):
+    """Byte da primeira linha com timestamp >= data (ou o fim do arquivo), por busca binária."""
+    def depois_da_data(posicao):
+        f.seek(_inicio_da_linha(f, posicao, inicio_dados))
+        linha = f.readline().strip()
+        return not linha or pd.Timestamp(linha.split(b',', 1)[0].decode()) >= data
+
+    baixo, alto = inicio_dados, tamanho
+    while baixo < alto:
+        meio = (baixo + alto) // 2
+        if depois_da_data(meio):
+            alto = meio
+        else:
+            baixo = meio + 1
+    return _inicio_da_linha(f, baixo, inicio_dados)
+
+
+def _offset_ultimas_linhas(f, n, inicio_dados, tamanho):
+    """Byte onde começam as últimas n linhas, lendo o arquivo de trás para frente."""
+    if not n:
+        # Como df.iloc[-0:], zero linhas é o arquivo inteiro
+        return inicio_dados
+    f.seek(max(inicio_dados, tamanho - 1))
+    fim = tamanho - 1 if tamanho > inicio_dados and f.read(1) == b'\n' else tamanho
+    encontradas = 0
+    posicao = fim
+    while posicao > inicio_dados:
+        inicio_bloco = max(inicio_dados, posicao - TAMANHO_LEITURA)
+        f.seek(inicio_bloco)
+        bloco = f.read(posicao - inicio_bloco)
+        quebras = bloco.count(b'\n')
+        if encontradas + quebras >= n:
+            # A n-ésima quebra de linha a partir do fim marca o início das n últimas linhas
+            for _ in range(n - encontradas):
+                posicao = inicio_bloco + bloco.rindex(b'\n', 0, posicao - inicio_bloco)
+            return posicao + 1
+        encontradas += quebras
+        posicao = inicio_bloco
+    return inicio_dados
+
+
+class _Trecho(io.RawIOBase):
+    """Arquivo limitado a [inicio, fim), para o pandas ler só o trecho localizado."""
+
+    def __init__(self, f, inicio, fim):
+        f.seek(inicio)
+        self._f = f
+        self._restante = fim - inicio
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        n = min(len(destino), self._restante)
+        if n <= 0:
+            return 0
+        lidos = self._f.readinto(memoryview(destino)[:n])
+        self._restante -= lidos
+        return lidos
+
+
+def _preparar_bruto(df):
+    # Mesmo tratamento do carregar_dados dos notebooks
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df = df.sort_values('timestamp')
+    df = df.reset_index(drop=True)
+    return df.loc[:, ~df.columns.str.contains('^Unnamed')]
+
+
+def ler_em_blocos(caminho, linhas_por_bloco=LINHAS_POR_BLOCO, ultimas_linhas=None, inicio=None, fim=None):
+    """
+    Candles do CSV em DataFrames de até 'linhas_por_bloco' linhas (None = um bloco só), com timestamp como
+    coluna e índice 0..n-1, lendo só o trecho pedido:
+    - ultimas_linhas: as n últimas linhas do arquivo
+    - inicio, fim: só os candles com inicio <= timestamp < fim (combina com ultimas_linhas)
+    """
+    with open(caminho, 'rb') as f:
+        nomes, inicio_dados = _cabecalho(f)
+        tamanho = os.fstat(f.fileno()).st_size
+        de, ate = inicio_dados, tamanho
+        if fim is not None:
+            ate = _offset_da_data(f, pd.Timestamp(fim), inicio_dados, tamanho)
+        if ultimas_linhas is not None:
+            de = _offset_ultimas_linhas(f, ultimas_linhas, inicio_dados, ate)
+        if inicio is not None:
+            de = max(de, _offset_da_data(f, pd.Timestamp(inicio), inicio_dados, tamanho))
+        if de >= ate:
+            return
+
+        leitor = pd.read_csv(io.BufferedReader(_Trecho(f, de, ate)), header=None, names=nomes,
+                             chunksize=linhas_por_bloco)
+        if linhas_por_bloco is None:
+            leitor = [leitor]
+        for bloco in leitor:
+            yield _preparar_bruto(bloco)
+
+
+def ler_csv(caminho, ultimas_linhas=None, inicio=None, fim=None):
+    """Mesmo resultado de ler o CSV inteiro e recortar, mas interpretando só o trecho pedido (ver ler_em_blocos)."""
+    blocos = list(ler_em_blocos(caminho, None, ultimas_linhas, inicio, fim))
+    if not blocos:
+        with open(caminho, 'rb') as f:
+            nomes, _ = _cabecalho(f)
+        return _preparar_bruto(pd.DataFrame({nome: [] for nome in nomes}))
+    return blocos[0]
+
+
+def alinhar_por_timestamp(referencia, timestamps):
+    """
+    Linhas de 'referencia' (BTC, ETH) com os timestamps dados, NaN onde ela não tem candle, com índice 0..n-1.
+    preparar_features alinha as referências assim, então o resultado não depende de onde cada histórico começa
+    (nem de o cálculo ser em memória ou em blocos).
+    """
+    alinhado = referencia.set_index('timestamp').reindex(pd.DatetimeIndex(timestamps, name='timestamp'))
+    return alinhado.reset_index()
+
+
+def com_indice_timestamp(preparar):
+    """
+    Adapta uma função de features dos notebooks (candles com índice 0..n-1 e coluna timestamp, como
+    preparar_features) ao 'build' de feature_store.cached_features, que recebe e devolve DataFrames indexados
+    por timestamp. As referências (extras) são repassadas no mesmo formato dos candles.
+    """
+    def build(candles, **referencias):
+        features = preparar(candles.reset_index(),
+                            **{argumento: referencia.reset_index() for argumento, referencia in referencias.items()})
+        return features.set_index('timestamp')
+    return build
+
+
+class _Referencia:
+    """Candles de um símbolo de referência (BTC, ETH) lidos em blocos e entregues alinhados a outros timestamps."""
+
+    def __init__(self, caminho, inicio, linhas_por_bloco):
+        self._blocos = ler_em_blocos(caminho, linhas_por_bloco, inicio=inicio)
+        self._buffer = next(self._blocos, None)
+        self._esgotado = self._buffer is None
+        if self._buffer is None:
+            # Nada a partir de 'inicio': só as colunas, para o alinhamento sair todo NaN
+            self._buffer = ler_csv(caminho, inicio=inicio)
+
+    def alinhar(self, timestamps):
+        """Linhas com os timestamps dados (NaN onde a referência não tem candle), com índice 0..n-1."""
+        partes = [self._buffer]
+        while not self._esgotado and (not len(partes[-1]) or partes[-1]['timestamp'].iloc[-1] < timestamps.iloc[-1]):
+            bloco = next(self._blocos, None)
+            if bloco is None:
+                self._esgotado = True
+            else:
+                partes.append(bloco)
+        buffer = pd.concat(partes, ignore_index=True) if len(partes) > 1 else partes[0]
+        # Descarta o que ficou antes do bloco atual (os timestamps só avançam)
+        self._buffer = buffer[buffer['timestamp'] >= timestamps.iloc[0]]
+        return alinhar_por_timestamp(self._buffer, timestamps)
+
+
+def _reancorar(atual, anterior, acumuladas):
+    """Soma em cada coluna acumulada (e nas suas defasagens) a diferença para o valor já emitido na mesma barra."""
+    ancora = anterior['timestamp'].iloc[-1]
+    linha_atual = atual.index[atual['timestamp'] == ancora]
+    if not len(linha_atual):
+        raise ValueError("a última linha do bloco anterior não tem features no bloco atual; aumente a sobreposição")
+    for coluna in atual.columns:
+        if any(coluna == nome or coluna.startswith(f'lag_{nome}_') for nome in acumuladas):
+            atual[coluna] += anterior[coluna].iloc[-1] - atual.at[linha_atual[0], coluna]
+    return atual
+
+
+def features_em_blocos(caminho, preparar, referencias=None, linhas_por_bloco=LINHAS_POR_BLOCO,
+                       sobreposicao=SOBREPOSICAO, ultimas_linhas=None, inicio=None, fim=None, acumuladas=('obv',)):
+    """
+    Features do CSV calculadas bloco a bloco: gera DataFrames com as mesmas colunas de preparar(df, ...) sobre o
+    trecho inteiro, cada um só com linhas novas.
+
+    Parâmetros:
+    - preparar: função de features dos notebooks (ex: preparar_features); recebe os candles com índice 0..n-1
+      e a coluna timestamp, e devolve as features com a coluna timestamp
+    - referencias: {argumento: caminho do CSV} de outros símbolos (ex: {'df_btc': ..., 'df_eth': ...}), lidos em
+      blocos junto com o principal e alinhados pelo timestamp
+    - sobreposicao: barras do bloco anterior que entram na frente de cada bloco (a maior janela dos indicadores)
+    - acumuladas: colunas que são somas desde o início (ex: OBV), reancoradas no valor do bloco anterior
+
+    Janelas móveis de até 'sobreposicao' barras saem iguais ao cálculo sobre o trecho inteiro (a menos de
+    arredondamento); médias exponenciais convergem dentro da sobreposição (diferença relativa da ordem de 1e-6
+    com 200 barras e span 30).
+    """
+    referencias = referencias or {}
+    leitores = None
+    anterior_bruto = None
+    anterior = None
+    for bloco in ler_em_blocos(caminho, linhas_por_bloco, ultimas_linhas, inicio, fim):
+        if anterior_bruto is not None:
+            bloco = pd.concat([anterior_bruto, bloco], ignore_index=True)
+        anterior_bruto = bloco.iloc[-sobreposicao:] if sobreposicao else bloco.iloc[:0]
+        if leitores is None:
+            leitores = {argumento: _Referencia(caminho_ref, bloco['timestamp'].iloc[0], linhas_por_bloco)
+                        for argumento, caminho_ref in referencias.items()}
+
+        alinhadas = {argumento: leitor.alinhar(bloco['timestamp']) for argumento, leitor in leitores.items()}
+        features = preparar(bloco, **alinhadas)
+        if anterior is not None:
+            features = _reancorar(features, anterior, acumuladas)
+            features = features[features['timestamp'] > anterior['timestamp'].iloc[-1]]
+        if len(features):
+            anterior = features.iloc[-1:]
+            yield features.reset_index(drop=True)
+
+
+def conferir_blocos(caminho, preparar, referencias=None, linhas_por_bloco=LINHAS_POR_BLOCO,
+                    sobreposicao=SOBREPOSICAO, ultimas_linhas=None, inicio=None, fim=None, acumuladas=('obv',),
+                    rtol=1e-5):
+    """
+    Confere que features_em_blocos dá a mesma matriz de preparar() sobre o trecho inteiro em memória (use um
+    trecho curto e blocos pequenos, para passar por várias emendas). As referências são lidas a partir do
+    primeiro candle do trecho, como no cálculo em blocos.
+
+    Retorna a maior diferença por coluna, relativa ao maior valor absoluto da coluna (como o rtol de
+    feature_store); ValueError se as linhas, as colunas ou os NaN não baterem, ou se alguma diferença passar de
+    'rtol'.
+    """
+    referencias = referencias or {}
+    df = ler_csv(caminho, ultimas_linhas, inicio, fim)
+    if df.empty:
+        raise ValueError(f"nenhum candle no trecho pedido de {caminho}")
+    alinhadas = {argumento: ler_csv(caminho_ref, inicio=df['timestamp'].iloc[0])
+                 for argumento, caminho_ref in referencias.items()}
+    esperado = preparar(df, **alinhadas).reset_index(drop=True)
+    obtido = pd.concat(features_em_blocos(caminho, preparar, referencias, linhas_por_bloco, sobreposicao,
+                                          ultimas_linhas, inicio, fim, acumuladas), ignore_index=True)
+
+    if obtido.columns.tolist() != esperado.columns.tolist():
+        raise ValueError("as colunas do cálculo em blocos não batem com as do cálculo em memória")
+    if len(obtido) != len(esperado) or not (obtido['timestamp'].to_numpy() == esperado['timestamp'].to_numpy()).all():
+        raise ValueError("as linhas do cálculo em blocos não batem com as do cálculo em memória")
+
+    numericas = esperado.select_dtypes('number').columns
+    antigo = esperado[numericas].to_numpy(dtype=np.float64)
+    novo = obtido[numericas].to_numpy(dtype=np.float64)
+    if not (np.isnan(antigo) == np.isnan(novo)).all():
+        raise ValueError("os NaN do cálculo em blocos não batem com os do cálculo em memória")
+    escala = np.nanmax(np.abs(antigo), axis=0, initial=0.0)
+    diferencas = pd.Series(np.nanmax(np.abs(antigo - novo), axis=0, initial=0.0) / np.where(escala > 0, escala, 1),
+                           index=numericas)
+    if (diferencas > rtol).any():
+        piores = diferencas[diferencas > rtol].sort_values(ascending=False)
+        raise ValueError(f"features em blocos diferentes do cálculo em memória: {piores.head().to_dict()}")
+    return diferencas
+
+
+def _abrir(diretorio, meta):
+    X = np.memmap(os.path.join(diretorio, 'X.bin'), dtype=meta['dtype'], mode='r',
+                  shape=(meta['linhas'], len(meta['colunas'])))
+    y = np.load(os.path.join(diretorio, 'y.npy'))
+    info = pd.DataFrame({coluna: np.load(os.path.join(diretorio, f'info_{i}.npy'))
+                         for i, coluna in enumerate(meta['info'])})
+    return X, y, info
+
+
+def gravar_matriz(blocos, colunas, diretorio, alvo='close', guardar=(), dtype=np.float32):
+    """
+    Grava as features dos blocos (features_em_blocos) numa matriz em disco e a abre por memory-map.
+
+    Parâmetros:
+    - colunas: features do modelo, na ordem da matriz
+    - alvo: coluna do alvo binário (1 se o próximo valor for maior), como em definir_features_e_alvo
+    - guardar: outras colunas mantidas em memória junto com timestamp e alvo (ex: ['rsi_7'] para a condição)
+    - dtype: tipo da matriz (float32 é o que os lotes entregam ao modelo)
+
+    Retorna (X, y, info): X memory-map (linhas, features) somente leitura, y int64 e info com timestamp, alvo e
+    as colunas de 'guardar'. Reabra depois com abrir_matriz(diretorio).
+    """
+    colunas = list(colunas)
+    nomes_info = list(dict.fromkeys(['timestamp', alvo, *guardar]))
+    temporario = f'{diretorio}.tmp{os.getpid()}'
+    shutil.rmtree(temporario, ignore_errors=True)
+    os.makedirs(temporario)
+
+    info = {coluna: [] for coluna in nomes_info}
+    linhas = 0
+    with open(os.path.join(temporario, 'X.bin'), 'wb') as f:
+        for bloco in blocos:
+            np.ascontiguousarray(bloco[colunas].to_numpy(dtype=dtype)).tofile(f)
+            for coluna in nomes_info:
+                info[coluna].append(bloco[coluna].to_numpy())
+            linhas += len(bloco)
+            print(f"Features gravadas: {linhas} linhas")
+
+    info = {coluna: np.concatenate(partes) if partes else np.empty(0) for coluna, partes in info.items()}
+    # Alvo da última linha fica 0, como o shift(-1) de definir_features_e_alvo
+    valores = info[alvo].astype(np.float64)
+    y = (np.append(valores[1:], np.nan) > valores).astype(np.int64)
+    np.save(os.path.join(temporario, 'y.npy'), y)
+    for i, coluna in enumerate(nomes_info):
+        np.save(os.path.join(temporario, f'info_{i}.npy'), info[coluna])
+    meta = {'colunas': colunas, 'info': nomes_info, 'linhas': linhas, 'dtype': np.dtype(dtype).name}
+    with open(os.path.join(temporario, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    antigo = f'{diretorio}.old{os.getpid()}'
+    if os.path.exists(diretorio):
+        os.replace(diretorio, antigo)
+    os.replace(temporario, diretorio)
+    shutil.rmtree(antigo, ignore_errors=True)
+    return _abrir(diretorio, meta)
+
+
+def abrir_matriz(diretorio):
+    """(X, y, info) de uma matriz gravada por gravar_matriz."""
+    with open(os.path.join(diretorio, 'meta.json')) as f:
+        return _abrir(diretorio, json.load(f))
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+# Busca dos limites da condição de filtro (feature > limite_superior ou feature < limite_inferior) usada na
+# avaliação condicional dos notebooks de tests/.
+#
+# Cada feature é ordenada uma vez; as contagens de acertos e erros do modelo acima de cada limite superior e
+# abaixo de cada limite inferior saem de somas acumuladas, então todos os pares de limites são avaliados
+# de uma vez, sem refiltrar os dados nem chamar as métricas do sklearn para cada par.
+
+
+def _contagens(valores, y, preds):
+    """
+    Valores não nulos ordenados e as somas acumuladas de TP, FP, FN e TN na mesma ordem
+    (linha k = contagem das k primeiras amostras).
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    y = np.asarray(y).astype(np.int64)
+    preds = np.asarray(preds).astype(np.int64)
+    validos = ~np.isnan(valores)
+    ordem = np.argsort(valores[validos], kind='stable')
+    ordenados = valores[validos][ordem]
+    y = y[validos][ordem]
+    preds = preds[validos][ordem]
+
+    tipos = np.stack([(y == 1) & (preds == 1), (y == 0) & (preds == 1), (y == 1) & (preds == 0),
+                      (y == 0) & (preds == 0)], axis=1).astype(np.int64)
+    acumulado = np.zeros((len(ordenados) + 1, 4), dtype=np.int64)
+    np.cumsum(tipos, axis=0, out=acumulado[1:])
+    return ordenados, acumulado
+
+
+def avaliar_limites(valores, y, preds, limites_superiores, limites_inferiores):
+    """
+    Métricas do modelo nas amostras com valor > limite superior ou < limite inferior, para todos os pares.
+
+    Retorna um dicionário de arrays (len(limites_superiores), len(limites_inferiores)): num_amostras,
+    acuracia, precisao, recall e f1_score (classe 1, com zero quando indefinidas, como zero_division=0).
+    """
+    ordenados, acumulado = _contagens(valores, y, preds)
+    total = acumulado[-1]
+    sup = np.asarray(limites_superiores, dtype=np.float64)
+    inf = np.asarray(limites_inferiores, dtype=np.float64)
+
+    # Acima do limite superior: total menos as amostras <= sup; abaixo do inferior: as amostras < inf
+    acima = total - acumulado[np.searchsorted(ordenados, sup, side='right')]
+    abaixo = acumulado[np.searchsorted(ordenados, inf, side='left')]
+    contagens = acima[:, None, :] + abaixo[None, :, :]
+
+    # Com inf > sup as duas regiões se sobrepõem e cobrem todas as amostras não nulas
+    sobreposto = inf[None, :] > sup[:, None]
+    contagens[sobreposto] = total
+
+    tp, fp, fn, tn = (contagens[..., k] for k in range(4))
+    num_amostras = tp + fp + fn + tn
+    with np.errstate(divide='ignore', invalid='ignore'):
+        acuracia = np.where(num_amostras > 0, (tp + tn) / num_amostras, 0.0)
+        precisao = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+        f1 = np.where(2 * tp + fp + fn > 0, 2 * tp / (2 * tp + fp + fn), 0.0)
+    return {'num_amostras': num_amostras, 'acuracia': acuracia, 'precisao': precisao, 'recall': recall,
+            'f1_score': f1}
+
+
+def otimizar_limites(df_features, y, preds, params_to_optimize, min_amostras=100):
+    """
+    Todos os pares de limites de todas as features de params_to_optimize ({feature: (range_sup, range_inf)},
+    com ranges [início, fim, passo] do np.arange) que filtram pelo menos min_amostras amostras.
+
+    As features são as últimas len(y) linhas de df_features, alinhadas com y e preds.
+    Retorna um DataFrame com feature, limite_superior, limite_inferior, precisao, f1_score, acuracia, recall e
+    num_amostras, na ordem dos loops (feature, limite superior, limite inferior).
+    """
+    partes = []
+    for feature, (range_sup, range_inf) in params_to_optimize.items():
+        limites_superiores = np.arange(*range_sup)
+        limites_inferiores = np.arange(*range_inf)
+        valores = df_features[feature].iloc[-len(y):].to_numpy()
+        metricas = avaliar_limites(valores, y, preds, limites_superiores, limites_inferiores)
+
+        sup, inf = np.meshgrid(limites_superiores, limites_inferiores, indexing='ij')
+        validos = metricas['num_amostras'] >= min_amostras
+        partes.append(pd.DataFrame({
+            'feature': feature,
+            'limite_superior': np.round(sup[validos], 4),
+            'limite_inferior': np.round(inf[validos], 4),
+            'precisao': metricas['precisao'][validos],
+            'f1_score': metricas['f1_score'][validos],
+            'acuracia': metricas['acuracia'][validos],
+            'recall': metricas['recall'][validos],
+            'num_amostras': metricas['num_amostras'][validos],
+            '_sup': sup[validos],
+            '_inf': inf[validos],
+        }))
+    if not partes:
+        return pd.DataFrame(columns=['feature', 'limite_superior', 'limite_inferior', 'precisao', 'f1_score',
+                                     'acuracia', 'recall', 'num_amostras', '_sup', '_inf'])
+    return pd.concat(partes, ignore_index=True)
+
+
+def melhor_condicao(resultados, metrica='f1_score'):
+    """
+    Melhor linha de otimizar_limites pela métrica ('acuracia', 'precisao' ou 'f1_score'), no formato do
+    dicionário de otimizar_condicao. Empates ficam com a primeira combinação na ordem dos loops; métrica
+    desconhecida vale zero para todas (fica a primeira). Retorna None se não há combinações.
+    """
+    if resultados.empty:
+        return None
+    pontuacoes = resultados[metrica] if metrica in ('acuracia', 'precisao', 'f1_score') else pd.Series(0.0, index=resultados.index)
+    melhor = resultados.loc[pontuacoes.idxmax()]
+    feature, sup, inf = melhor['feature'], melhor['_sup'], melhor['_inf']
+    return {
+        'pontuacao': pontuacoes[melhor.name],
+        'precisao': melhor['precisao'],
+        'f1_score': melhor['f1_score'],
+        'acuracia': melhor['acuracia'],
+        'num_amostras': melhor['num_amostras'],
+        'condicao': f"{feature} > {sup:.2f} ou {feature} < {inf:.2f}",
+        'feature': feature,
+        'limite_superior': sup,
+        'limite_inferior': inf
+    }
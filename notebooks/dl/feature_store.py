@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import carregamento
+
+# Cache em disco de matrizes de features, para não recalcular os indicadores a cada execução dos notebooks.
+#
+# Cada matriz é identificada por (símbolo, intervalo, conjunto de features, versão) e guarda a impressão digital
+# dos CSVs de origem. Os dados ficam em arquivos binários crus (float64, uma coluna contígua por feature, com
+# linhas livres reservadas no fim de cada coluna; índice int64) abertos por memory-map até o número de linhas do
+# meta.json. Quando o CSV só ganhou candles novos no final, só o final do CSV é lido, a cauda é recalculada e as
+# linhas novas são escritas nas linhas livres; a matriz só é reescrita quando elas acabam.
+
+DATA_DIR = os.path.join('..', '..', 'data', 'fechamentos')
+CACHE_DIR = os.path.join('..', '..', 'data', 'features')
+RAW_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+# Bytes do começo e do fim do trecho já lido usados para reconhecer um CSV que só cresceu
+FINGERPRINT_BYTES = 65536
+# Formato dos arquivos da matriz; caches de outro formato são refeitos
+FORMAT = 2
+# Linhas livres reservadas no fim de cada coluna (fração das gravadas, no mínimo MIN_SPARE_ROWS)
+SPARE_ROWS = 0.25
+MIN_SPARE_ROWS = 1000
+
+
+def _csv_path(symbol, interval, directory):
+    return os.path.join(directory, f'{symbol}_{interval}_data.csv')
+
+
+def _hash_bytes(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return hashlib.blake2b(f.read(end - start), digest_size=16).hexdigest()
+
+
+def source_fingerprint(path):
+    """Tamanho do CSV e hash do primeiro e do último bloco; reconhece tanto mudanças quanto anexos no final."""
+    size = os.path.getsize(path)
+    return {'size': size,
+            'head': _hash_bytes(path, 0, min(size, FINGERPRINT_BYTES)),
+            'tail': _hash_bytes(path, max(0, size - FINGERPRINT_BYTES), size)}
+
+
+def _only_appended(path, fingerprint):
+    """True se o CSV atual é o arquivo de 'fingerprint' com linhas a mais no final."""
+    size = os.path.getsize(path)
+    old_size = fingerprint['size']
+    if size < old_size:
+        return False
+    return (_hash_bytes(path, 0, min(old_size, FINGERPRINT_BYTES)) == fingerprint['head'] and
+            _hash_bytes(path, max(0, old_size - FINGERPRINT_BYTES), old_size) == fingerprint['tail'])
+
+
+def read_candles(symbol, interval, directory=DATA_DIR, start=None):
+    """
+    Candles do CSV (timestamp como índice, colunas open/high/low/close/volume).
+    Com 'start', só os candles a partir dele, localizados por busca binária no arquivo (carregamento.ler_csv).
+    """
+    path = _csv_path(symbol, interval, directory)
+    if start is None:
+        df = pd.read_csv(path, usecols=['timestamp'] + RAW_COLUMNS)
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+    else:
+        df = carregamento.ler_csv(path, inicio=start)
+    return df.set_index('timestamp')[RAW_COLUMNS].astype(np.float64)
+
+
+def _matrix_dir(symbol, interval, feature_set, version, cache_dir):
+    return os.path.join(cache_dir, f'{symbol}_{interval}_{feature_set}_v{version}')
+
+
+def _read_meta(path):
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return meta if meta.get('format') == FORMAT else None
+
+
+def _write_meta(path, meta):
+    tmp = os.path.join(path, f'meta.json.tmp{os.getpid()}')
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, 'meta.json'))
+
+
+def _matrices(path, meta, mode):
+    """Índice e matriz (ordem de colunas) com todas as linhas reservadas, por memory-map."""
+    shape = (meta['capacity'], len(meta['columns']))
+    index = np.memmap(os.path.join(path, 'index.bin'), dtype=np.int64, mode=mode, shape=shape[:1])
+    matrix = np.memmap(os.path.join(path, 'matrix.bin'), dtype=np.float64, mode=mode, shape=shape, order='F')
+    return index, matrix
+
+
+def _fill(path, meta, df, row, mode='r+'):
+    """Escreve as linhas de df a partir da linha 'row' dos arquivos reservados ('w+' cria os arquivos)."""
+    index, matrix = _matrices(path, meta, mode)
+    index[row:row + len(df)] = df.index.to_numpy(dtype='datetime64[ns]').view(np.int64)
+    matrix[row:row + len(df)] = df.to_numpy(dtype=np.float64)
+    index.flush()
+    matrix.flush()
+
+
+def _write(path, df, meta):
+    """Grava índice, matriz e meta num diretório temporário e troca de uma vez (leitores nunca veem arquivos pela metade)."""
+    tmp = f'{path}.tmp{os.getpid()}'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    meta = {**meta, 'format': FORMAT, 'columns': df.columns.tolist(), 'rows': len(df),
+            'capacity': len(df) + max(int(len(df) * SPARE_ROWS), MIN_SPARE_ROWS)}
+    _fill(tmp, meta, df, 0, 'w+')
+    _write_meta(tmp, meta)
+    old = f'{path}.old{os.getpid()}'
+    if os.path.exists(path):
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def _append(path, df, meta, new_meta):
+    """
+    Escreve as linhas de df nas linhas livres e só depois grava o meta com o novo total; False se não couberem.
+    Leitores só mapeiam as 'rows' linhas do meta, então não veem as linhas novas antes do meta.
+    """
+    rows = meta['rows']
+    if rows + len(df) > meta['capacity']:
+        return False
+    _fill(path, meta, df, rows)
+    _write_meta(path, {**new_meta, 'format': FORMAT, 'columns': meta['columns'], 'rows': rows + len(df),
+                       'capacity': meta['capacity']})
+    return True
+
+
+def _open(path, meta):
+    """DataFrame de features sobre os arquivos em disco (memory-map, sem cópia)."""
+    index, matrix = _matrices(path, meta, 'r')
+    rows = meta['rows']
+    return pd.DataFrame(matrix[:rows], index=pd.DatetimeIndex(index[:rows].view('datetime64[ns]'), name='timestamp'),
+                        columns=meta['columns'], copy=False)
+
+
+def _build(build, frames, extras):
+    main = next(iter(frames.values()))
+    return build(main, **{arg: frames[symbol] for arg, symbol in extras.items()})
+
+
+def _tail(build, frames, extras, stored, lookback, check_rows, cumulative, rtol):
+    """
+    Recalcula as features só sobre as últimas 'lookback' barras já conhecidas mais as novas.
+
+    Indicadores com memória (médias exponenciais, SAR) convergem dentro da janela; colunas acumuladas
+    ('cumulative', ex: OBV) são reancoradas no valor gravado. As últimas 'check_rows' linhas já gravadas
+    são conferidas contra o recálculo; se não baterem dentro de 'rtol', retorna None (refazer tudo).
+    """
+    last = stored.index[-1]
+    main = next(iter(frames.values()))
+    start_pos = max(0, main.index.searchsorted(last, side='right') - lookback)
+    start = main.index[start_pos]
+    recent = _build(build, {s: f[f.index >= start] for s, f in frames.items()}, extras)
+
+    overlap = stored.index[-check_rows:]
+    if not overlap.isin(recent.index).all() or recent.columns.tolist() != stored.columns.tolist():
+        return None
+    recent = recent.copy()
+    anchor = overlap[0]
+    for col in recent.columns:
+        if col.split('_lag_')[0] in cumulative:
+            recent[col] += stored.at[anchor, col] - recent.at[anchor, col]
+
+    old = stored.loc[overlap].to_numpy(dtype=np.float64)
+    new = recent.loc[overlap].to_numpy(dtype=np.float64)
+    scale = np.nanmax(np.abs(old), axis=0, initial=0.0)
+    if not np.all((np.abs(old - new) <= rtol * scale) | (np.isnan(old) & np.isnan(new))):
+        return None
+    return recent[recent.index > last]
+
+
+def cached_features(symbol, interval, build, feature_set, version=1, extras=None, cumulative=(),
+                    lookback=5000, check_rows=500, rtol=1e-9, directory=DATA_DIR, cache_dir=CACHE_DIR):
+    """
+    Matriz de features de um símbolo/intervalo, do cache em disco quando os CSVs não mudaram.
+
+    Parâmetros:
+    - build: função que recebe os candles (índice timestamp, colunas open/high/low/close/volume) e devolve
+      o DataFrame de features indexado por timestamp (ex: features.create_features)
+    - feature_set, version: nome e versão do conjunto de features; mude a versão quando 'build' mudar
+    - extras: dicionário {argumento: símbolo} com outros símbolos passados para 'build' (ex: {'df_btc': 'BTCUSDT'})
+    - cumulative: colunas que são somas acumuladas (reancoradas ao recalcular só a cauda)
+    - lookback: barras já conhecidas que entram no recálculo da cauda, para os indicadores aquecerem
+
+    Retorna o DataFrame de features aberto por memory-map (somente leitura).
+    """
+    extras = extras or {}
+    symbols = [symbol] + [s for s in extras.values() if s != symbol]
+    path = _matrix_dir(symbol, interval, feature_set, version, cache_dir)
+    meta = _read_meta(path)
+    paths = {s: _csv_path(s, interval, directory) for s in symbols}
+    fingerprints = {s: source_fingerprint(p) for s, p in paths.items()}
+    new_meta = {'symbol': symbol, 'interval': interval, 'feature_set': feature_set, 'version': version,
+                'sources': fingerprints}
+
+    if meta is not None and meta['sources'] == fingerprints:
+        return _open(path, meta)
+
+    appended = (meta is not None and set(meta['sources']) == set(symbols) and
+                all(_only_appended(paths[s], meta['sources'][s]) for s in symbols))
+    if appended:
+        stored = _open(path, meta)
+        # Só o final dos CSVs: as últimas 'lookback' linhas gravadas em diante (_tail recorta o aquecimento)
+        start = stored.index[-lookback] if len(stored) > lookback else None
+        frames = {s: read_candles(s, interval, directory, start) for s in symbols}
+        tail = _tail(build, frames, extras, stored, lookback, check_rows, set(cumulative), rtol)
+        if tail is not None:
+            if not _append(path, tail, meta, new_meta):
+                # Sem linhas livres: reescreve com novas reservas (concat copia as linhas gravadas)
+                df = pd.concat([stored, tail])
+                del stored
+                _write(path, df, new_meta)
+            return _open(path, _read_meta(path))
+        del stored
+
+    frames = {s: read_candles(s, interval, directory) for s in symbols}
+    df = _build(build, frames, extras)
+    _write(path, df, new_meta)
+    return _open(path, _read_meta(path))
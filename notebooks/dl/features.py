@@ -0,0 +1,208 @@
+import numpy as np
+import pandas as pd
+
+# Janelas das features multi-janela (o ATR "30" usa 20 barras, como sempre usou)
+WINDOWS = (10, 30, 200)
+ATR_WINDOWS = {'10': 10, '30': 20, '200': 200}
+EPSILON = 1e-10
+# Somas acumuladas desde o primeiro candle (dependem de todo o histórico, não só de uma janela)
+CUMULATIVE_COLUMNS = ('obv', 'ad')
+
+
+def parabolic_sar(high, low, close, acceleration=0.02, maximum=0.2):
+    """Parabolic SAR barra a barra, sobre listas de floats (sem .iloc dentro do loop)."""
+    length = len(close)
+    if length < 2:
+        return pd.Series([None] * length, index=close.index)
+    high = high.tolist()
+    low = low.tolist()
+    close_values = close.tolist()
+
+    sar = [None] * length
+    is_long = close_values[1] > close_values[0]
+    sar[1] = low[0] if is_long else high[0]
+    ep = high[1] if is_long else low[1]
+    af = acceleration
+
+    for i in range(2, length):
+        prev_sar = sar[i-1]
+        new_sar = prev_sar + af * (ep - prev_sar)
+        if is_long:
+            if new_sar > low[i] or new_sar > low[i-1]:
+                is_long = False
+                af = acceleration
+                new_sar = ep
+                ep = low[i]
+            elif high[i] > ep:
+                ep = high[i]
+                af = min(af + acceleration, maximum)
+        else:
+            if new_sar < high[i] or new_sar < high[i-1]:
+                is_long = True
+                af = acceleration
+                new_sar = ep
+                ep = high[i]
+            elif low[i] < ep:
+                ep = low[i]
+                af = min(af + acceleration, maximum)
+        sar[i] = new_sar
+
+    return pd.Series(sar, index=close.index)
+
+
+def create_features(df_input):
+    """
+    Mesmas colunas (e valores) do create_features original do main_dl.ipynb, calculadas uma vez só:
+    termos intermediários (Garman-Klass, true range, money flow, máximas/mínimas móveis, DM do ADX) são
+    compartilhados entre janelas e indicadores, todas as inclinações de 5 barras saem de uma única
+    operação sobre um DataFrame e as defasagens são montadas de uma vez no final.
+    """
+    high = df_input['high']
+    low = df_input['low']
+    close = df_input['close']
+    volume = df_input['volume']
+    epsilon = EPSILON
+
+    f = {}
+    slopes = []
+
+    def add_slope(col):
+        # Reserva a posição da coluna; o valor é preenchido junto com as outras inclinações
+        f[f'{col}_slope'] = None
+        slopes.append(col)
+
+    # Intermediários compartilhados
+    log_high, log_low = np.log(high), np.log(low)
+    log_close, log_open = np.log(close), np.log(df_input['open'])
+    garman_klass = (log_high - log_low)**2 / 2 - (2 * np.log(2) - 1) * (log_close - log_open)**2
+    money_flow = ((close - low) - (high - close)) / (high - low + epsilon) * volume
+    prev_close = close.shift(1)
+    true_range = pd.Series(np.fmax(np.fmax(high - low, abs(high - prev_close)), abs(low - prev_close)),
+                           index=df_input.index)
+    highest = {w: high.rolling(window=w).max() for w in WINDOWS}
+    lowest = {w: low.rolling(window=w).min() for w in WINDOWS}
+
+    # Retorno e Volatilidade
+    ret = close.pct_change()
+    f['return'] = ret
+    f['return_skew_30'] = ret.rolling(window=30).skew()
+    f['return_kurt_30'] = ret.rolling(window=30).kurt()
+    for w in WINDOWS:
+        f[f'volatility_{w}'] = ret.rolling(window=w).std()
+    for w in WINDOWS:
+        f[f'realized_vol_{w}'] = np.sqrt(garman_klass.rolling(window=w).mean())
+
+    # Volume
+    for w in WINDOWS:
+        f[f'cmf_{w}'] = money_flow.rolling(window=w).sum() / volume.rolling(window=w).sum()
+    for w in WINDOWS:
+        f[f'volume_{w}_normalizado'] = volume / (volume.rolling(window=w).mean() + epsilon)
+
+    # Osciladores
+    for w in WINDOWS:
+        f[f'williams_r_{w}'] = ((highest[w] - close) / (highest[w] - lowest[w] + epsilon)) * -100
+        add_slope(f'williams_r_{w}')
+
+    # MACD
+    ema_12 = close.ewm(span=12, adjust=False).mean()
+    ema_26 = close.ewm(span=26, adjust=False).mean()
+    f['macd'] = ema_12 - ema_26
+    f['macd_normalizado'] = f['macd'] / close
+    f['macd_signal'] = f['macd'].ewm(span=9, adjust=False).mean()
+    f['macd_hist'] = f['macd'] - f['macd_signal']
+    add_slope('macd')
+
+    # Bandas de Bollinger
+    rolling_mean_20 = close.rolling(window=20).mean()
+    rolling_std_20 = close.rolling(window=20).std()
+    f['bb_upper'] = rolling_mean_20 + (rolling_std_20 * 2)
+    f['bb_lower'] = rolling_mean_20 - (rolling_std_20 * 2)
+    f['bb_width'] = f['bb_upper'] - f['bb_lower']
+    f['bb_pos'] = (close - f['bb_lower']) / (f['bb_width'] + epsilon)
+    f['bb_width_normalizada'] = (f['bb_upper'] - f['bb_lower']) / close
+
+    # Volume
+    price_direction = np.sign(close.diff()).fillna(0)
+    f['obv'] = (price_direction * volume).cumsum()
+    add_slope('obv')
+    f['vol_osc'] = volume.rolling(5).mean() / (volume.rolling(20).mean() + epsilon)
+    mfm = (((close - low) - (high - close)) / (high - low)).fillna(0)
+    f['ad'] = (mfm * volume).cumsum()
+
+    # Volatilidade (ATR)
+    for nome, w in ATR_WINDOWS.items():
+        f[f'atr_{nome}'] = true_range.rolling(window=w).mean()
+        f[f'atr_{nome}_normalizado'] = f[f'atr_{nome}'] / close
+        add_slope(f'atr_{nome}')
+
+    # ADX (Força da Tendência); DM e true range não dependem do período
+    up = high.diff()
+    down = -low.diff()
+    plus_dm = pd.Series(np.where((up > down) & (up > 0), up, 0), index=df_input.index)
+    minus_dm = pd.Series(np.where((down > up) & (down > 0), down, 0), index=df_input.index)
+    for period in (10, 30):
+        atr_val = true_range.ewm(alpha=1/period, min_periods=period, adjust=False).mean()
+        plus_di = 100 * (plus_dm.ewm(alpha=1/period, min_periods=period, adjust=False).mean() / (atr_val + epsilon))
+        minus_di = 100 * (minus_dm.ewm(alpha=1/period, min_periods=period, adjust=False).mean() / (atr_val + epsilon))
+        dx = 100 * (abs(plus_di - minus_di) / (plus_di + minus_di + epsilon))
+        f[f'adx_{period}'] = dx.ewm(alpha=1/period, min_periods=period, adjust=False).mean()
+        f[f'pdi_{period}'] = plus_di
+        f[f'ndi_{period}'] = minus_di
+    for period in (10, 30):
+        for nome in ('adx', 'pdi', 'ndi'):
+            add_slope(f'{nome}_{period}')
+
+    # RSI (Índice de Força Relativa)
+    delta = close.diff()
+    for period in (10, 30):
+        gain = delta.clip(lower=0).ewm(alpha=1/period, min_periods=period, adjust=False).mean()
+        loss = -delta.clip(upper=0).ewm(alpha=1/period, min_periods=period, adjust=False).mean()
+        rs = gain / (loss + epsilon)
+        f[f'rsi_{period}'] = 100 - (100 / (1 + rs))
+        add_slope(f'rsi_{period}')
+
+    # Momentum
+    for w in WINDOWS:
+        f[f'mom_{w}'] = close.diff(w)
+        add_slope(f'mom_{w}')
+        f[f'mom_{w}_normalizado'] = f[f'mom_{w}'] / close
+
+    # Estocástico (mesmas máximas/mínimas do Williams %R)
+    for w in WINDOWS:
+        k = 100 * ((close - lowest[w]) / (highest[w] - lowest[w] + epsilon))
+        f[f'stoch_{w}'] = k
+        f[f'stoch_d_{w}'] = k.rolling(window=3).mean()
+        add_slope(f'stoch_{w}')
+        add_slope(f'stoch_d_{w}')
+
+    # Parabolic SAR
+    f['sar'] = parabolic_sar(high, low, close)
+    add_slope('sar')
+    f['sar_normalizado'] = f['sar'] / close
+
+    # EMA (Média Móvel Exponencial)
+    for span in (10, 50, 200):
+        f[f'ema_{span}'] = close.ewm(span=span, adjust=False).mean()
+    for span in (10, 50, 200):
+        add_slope(f'ema_{span}')
+    for span in (10, 50, 200):
+        f[f'ema_{span}_normalizada'] = f[f'ema_{span}'] / close
+
+    # Retorno Cumulativo: último / primeiro da janela, só com a janela completa (como o rolling().apply)
+    for w in WINDOWS:
+        f[f'cum_return_{w}'] = (close / close.shift(w - 1) - 1).where(close.rolling(w).count() == w)
+
+    # Todas as inclinações (diff + média de 5 barras) numa operação só
+    slope_values = pd.DataFrame({col: f[col] for col in slopes}).diff().rolling(window=5).mean()
+    for col in slopes:
+        f[f'{col}_slope'] = slope_values[col]
+
+    df_temp = pd.concat([df_input, pd.DataFrame(f, index=df_input.index)], axis=1)
+
+    # Lag Features: um shift do DataFrame inteiro por defasagem
+    lag_cols = df_temp.columns.tolist()
+    lags = {lag: df_temp.shift(lag) for lag in range(1, 4)}
+    df_lags = pd.DataFrame({f'{col}_lag_{lag}': lags[lag][col] for col in lag_cols for lag in range(1, 4)},
+                           index=df_temp.index)
+
+    return pd.concat([df_temp, df_lags], axis=1).dropna()
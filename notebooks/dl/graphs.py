@@ -1,7 +1,18 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 
-# Cria um gráfico de volatilidade das trades
+# Gráficos de volatilidade das trades (figures/ml/comparacao_volatilidade_{symbol}.png)
+#
+# As volatilidades de todos os símbolos são calculadas de uma vez, com os retornos empilhados numa matriz
+# (uma coluna por série, completada com NaN no fim). As figuras são desenhadas sem interface gráfica
+# (backend Agg) num pool de processos, e um manifesto com o hash dos CSVs de trades faz os símbolos que
+# não mudaram desde o último gráfico serem pulados.
+
 symbols = ['BTCUSDT','ETHUSDT','XRPUSDT', 'BCHUSDT', 'LTCUSDT', 'EOSUSDT', 'BNBUSDT', 'XLMUSDT', 'TRXUSDT', 'ADAUSDT', 'XTZUSDT', 'SOLUSDT']
 
 # Parâmetros para o cálculo da volatilidade anualizada
@@ -12,42 +23,158 @@ annualization_factor = (days_in_year * hours_in_day)**0.5
 # Janela de 30 dias em horas para o rolling
 window_30_days = 30 * hours_in_day
 
-# Condição para executar a geração de gráficos
-conf = True
+FIGURES_DIR = os.path.join('figures', 'ml')
+MANIFEST_PATH = os.path.join(FIGURES_DIR, '.comparacao_volatilidade.json')
+DPI = 300
+
+
+def trades_path(symbol, directory=FIGURES_DIR):
+    return os.path.join(directory, f'trades_{symbol}.csv')
+
+
+def figure_path(symbol, directory=FIGURES_DIR):
+    return os.path.join(directory, f'comparacao_volatilidade_{symbol}.png')
+
+
+def file_hash(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _render_params():
+    # Mudar a janela, a anualização ou a resolução também refaz os gráficos
+    return {'window': window_30_days, 'annualization_factor': annualization_factor, 'dpi': DPI}
 
-if conf:
+
+def load_manifest(path=MANIFEST_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    tmp = f'{path}.tmp{os.getpid()}'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def stale_symbols(symbols, manifest, directory=FIGURES_DIR):
+    """Símbolos cujo CSV de trades (ou parâmetros do gráfico) mudou, ou cuja figura não existe; com o hash atual."""
+    params = _render_params()
+    stale = {}
     for symbol in symbols:
-        trades = pd.read_csv(f'figures/ml/trades_{symbol}.csv')
-        
+        digest = file_hash(trades_path(symbol, directory))
+        entry = manifest.get(symbol, {})
+        if entry.get('trades') != digest or entry.get('params') != params or not os.path.exists(figure_path(symbol, directory)):
+            stale[symbol] = digest
+    return stale
+
+
+def rolling_volatility(trades_by_symbol):
+    """
+    Volatilidade anualizada (%) da estratégia (Saldo_norm) e da moeda (Valor_norm) de todos os símbolos.
+
+    Os retornos de todas as séries vão numa matriz (linhas, 2 * símbolos), completada com NaN no fim das séries
+    mais curtas; um único rolling().std() sobre a matriz calcula todas as colunas. O NaN do fim nunca entra numa
+    janela de linhas reais, então cada coluna é igual ao cálculo feito símbolo a símbolo.
+
+    Retorna {símbolo: (volatilidade da estratégia, volatilidade da moeda)}, arrays do tamanho das trades.
+    """
+    names = list(trades_by_symbol)
+    lengths = [len(trades_by_symbol[symbol]) for symbol in names]
+    stacked = np.full((max(lengths, default=0), 2 * len(names)), np.nan)
+    for k, symbol in enumerate(names):
+        trades = trades_by_symbol[symbol]
+        stacked[:lengths[k], 2 * k] = trades['Saldo_norm'].to_numpy(dtype=np.float64)
+        stacked[:lengths[k], 2 * k + 1] = trades['Valor_norm'].to_numpy(dtype=np.float64)
+
+    returns = pd.DataFrame(stacked).pct_change()
+    volatility = returns.rolling(window=window_30_days).std().to_numpy() * annualization_factor * 100
+    return {symbol: (volatility[:lengths[k], 2 * k], volatility[:lengths[k], 2 * k + 1])
+            for k, symbol in enumerate(names)}
+
+
+def _init_worker():
+    # Sem janela: os processos só gravam os PNGs
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def render_volatility(symbol, timestamps, strategy_volatility, coin_volatility, path):
+    """Desenha e grava o gráfico de um símbolo (no arquivo temporário primeiro, para não deixar PNG pela metade)."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    # Cria o gráfico
+    plt.figure(figsize=(14, 7))
+
+    # Plota a volatilidade da estratégia em vermelho
+    plt.plot(timestamps, strategy_volatility, label=f'Volatilidade da Estratégia (30 dias)', color='red')
+
+    # Plota a volatilidade da moeda em azul para comparação
+    plt.plot(timestamps, coin_volatility, label=f'Volatilidade da Moeda (30 dias)', color='blue', linestyle='--')
+
+    plt.title(f'Comparação de Volatilidade - {symbol}')
+    plt.xlabel('Data')
+    plt.ylabel('Volatilidade Anualizada (%)')
+    plt.legend()
+    plt.grid(True)
+
+    # Salva a imagem e fecha a figura
+    tmp = f'{path}.tmp{os.getpid()}.png'
+    plt.savefig(tmp, dpi=DPI, bbox_inches='tight')
+    plt.close()
+    os.replace(tmp, path)
+    return symbol
+
+
+def generate_reports(symbols=symbols, directory=FIGURES_DIR, manifest_path=None, workers=None, force=False):
+    """
+    Gera os gráficos de volatilidade dos símbolos que mudaram desde a última execução.
+
+    Parâmetros:
+    - directory: pasta com os trades_{symbol}.csv e onde vão os PNGs
+    - workers: processos de renderização (padrão: os.cpu_count())
+    - force: refaz todos os gráficos, ignorando o manifesto
+
+    Retorna a lista de símbolos desenhados.
+    """
+    manifest_path = manifest_path or os.path.join(directory, os.path.basename(MANIFEST_PATH))
+    manifest = {} if force else load_manifest(manifest_path)
+    stale = stale_symbols(symbols, manifest, directory)
+    print(f"{len(symbols) - len(stale)} de {len(symbols)} gráficos já atualizados; {len(stale)} a gerar")
+    if not stale:
+        return []
+
+    trades_by_symbol = {}
+    for symbol in stale:
+        trades = pd.read_csv(trades_path(symbol, directory), usecols=['Timestamp', 'Saldo_norm', 'Valor_norm'])
         trades['Timestamp'] = pd.to_datetime(trades['Timestamp'])
-        trades.set_index('Timestamp', inplace=True)
-        
-        # --- Cálculo da volatilidade da estratégia (em cima de Saldo_norm) ---
-        trades['retornos_percentuais'] = trades['Saldo_norm'].pct_change()
-        trades['volatilidade_anualizada_percentual'] = trades['retornos_percentuais'].rolling(window=window_30_days).std() * annualization_factor * 100
-
-        # --- Cálculo da volatilidade da moeda (em cima de Valor_norm) ---
-        trades['retornos_moeda'] = trades['Valor_norm'].pct_change()
-        trades['volatilidade_anualizada_moeda'] = trades['retornos_moeda'].rolling(window=window_30_days).std() * annualization_factor * 100
-
-        # Cria o gráfico
-        plt.figure(figsize=(14, 7))
-        
-        # Plota a volatilidade da estratégia em vermelho
-        plt.plot(trades.index, trades['volatilidade_anualizada_percentual'], label=f'Volatilidade da Estratégia (30 dias)', color='red')
-        
-        # Plota a volatilidade da moeda em azul para comparação
-        plt.plot(trades.index, trades['volatilidade_anualizada_moeda'], label=f'Volatilidade da Moeda (30 dias)', color='blue', linestyle='--')
-        
-        plt.title(f'Comparação de Volatilidade - {symbol}')
-        plt.xlabel('Data')
-        plt.ylabel('Volatilidade Anualizada (%)')
-        plt.legend()
-        plt.grid(True)
-        
-        # Salva a imagem
-        plt.savefig(f'figures/ml/comparacao_volatilidade_{symbol}.png', dpi=300, bbox_inches='tight')
-        
-        # Exibe o gráfico e fecha a figura
-        plt.show()
-        plt.close()
\ No newline at end of file
+        trades_by_symbol[symbol] = trades.set_index('Timestamp')
+    volatility = rolling_volatility(trades_by_symbol)
+
+    rendered = []
+    workers = max(1, min(workers or os.cpu_count() or 1, len(stale)))
+    with ProcessPoolExecutor(workers, initializer=_init_worker) as pool:
+        futures = [pool.submit(render_volatility, symbol, trades_by_symbol[symbol].index.to_numpy(),
+                               *volatility[symbol], figure_path(symbol, directory))
+                   for symbol in stale]
+        for future in as_completed(futures):
+            symbol = future.result()
+            # Manifesto gravado a cada gráfico: uma execução interrompida não refaz os que já terminaram
+            manifest[symbol] = {'trades': stale[symbol], 'params': _render_params(), 'figure': figure_path(symbol, directory)}
+            save_manifest(manifest, manifest_path)
+            rendered.append(symbol)
+            print(f"{symbol}: gráfico salvo")
+    return rendered
+
+
+if __name__ == '__main__':
+    generate_reports()
@@ -0,0 +1,122 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from sklearn.preprocessing import RobustScaler
+
+# Sequências para os modelos Conv1D dos notebooks de tests/ sem copiar os dados.
+#
+# criar_sequencias devolve uma view (amostras, sequence_length, features) sobre a matriz de features: cada
+# linha aparece uma vez na memória, não sequence_length vezes. As cópias só acontecem lote a lote, em
+# LotesDeSequencias, que também aplica o normalizador ajustado no treino de cada fold.
+
+
+def criar_sequencias(X, y, sequence_length):
+    """
+    Sequências de 'sequence_length' linhas de X e o alvo da última linha de cada uma.
+
+    Mesmo alinhamento do loop antigo (len - sequence_length sequências), mas X volta como view somente leitura:
+    nada é copiado até um lote ser montado.
+    """
+    X = np.asarray(X)
+    y = np.asarray(y)
+    max_index = min(len(X), len(y)) - sequence_length
+
+    # sliding_window_view põe a janela no último eixo: (amostras, features, janela) -> (amostras, janela, features)
+    X_seq = sliding_window_view(X, sequence_length, axis=0).transpose(0, 2, 1)[:max_index]
+    y_seq = y[sequence_length - 1 : sequence_length - 1 + max_index]
+
+    print(f"Sequências criadas (view, sem cópia). X shape: {X_seq.shape}, y shape: {y_seq.shape}")
+    return X_seq, y_seq
+
+
+def dividir_sequencias(X_seq, y_seq, n_splits=5, test_size=None):
+    """
+    Folds de TimeSeriesSplit como fatias contíguas: (X_treino, X_teste, y_treino, y_teste) por fold.
+    Fatiar mantém as views (indexar com o array de índices do split copiaria o fold inteiro).
+    """
+    from sklearn.model_selection import TimeSeriesSplit
+
+    tscv = TimeSeriesSplit(n_splits=n_splits, test_size=test_size)
+    folds = []
+    for train_index, test_index in tscv.split(X_seq):
+        treino = slice(train_index[0], train_index[-1] + 1)
+        teste = slice(test_index[0], test_index[-1] + 1)
+        folds.append((X_seq[treino], X_seq[teste], y_seq[treino], y_seq[teste]))
+    return folds
+
+
+def linhas_das_sequencias(X_seq):
+    """Linhas originais cobertas por um bloco contíguo de sequências (cada linha uma vez)."""
+    return np.concatenate([X_seq[:, 0, :], X_seq[-1, 1:, :]])
+
+
+def ajustar_escalador(X_treino, scaler=None):
+    """
+    Ajusta o normalizador (RobustScaler por padrão) só nas linhas cobertas pelas sequências de treino,
+    sem olhar o teste. A transformação é aplicada depois, lote a lote.
+    """
+    scaler = scaler if scaler is not None else RobustScaler()
+    scaler.fit(linhas_das_sequencias(X_treino))
+    return scaler
+
+
+class LotesDeSequencias:
+    """
+    Lotes (X, y) de um bloco de sequências, copiados e normalizados só quando pedidos.
+
+    Parâmetros:
+    - X_seq, y_seq: sequências (em geral views de criar_sequencias/dividir_sequencias)
+    - batch_size: tamanho de cada lote
+    - scaler: normalizador já ajustado, aplicado a cada lote (None = sem normalização)
+    - embaralhar: sorteia a ordem das amostras a cada época, como o shuffle do model.fit com arrays
+    - dtype: tipo dos lotes entregues ao modelo
+
+    Para o Keras: model.fit(lotes.gerador(), steps_per_epoch=len(lotes), ...).
+    """
+
+    def __init__(self, X_seq, y_seq, batch_size=64, scaler=None, embaralhar=False, seed=None, dtype=np.float32):
+        self.X_seq = X_seq
+        self.y_seq = np.asarray(y_seq)
+        self.batch_size = batch_size
+        self.scaler = scaler
+        self.embaralhar = embaralhar
+        self.dtype = dtype
+        self._rng = np.random.default_rng(seed)
+        self._ordem = np.arange(len(X_seq))
+        self.on_epoch_end()
+
+    def __len__(self):
+        return -(-len(self.X_seq) // self.batch_size)
+
+    def __getitem__(self, i):
+        indices = self._ordem[i * self.batch_size : (i + 1) * self.batch_size]
+        if self.embaralhar:
+            # Índices em ordem crescente leem a view de forma mais sequencial; a composição do lote não muda
+            indices = np.sort(indices)
+            X = self.X_seq[indices]
+        else:
+            X = self.X_seq[indices[0] : indices[-1] + 1]
+        if self.scaler is not None:
+            amostras, janela, features = X.shape
+            X = self.scaler.transform(X.reshape(-1, features)).reshape(amostras, janela, features)
+        return np.asarray(X, dtype=self.dtype), self.y_seq[indices]
+
+    def __iter__(self):
+        """Uma época."""
+        for i in range(len(self)):
+            yield self[i]
+        self.on_epoch_end()
+
+    def on_epoch_end(self):
+        if self.embaralhar:
+            self._ordem = self._rng.permutation(len(self.X_seq))
+
+    def gerador(self):
+        """Épocas sem fim, para o model.fit/predict com steps_per_epoch/steps = len(lotes)."""
+        while True:
+            yield from self
+
+
+def prever(model, X_seq, scaler=None, batch_size=1024):
+    """Probabilidades do modelo para as sequências, normalizando e copiando um lote por vez."""
+    lotes = LotesDeSequencias(X_seq, np.zeros(len(X_seq)), batch_size=batch_size, scaler=scaler)
+    return np.concatenate([model.predict(X, verbose=0) for X, _ in lotes])
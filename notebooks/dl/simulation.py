@@ -0,0 +1,195 @@
+import bisect
+import itertools
+
+import numpy as np
+import pandas as pd
+
+# Simulação de trading sobre os conjuntos de previsão do MAPIE (main_dl.ipynb e walk_forward.py)
+#
+# Mesmas regras (e a mesma lista de trades) do loop barra a barra original, mantido em benchmark_simulation.py.
+# Em vez de visitar cada barra, a simulação salta entre eventos: próxima compra enquanto sem posição e
+# primeira saída (stop-loss, take-profit, trailing stop ou venda) enquanto posicionada; as barras de 'Hold'
+# entre a compra e a saída são montadas de uma vez.
+
+# Códigos dos conjuntos de previsão: bit 0 = classe 0 (baixa) no conjunto, bit 1 = classe 1 (alta)
+CODE_EMPTY = 0
+CODE_DOWN = 1  # [True, False]
+CODE_UP = 2    # [False, True]
+CODE_BOTH = 3
+
+# Tipos de saída, na ordem em que o loop original os verifica em cada barra
+EXIT_STOP_LOSS, EXIT_TAKE_PROFIT, EXIT_TRAILING, EXIT_SELL = range(4)
+
+DEFAULT_PARAMS = {'stop_loss': None, 'take_profit': None, 'trailing_stop': 0.02, 'sma_window': 100}
+
+
+def encode_prediction_sets(prediction_sets):
+    """Conjuntos de previsão (n, 2) booleanos -> códigos int8 (CODE_*)."""
+    sets = np.asarray(list(prediction_sets), dtype=bool)
+    if sets.size == 0:
+        return np.zeros(0, dtype=np.int8)
+    if sets.ndim != 2 or sets.shape[1] != 2:
+        raise ValueError(f'esperava conjuntos de previsão de 2 classes, shape {sets.shape}')
+    return (sets[:, 0].astype(np.int8) + 2 * sets[:, 1].astype(np.int8)).astype(np.int8)
+
+
+def _first_exit(close, sell_ok, start, entry_price, stop_loss_price, take_profit_price, trailing_factor):
+    """
+    Primeira barra a partir de 'start' em que a posição é encerrada, e o tipo da saída (EXIT_*).
+    Varre em blocos crescentes, para não percorrer o resto do período quando a saída vem cedo.
+
+    Retorna (None, None) se a posição chega aberta ao fim do período.
+    """
+    n = len(close)
+    trailing_price = None
+    block = 16
+    while start < n:
+        stop = min(start + block, n)
+        prices = close[start:stop]
+        conditions = []
+        if stop_loss_price is not None:
+            conditions.append((EXIT_STOP_LOSS, prices <= stop_loss_price))
+        if take_profit_price is not None:
+            conditions.append((EXIT_TAKE_PROFIT, prices >= take_profit_price))
+        if trailing_factor is not None:
+            # Na primeira barra após a compra o stop parte do preço de entrada; depois acompanha o maior preço
+            levels = prices * trailing_factor
+            levels[0] = entry_price * trailing_factor if trailing_price is None else max(trailing_price, levels[0])
+            levels = np.maximum.accumulate(levels)
+            conditions.append((EXIT_TRAILING, prices <= levels))
+            trailing_price = levels[-1]
+        conditions.append((EXIT_SELL, sell_ok[start:stop]))
+
+        hit = np.logical_or.reduce([condition for _, condition in conditions])
+        if hit.any():
+            k = int(np.argmax(hit))
+            for kind, condition in conditions:
+                if condition[k]:
+                    return start + k, kind
+        start = stop
+        block *= 2
+    return None, None
+
+
+def _exit_record(kind, stop_loss, take_profit, trailing_stop):
+    if kind == EXIT_STOP_LOSS:
+        return 'Stop-Loss', f'SL {stop_loss*100:.1f}% hit'
+    if kind == EXIT_TAKE_PROFIT:
+        return 'Take-Profit', f'TP {take_profit*100:.1f}% hit'
+    if kind == EXIT_TRAILING:
+        return 'Trailing-Stop', f'Trailing stop {trailing_stop*100:.1f}% hit'
+    return 'Sell', 'Sinal: Venda'
+
+
+def _simulate(close, index, buy_bars, sell_ok, initial_balance, fee, stop_loss, take_profit, trailing_stop,
+              with_trades=True):
+    n = len(close)
+    trades = []
+    balance = initial_balance
+    i = 1
+    while True:
+        k = bisect.bisect_left(buy_bars, i)
+        if k == len(buy_bars):
+            break
+        entry = buy_bars[k]
+        entry_price = close[entry]
+        if with_trades:
+            trades.append(('Buy', index[entry], entry_price, balance, 'Sinal: Compra'))
+        amount_to_spend = balance * (1 - fee)
+        position = amount_to_spend / entry_price
+
+        exit_bar, kind = _first_exit(
+            close, sell_ok, entry + 1, entry_price,
+            entry_price * (1 - stop_loss) if stop_loss is not None else None,
+            entry_price * (1 + take_profit) if take_profit is not None else None,
+            (1 - trailing_stop) if trailing_stop is not None else None)
+
+        # Barras entre a compra e a saída: 'Hold' com o saldo marcado a mercado
+        end = exit_bar if exit_bar is not None else n
+        if with_trades and end > entry + 1:
+            hold_prices = close[entry + 1:end]
+            hold_balances = position * hold_prices * (1 - fee)
+            trades.extend(zip(itertools.repeat('Hold'), index[entry + 1:end], hold_prices.tolist(),
+                              hold_balances.tolist(), itertools.repeat('Hold')))
+
+        if exit_bar is None:
+            # Fecha a posição no fim da simulação
+            last_price = close[-1]
+            balance = position * last_price * (1 - fee)
+            if with_trades:
+                trades.append(('Liquidate_Final_Fold', index[-1], last_price, balance, 'Fim do período de teste'))
+            break
+
+        exit_price = close[exit_bar]
+        balance = position * exit_price * (1 - fee)
+        if with_trades:
+            order, message = _exit_record(kind, stop_loss, take_profit, trailing_stop)
+            trades.append((order, index[exit_bar], exit_price, balance, message))
+        i = exit_bar + 1
+
+    return trades, balance
+
+
+def simulate_trading_batch(test_df_fold, initial_balance_fold, params, fee=0.001, with_trades=True):
+    """
+    simulate_trading para várias combinações de parâmetros sobre o mesmo período.
+
+    params: lista de dicionários com stop_loss, take_profit, trailing_stop e sma_window (as chaves que faltarem
+    usam os padrões de simulate_trading). Os códigos dos conjuntos de previsão e as médias de cada sma_window
+    são calculados uma vez só para todas as combinações.
+
+    Com with_trades=False só os saldos finais são calculados (varreduras de parâmetros).
+    Retorna uma lista de (trades, saldo final), na ordem de params.
+    """
+    close_series = test_df_fold['close']
+    close = close_series.to_numpy(dtype=np.float64)
+    # Timestamps convertidos uma vez só (os 'Hold' de todas as combinações usam fatias desta lista)
+    index = test_df_fold.index.tolist()
+    if 'prediction_code' in test_df_fold:
+        codes = test_df_fold['prediction_code'].to_numpy()
+    else:
+        codes = encode_prediction_sets(test_df_fold['prediction_set'])
+
+    # O sinal da barra i é a previsão da barra i-1
+    previous = np.empty(len(codes), dtype=np.int8)
+    previous[:1] = CODE_EMPTY
+    previous[1:] = codes[:-1]
+    signal_up = previous == CODE_UP
+    signal_down = previous == CODE_DOWN
+
+    sma = {}
+    buy_bars = {}
+    sell_ok = {}
+
+    def rolling_mean(window):
+        if window not in sma:
+            sma[window] = close_series.rolling(window=window).mean().to_numpy()
+        return sma[window]
+
+    results = []
+    for combination in params:
+        p = {**DEFAULT_PARAMS, **combination}
+        sma_window = p['sma_window']
+        if sma_window not in buy_bars:
+            # Compra: previsão de alta e preço acima da média longa; venda: previsão de baixa e preço abaixo da curta
+            buy = signal_up & (close > rolling_mean(sma_window))
+            buy[:1] = False
+            buy_bars[sma_window] = np.flatnonzero(buy).tolist()
+            sell_ok[sma_window] = signal_down & (close < rolling_mean(int(sma_window/5)))
+        results.append(_simulate(close, index, buy_bars[sma_window], sell_ok[sma_window], initial_balance_fold, fee,
+                                 p['stop_loss'], p['take_profit'], p['trailing_stop'], with_trades))
+    return results
+
+
+def simulate_trading(test_df_fold: pd.DataFrame,
+                                initial_balance_fold: float,
+                                fee: float = 0.001,
+                                stop_loss: float = None,
+                                take_profit: float = None,
+                                trailing_stop: float = 0.02,
+                                sma_window: int = 100) -> tuple[list, float]:
+    """
+    Simula uma estratégia de trading usando os conjuntos de previsão do MAPIE.
+    """
+    params = {'stop_loss': stop_loss, 'take_profit': take_profit, 'trailing_stop': trailing_stop, 'sma_window': sma_window}
+    return simulate_trading_batch(test_df_fold, initial_balance_fold, [params], fee)[0]
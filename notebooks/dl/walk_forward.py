@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+import pandas as pd
+from threadpoolctl import threadpool_limits
+
+from features import create_features, CUMULATIVE_COLUMNS
+from feature_store import cached_features, DATA_DIR, CACHE_DIR
+from simulation import simulate_trading
+
+# Validação walk-forward do main_dl.ipynb para vários símbolos, com os folds rodando em paralelo.
+#
+# Cada (símbolo, fold) é um job independente: treina o XGBoost, calibra o MAPIE e simula o fold com o saldo
+# inicial padrão. O encadeamento dos saldos entre folds é feito no final, reescalando as trades (a simulação
+# é linear no saldo inicial). Cada job grava um checkpoint; rodar de novo pula os que já terminaram.
+
+PARAMS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'xgb_params.json')
+CHECKPOINT_DIR = os.path.join('..', '..', 'data', 'walk_forward')
+FEATURES_VERSION = 1
+
+INITIAL_BALANCE = 1000.0
+CLASSIFICATION_THRESHOLD = 0.5
+OUT_OF_SAMPLE_START = '2025-01-01'
+
+
+def load_params(symbol, path=PARAMS_PATH):
+    """Parâmetros do símbolo: o bloco 'default' do arquivo com o que o símbolo sobrescreve."""
+    with open(path) as f:
+        config = json.load(f)
+    params = json.loads(json.dumps(config['default']))
+    for key, value in config['symbols'].get(symbol, {}).items():
+        if isinstance(value, dict):
+            params[key].update(value)
+        else:
+            params[key] = value
+    return params
+
+
+def configured_symbols(path=PARAMS_PATH):
+    with open(path) as f:
+        return list(json.load(f)['symbols'])
+
+
+def load_in_sample(symbol, interval, data_dir=DATA_DIR, cache_dir=CACHE_DIR):
+    """Features com o target (como na célula 3 do main_dl.ipynb), só o período in-sample."""
+    df = cached_features(symbol, interval, create_features, 'xgb', FEATURES_VERSION,
+                         cumulative=CUMULATIVE_COLUMNS, directory=data_dir, cache_dir=cache_dir)
+    retorno_futuro = df['close'].shift(-1) / df['close'] - 1
+    df = df.assign(target=np.where(retorno_futuro > 0.0, 1, 0))
+    return df[df.index < OUT_OF_SAMPLE_START]
+
+
+def _fingerprint(df):
+    # Hash do conteúdo (índice, valores e colunas): um histórico baixado de novo ou corrigido com o mesmo
+    # tamanho e a mesma última barra também muda a chave
+    hashes = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    conteudo = hashlib.blake2b(hashes.tobytes(), digest_size=16)
+    conteudo.update(json.dumps(list(map(str, df.columns))).encode())
+    return conteudo.hexdigest()
+
+
+def _job_key(symbol, interval, n_splits, params, df_in_sample):
+    # Parâmetros e dados diferentes geram outro checkpoint (o antigo não é reaproveitado por engano)
+    identidade = json.dumps([symbol, interval, n_splits, params, _fingerprint(df_in_sample),
+                             INITIAL_BALANCE, CLASSIFICATION_THRESHOLD, FEATURES_VERSION], sort_keys=True)
+    return hashlib.blake2b(identidade.encode(), digest_size=8).hexdigest()
+
+
+def checkpoint_path(checkpoint_dir, symbol, key, fold):
+    return os.path.join(checkpoint_dir, symbol, key, f'fold_{fold + 1}.joblib')
+
+
+def run_fold(symbol, interval, fold, n_splits, params, n_jobs, path, data_dir=DATA_DIR, cache_dir=CACHE_DIR):
+    """
+    Um fold do walk-forward (mesmos passos do loop do main_dl.ipynb) e grava o resultado em 'path'.
+
+    O fold é simulado com INITIAL_BALANCE; walk_forward encadeia os saldos depois.
+    """
+    import xgboost as xgb
+    from mapie.classification import MapieClassifier
+    from mapie.metrics import classification_coverage_score, classification_mean_width_score
+    from sklearn.metrics import (accuracy_score, confusion_matrix, f1_score, precision_score, recall_score,
+                                 roc_auc_score)
+    from sklearn.model_selection import TimeSeriesSplit, train_test_split
+
+    # Bibliotecas numéricas (BLAS, OpenMP) dentro da fatia de CPU do job. Precisa ser aqui, com elas já
+    # carregadas: OMP_NUM_THREADS e afins só valem se definidas antes de o NumPy ser importado no processo.
+    with threadpool_limits(limits=n_jobs):
+        df_in_sample = load_in_sample(symbol, interval, data_dir, cache_dir)
+        X = df_in_sample.drop(columns=['target'])
+        y = df_in_sample['target']
+        train_index, test_index = list(TimeSeriesSplit(n_splits=n_splits).split(X))[fold]
+        X_train_full, X_test = X.iloc[train_index], X.iloc[test_index]
+        y_train_full, y_test = y.iloc[train_index], y.iloc[test_index]
+
+        X_train, X_calib, y_train, y_calib = train_test_split(X_train_full, y_train_full, test_size=0.2,
+                                                              shuffle=False)
+
+        # Construção do modelo. As threads do XGBoost são sempre as do job, mesmo que o arquivo de parâmetros
+        # traga n_jobs/nthread
+        counts = y_train.value_counts()
+        xgb_params = {key: value for key, value in params['xgb'].items() if key not in ('n_jobs', 'nthread')}
+        model = xgb.XGBClassifier(**xgb_params, n_jobs=n_jobs,
+                                  scale_pos_weight=max(counts[0], counts[1]) / min(counts[1], counts[0]))
+        model.fit(X_train, y_train, eval_set=[(X_calib, y_calib)], verbose=0)
+
+        y_proba = model.predict_proba(X_test)[:, 1]
+        y_pred = (y_proba > CLASSIFICATION_THRESHOLD).astype(int)
+        metrics = {
+            'Fold': fold + 1, 'AUC': roc_auc_score(y_test, y_proba),
+            'Acurácia': accuracy_score(y_test, y_pred),
+            'Precisão': precision_score(y_test, y_pred, zero_division=0),
+            'Recall': recall_score(y_test, y_pred, zero_division=0),
+            'F1 Score': f1_score(y_test, y_pred, zero_division=0)
+        }
+
+        # Ajuste do modelo MAPIE
+        mapie_model = MapieClassifier(estimator=model, method="lac", cv="prefit")
+        mapie_model.fit(X_calib, y_calib)
+        _, y_set = mapie_model.predict(X_test, alpha=params['alpha'])
+        y_set = np.squeeze(y_set)
+
+        test_df_for_sim = df_in_sample.loc[X_test.index].copy()
+        test_df_for_sim['prediction_set'] = list(y_set)
+        trades, final_balance = simulate_trading(test_df_for_sim, initial_balance_fold=INITIAL_BALANCE,
+                                                 **params['simulation'])
+
+        result = {
+            'symbol': symbol, 'fold': fold + 1, 'metrics': metrics,
+            'confusion_matrix': confusion_matrix(y_test, y_pred),
+            'coverage': classification_coverage_score(y_test, y_set),
+            'set_size': classification_mean_width_score(y_set),
+            'start': X_test.index[0], 'end': X_test.index[-1],
+            'close_start': test_df_for_sim['close'].iloc[0], 'close_end': test_df_for_sim['close'].iloc[-1],
+            'trades': trades, 'final_balance': final_balance, 'mapie_model': mapie_model,
+        }
+
+        # Grava num arquivo temporário e renomeia: um job interrompido não deixa checkpoint pela metade
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.tmp{os.getpid()}'
+        joblib.dump(result, tmp)
+        os.replace(tmp, path)
+        return symbol, fold
+
+
+def chain_folds(results, initial_balance=INITIAL_BALANCE):
+    """
+    Encadeia os folds de um símbolo como o loop do notebook: cada fold começa com o saldo final do anterior.
+    Retorna (results_df, performance_by_fold_df, trades, saldo final).
+    """
+    balance = initial_balance
+    results_list, fold_performance_list, full_simulation_trades = [], [], []
+    for result in sorted(results, key=lambda r: r['fold']):
+        scale = balance / INITIAL_BALANCE
+        trades_fold = [(ordem, ts, valor, saldo * scale, sinal) for ordem, ts, valor, saldo, sinal in result['trades']]
+        final_balance_fold = result['final_balance'] * scale
+
+        strategy_return_fold = ((final_balance_fold - balance) / balance) * 100 if balance > 0 else 0
+        buy_and_hold_return_fold = ((result['close_end'] - result['close_start']) / result['close_start']) * 100
+        n_trades = len([trade for trade in trades_fold if trade[0] != 'Hold'])
+
+        results_list.append(result['metrics'])
+        fold_performance_list.append({
+            "Fold": result['fold'], "Período Início": result['start'].date(),
+            "Período Fim": result['end'].date(), "Saldo Inicial": balance,
+            "Saldo Final": final_balance_fold, "Retorno Estratégia (%)": strategy_return_fold,
+            "Retorno Buy & Hold (%)": buy_and_hold_return_fold, "Retorno Líquido (%)": strategy_return_fold - buy_and_hold_return_fold,
+            "Nº Trades": n_trades
+        })
+        balance = final_balance_fold
+        full_simulation_trades.extend(trades_fold)
+    return pd.DataFrame(results_list), pd.DataFrame(fold_performance_list), full_simulation_trades, balance
+
+
+def walk_forward(symbols=None, interval='1h', n_splits=6, cpu_budget=None, threads_per_job=2,
+                 params_path=PARAMS_PATH, checkpoint_dir=CHECKPOINT_DIR, data_dir=DATA_DIR, cache_dir=CACHE_DIR):
+    """
+    Roda o walk-forward de todos os símbolos, com os jobs (símbolo, fold) num pool de processos.
+
+    Parâmetros:
+    - symbols: símbolos a rodar (padrão: todos do arquivo de parâmetros)
+    - cpu_budget: núcleos disponíveis no total (padrão: os.cpu_count())
+    - threads_per_job: threads de cada job (n_jobs do XGBoost e limite do BLAS/OpenMP); o pool usa
+      cpu_budget // threads_per_job processos, para o total de threads não passar do orçamento
+    - checkpoint_dir: onde ficam os resultados de cada fold; jobs já gravados não rodam de novo
+
+    Retorna {símbolo: {'results', 'performance', 'trades', 'final_balance', 'mapie_model'}}, com o modelo
+    MAPIE do último fold (o usado na validação out-of-sample).
+    """
+    symbols = symbols if symbols is not None else configured_symbols(params_path)
+    cpu_budget = cpu_budget or os.cpu_count() or 1
+    threads_per_job = max(1, min(threads_per_job, cpu_budget))
+    workers = max(1, cpu_budget // threads_per_job)
+
+    # Features preparadas antes do pool: os jobs só abrem o cache, sem disputar a escrita
+    jobs = []
+    paths = {}
+    for symbol in symbols:
+        params = load_params(symbol, params_path)
+        key = _job_key(symbol, interval, n_splits, params, load_in_sample(symbol, interval, data_dir, cache_dir))
+        for fold in range(n_splits):
+            path = checkpoint_path(checkpoint_dir, symbol, key, fold)
+            paths[symbol, fold] = path
+            if not os.path.exists(path):
+                jobs.append((symbol, interval, fold, n_splits, params, threads_per_job, path, data_dir, cache_dir))
+
+    print(f"{len(paths) - len(jobs)} de {len(paths)} folds já prontos; {len(jobs)} a rodar em {workers} processo(s) "
+          f"com {threads_per_job} thread(s) cada")
+
+    if jobs:
+        # Folds mais tardios têm mais dados de treino: começam antes, para não sobrarem no fim
+        jobs.sort(key=lambda job: -job[2])
+        with ProcessPoolExecutor(workers) as pool:
+            futures = [pool.submit(run_fold, *job) for job in jobs]
+            for future in as_completed(futures):
+                symbol, fold = future.result()
+                print(f"{symbol} fold {fold + 1}/{n_splits} concluído")
+
+    summary = {}
+    for symbol in symbols:
+        results = [joblib.load(paths[symbol, fold]) for fold in range(n_splits)]
+        results_df, performance_df, trades, final_balance = chain_folds(results)
+        summary[symbol] = {'results': results_df, 'performance': performance_df, 'trades': trades,
+                           'final_balance': final_balance, 'mapie_model': results[-1]['mapie_model']}
+    return summary
+
+
+if __name__ == '__main__':
+    summary = walk_forward()
+    for symbol, resumo in summary.items():
+        resumo['results'].to_csv(f'..//..//figures//ml//results_classification_{symbol}.csv', index=False)
+        resumo['performance'].to_csv(f'..//..//figures//ml//results_performance_{symbol}.csv', index=False)
+        total_return = ((resumo['final_balance'] - INITIAL_BALANCE) / INITIAL_BALANCE) * 100
+        print(f"{symbol}: AUC médio {resumo['results']['AUC'].mean():.4f} | Retorno {total_return:.2f}%")